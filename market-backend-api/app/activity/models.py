@@ -0,0 +1,11 @@
+"""
+Activity feed models.
+"""
+
+from enum import Enum
+
+
+class ActivityType(str, Enum):
+    """Activity type enum."""
+    INVOICE = "invoice"
+    CUSTOMER = "customer"
@@ -0,0 +1,96 @@
+"""
+Activity feed.
+
+Invoice and customer create paths append an entry with its description already
+rendered to the `activity_feed` collection (expired by a TTL index after
+ACTIVITY_FEED_RETENTION_DAYS) and publish it on the event hub. The dashboard reads
+the latest entries with one indexed query and streams new ones over SSE.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+
+from app.activity.models import ActivityType
+from app.core.events import event_hub
+from app.database.connection import db
+
+SEED_LIMIT = 50
+
+
+def invoice_activity(invoice_id: str, customer_id: str, customer_name: str, total: float,
+                     status: str, created_at: datetime) -> dict:
+    return {
+        "type": ActivityType.INVOICE.value,
+        "description": f"New invoice #{invoice_id[:6]} for {customer_name}",
+        "invoice_id": invoice_id,
+        "customer_id": customer_id,
+        "amount": total,
+        "status": status,
+        "timestamp": created_at,
+    }
+
+
+def customer_activity(customer_id: str, name: str, phone: str, created_at: datetime) -> dict:
+    return {
+        "type": ActivityType.CUSTOMER.value,
+        "description": f"New customer: {name}",
+        "customer_id": customer_id,
+        "phone": phone,
+        "status": "active",
+        "timestamp": created_at,
+    }
+
+
+def _public(doc: dict) -> dict:
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+class ActivityService:
+    """Activity feed service class."""
+
+    @staticmethod
+    async def record(activity: dict):
+        """Append an activity to the feed and push it to live subscribers."""
+        await db.activity_feed.insert_one(activity)
+        event_hub.publish("activity", _public(dict(activity)))
+
+    @staticmethod
+    async def get_recent(limit: int = 10, activity_type: Optional[ActivityType] = None) -> List[dict]:
+        query = {"type": ActivityType(activity_type).value} if activity_type else {}
+        cursor = db.activity_feed.find(query).sort("timestamp", -1).limit(limit)
+        return [_public(doc) async for doc in cursor]
+
+    @staticmethod
+    async def seed():
+        """Fill an empty feed from the latest invoices and customers (first start after upgrade)."""
+        if await db.activity_feed.find_one({}, {"_id": 1}):
+            return
+        invoices = await db.invoices.find(
+            {}, {"customer_id": 1, "total": 1, "status": 1, "created_at": 1}
+        ).sort("created_at", -1).limit(SEED_LIMIT).to_list(length=SEED_LIMIT)
+        customers = await db.customers.find(
+            {}, {"name": 1, "phone": 1, "created_at": 1}
+        ).sort("created_at", -1).limit(SEED_LIMIT).to_list(length=SEED_LIMIT)
+
+        names = {str(c["_id"]): c["name"] for c in customers}
+        missing = {str(inv["customer_id"]) for inv in invoices} - names.keys()
+        if missing:
+            object_ids = [ObjectId(cid) for cid in missing if ObjectId.is_valid(cid)]
+            async for c in db.customers.find({"_id": {"$in": object_ids}}, {"name": 1}):
+                names[str(c["_id"])] = c["name"]
+
+        activities = [
+            invoice_activity(str(inv["_id"]), str(inv["customer_id"]), names.get(str(inv["customer_id"]), "Unknown"),
+                             inv["total"], str(inv["status"]), inv["created_at"])
+            for inv in invoices if inv.get("created_at")
+        ]
+        activities.extend(
+            customer_activity(str(c["_id"]), c["name"], c.get("phone"), c["created_at"])
+            for c in customers if c.get("created_at")
+        )
+        if activities:
+            await db.activity_feed.insert_many(activities)
+            print(f"✅ Activity feed seeded with {len(activities)} entries")
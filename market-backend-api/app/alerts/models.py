@@ -0,0 +1,13 @@
+"""
+Stock and expiry alert models.
+"""
+
+from enum import Enum
+
+
+class AlertType(str, Enum):
+    """Alert type enum."""
+    OUT_OF_STOCK = "out_of_stock"
+    LOW_STOCK = "low_stock"
+    EXPIRED = "expired"
+    EXPIRING_SOON = "expiring_soon"
@@ -0,0 +1,42 @@
+"""
+Alerts router: precomputed low-stock and expiry alerts and their live stream.
+"""
+
+from fastapi import APIRouter, Depends, Query, Request
+from typing import Dict, Optional
+from app.auth.dependencies import get_current_admin
+from app.alerts.models import AlertType
+from app.alerts.schemas import AlertListResponse
+from app.alerts.service import AlertService
+from app.core.events import event_hub, sse_response
+
+router = APIRouter()
+
+
+@router.get("/", response_model=AlertListResponse)
+async def get_alerts(
+    type: Optional[AlertType] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    current_admin = Depends(get_current_admin)
+):
+    """Get current stock and expiry alerts (Admin only)."""
+    return await AlertService.get_alerts(type, limit)
+
+
+@router.get("/counts", response_model=Dict[str, int])
+async def get_alert_counts(current_admin = Depends(get_current_admin)):
+    """Get the number of current alerts per type (Admin only)."""
+    return await AlertService.get_counts()
+
+
+@router.get("/stream")
+async def stream_alerts(request: Request, current_admin = Depends(get_current_admin)):
+    """Server-sent events stream of new alerts (Admin only)."""
+    return sse_response(event_hub, request, events=["alert"])
+
+
+@router.post("/rebuild")
+async def rebuild_alerts(current_admin = Depends(get_current_admin)):
+    """Recompute every alert from the products collection (Admin only)."""
+    await AlertService.rebuild()
+    return await AlertService.get_counts()
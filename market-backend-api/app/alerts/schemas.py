@@ -0,0 +1,29 @@
+"""
+Alert related Pydantic schemas.
+"""
+
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.alerts.models import AlertType
+
+
+class AlertResponse(BaseModel):
+    """Alert response schema."""
+    id: str
+    type: AlertType
+    product_id: str
+    code: Optional[str] = None
+    name: str
+    category_id: Optional[str] = None
+    category_name: Optional[str] = None
+    quantity: int
+    expiry_date: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class AlertListResponse(BaseModel):
+    """Alert list response schema."""
+    alerts: List[AlertResponse]
+    counts: Dict[str, int]
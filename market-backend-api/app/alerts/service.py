@@ -0,0 +1,204 @@
+"""
+Stock and expiry alerts.
+
+The `alerts` collection holds one document per (product, alert type) that currently
+applies, keyed `<type>:<product _id>`. A background scanner keeps it up to date:
+products whose `updated_at` moved since the last scan are re-evaluated, and two
+narrow `expiry_date` windows pick up products that crossed the expired / expiring
+soon boundaries purely because time passed. A periodic full rebuild reconciles
+anything the incremental scans missed. New alerts are published on the event hub.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import DeleteOne, UpdateOne
+
+from app.alerts.models import AlertType
+from app.config import ALERT_EXPIRY_DAYS, ALERT_LOW_STOCK_THRESHOLD
+from app.core.events import event_hub
+from app.database.connection import db
+
+# Writers stamp `updated_at` with their own clock, so re-read a small window on every scan
+SCAN_OVERLAP = timedelta(seconds=5)
+
+PRODUCT_PROJECTION = {
+    "product_id": 1, "sku": 1, "name": 1, "category_id": 1,
+    "quantity": 1, "expiry_date": 1, "is_active": 1, "updated_at": 1, "forecast.reorder_point": 1,
+}
+
+# Low stock: at or below the forecast reorder point for products with a sales history,
+# else below ALERT_LOW_STOCK_THRESHOLD. `is_low_stock` and LOW_STOCK_QUERY must agree.
+_REORDER_POINT = {"$ifNull": ["$forecast.reorder_point", 0]}
+LOW_STOCK_QUERY = {"$expr": {"$cond": [
+    {"$gt": [_REORDER_POINT, 0]},
+    {"$lte": ["$quantity", _REORDER_POINT]},
+    {"$lt": ["$quantity", ALERT_LOW_STOCK_THRESHOLD]},
+]}}
+
+
+def is_low_stock(doc: dict) -> bool:
+    """Whether a product document is low on stock (out of stock included)."""
+    quantity = doc.get("quantity", 0)
+    reorder_point = (doc.get("forecast") or {}).get("reorder_point") or 0
+    return quantity <= reorder_point if reorder_point > 0 else quantity < ALERT_LOW_STOCK_THRESHOLD
+
+
+def evaluate_product(doc: dict, now: datetime, category_names: Dict[str, str]) -> Dict[str, dict]:
+    """Return the alerts that currently apply to a product, keyed by alert id."""
+    if not doc.get("is_active", True):
+        return {}
+
+    types = []
+    quantity = doc.get("quantity", 0)
+    if quantity <= 0:
+        types.append(AlertType.OUT_OF_STOCK)
+    elif is_low_stock(doc):
+        types.append(AlertType.LOW_STOCK)
+
+    expiry_date = doc.get("expiry_date")
+    if isinstance(expiry_date, datetime):
+        if expiry_date <= now:
+            types.append(AlertType.EXPIRED)
+        elif expiry_date <= now + timedelta(days=ALERT_EXPIRY_DAYS):
+            types.append(AlertType.EXPIRING_SOON)
+
+    product_id = str(doc["_id"])
+    return {
+        f"{alert_type.value}:{product_id}": {
+            "type": alert_type.value,
+            "product_id": product_id,
+            "code": doc.get("product_id") or doc.get("sku"),
+            "name": doc.get("name", ""),
+            "category_id": doc.get("category_id"),
+            "category_name": category_names.get(doc.get("category_id")),
+            "quantity": quantity,
+            "expiry_date": expiry_date if isinstance(expiry_date, datetime) else None,
+        }
+        for alert_type in types
+    }
+
+
+class AlertService:
+    """Alert service class."""
+
+    _watermark: Optional[datetime] = None
+    _last_scan_at: Optional[datetime] = None
+
+    @staticmethod
+    async def _category_names() -> Dict[str, str]:
+        return {str(cat["_id"]): cat["name"] async for cat in db.categories.find({}, {"name": 1})}
+
+    @staticmethod
+    async def _apply(product_ids: Iterable[str], desired: Dict[str, dict], now: datetime, full: bool = False) -> int:
+        """Make the stored alerts of `product_ids` (or of every product when `full`) equal `desired`."""
+        query = {} if full else {"product_id": {"$in": list(product_ids)}}
+        existing = {doc["_id"] async for doc in db.alerts.find(query, {"_id": 1})}
+
+        operations = [DeleteOne({"_id": alert_id}) for alert_id in existing - desired.keys()]
+        operations.extend(
+            UpdateOne(
+                {"_id": alert_id},
+                {"$set": {**alert, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                upsert=True
+            )
+            for alert_id, alert in desired.items()
+        )
+        if operations:
+            await db.alerts.bulk_write(operations, ordered=False)
+
+        new_ids = desired.keys() - existing
+        for alert_id in new_ids:
+            event_hub.publish("alert", {"id": alert_id, **desired[alert_id], "created_at": now})
+        return len(new_ids)
+
+    @staticmethod
+    async def evaluate(products: List[dict], now: datetime) -> int:
+        if not products:
+            return 0
+        category_names = await AlertService._category_names()
+        desired = {}
+        for doc in products:
+            desired.update(evaluate_product(doc, now, category_names))
+        return await AlertService._apply([str(doc["_id"]) for doc in products], desired, now)
+
+    @staticmethod
+    async def scan() -> int:
+        """Re-evaluate products changed since the last scan or crossing an expiry boundary."""
+        if AlertService._watermark is None:
+            return await AlertService.rebuild()
+
+        now = datetime.utcnow()
+        previous = AlertService._last_scan_at
+        horizon = timedelta(days=ALERT_EXPIRY_DAYS)
+        query = {"$or": [
+            {"updated_at": {"$gt": AlertService._watermark - SCAN_OVERLAP}},
+            {"expiry_date": {"$gt": previous, "$lte": now}},
+            {"expiry_date": {"$gt": previous + horizon, "$lte": now + horizon}},
+        ]}
+        products = []
+        async for doc in db.products.find(query, PRODUCT_PROJECTION):
+            products.append(doc)
+            updated_at = doc.get("updated_at")
+            if isinstance(updated_at, datetime) and updated_at > AlertService._watermark:
+                AlertService._watermark = updated_at
+
+        created = await AlertService.evaluate(products, now)
+        AlertService._last_scan_at = now
+        return created
+
+    @staticmethod
+    async def rebuild() -> int:
+        """Recompute every alert from the two indexed product queries."""
+        now = datetime.utcnow()
+        category_names = await AlertService._category_names()
+        query = {"is_active": True, "$or": [
+            LOW_STOCK_QUERY,
+            {"expiry_date": {"$lte": now + timedelta(days=ALERT_EXPIRY_DAYS)}},
+        ]}
+        desired = {}
+        async for doc in db.products.find(query, PRODUCT_PROJECTION):
+            desired.update(evaluate_product(doc, now, category_names))
+
+        latest = await db.products.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+        created = await AlertService._apply([], desired, now, full=True)
+        AlertService._watermark = (latest or {}).get("updated_at") or now
+        AlertService._last_scan_at = now
+        print(f"✅ Alerts rebuilt: {len(desired)} active")
+        return created
+
+    @staticmethod
+    async def get_alerts(alert_type: Optional[AlertType] = None, limit: int = 500) -> dict:
+        query = {"type": AlertType(alert_type).value} if alert_type else {}
+        cursor = db.alerts.find(query).sort([("type", 1), ("quantity", 1)]).limit(limit)
+        alerts = []
+        async for doc in cursor:
+            doc["id"] = doc.pop("_id")
+            alerts.append(doc)
+        return {"alerts": alerts, "counts": await AlertService.get_counts()}
+
+    @staticmethod
+    async def get_counts() -> Dict[str, int]:
+        counts = {alert_type.value: 0 for alert_type in AlertType}
+        async for doc in db.alerts.aggregate([{"$group": {"_id": "$type", "count": {"$sum": 1}}}]):
+            counts[doc["_id"]] = doc["count"]
+        return counts
+
+    @staticmethod
+    async def get_product_ids(types: Iterable[AlertType], max_quantity: Optional[int] = None,
+                              expiring_before: Optional[datetime] = None) -> List[str]:
+        """Product ids with an alert of one of `types`, optionally narrowed further."""
+        query = {"type": {"$in": [AlertType(t).value for t in types]}}
+        if max_quantity is not None:
+            query["quantity"] = {"$lt": max_quantity}
+        if expiring_before is not None:
+            query["expiry_date"] = {"$lte": expiring_before}
+        return [doc["product_id"] async for doc in db.alerts.find(query, {"product_id": 1})]
+
+    @staticmethod
+    async def count_products(types: Iterable[AlertType], max_quantity: Optional[int] = None) -> int:
+        """Number of products with an alert of one of `types` (count-only `get_product_ids`)."""
+        query = {"type": {"$in": [AlertType(t).value for t in types]}}
+        if max_quantity is not None:
+            query["quantity"] = {"$lt": max_quantity}
+        return await db.alerts.count_documents(query)
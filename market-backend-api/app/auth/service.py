@@ -10,6 +10,8 @@ from app.database.connection import db
 from app.auth.models import User, UserRole, UserCreate, UserLogin, TokenData
 from app.auth.session_service import SessionService
 from app.config import JWT_SECRET, ALGORITHM
+from app.core.versions import versions
+from app.customers.service import CustomerService
 
 SECRET_KEY = JWT_SECRET
 ACCESS_TOKEN_EXPIRE_MINUTES = 720
@@ -310,6 +312,8 @@ class AuthService:
                     "updated_at": datetime.utcnow()
                 }}
             )
+            await CustomerService.record_stats_change(customer, {**customer, "first_login": False})
+            versions.bump("customers")
             if result.modified_count == 1:
                 return {
                     "success": True,
@@ -342,6 +346,8 @@ class AuthService:
                         "updated_at": datetime.utcnow()
                     }}
                 )
+                await CustomerService.record_stats_change(customer, {**customer, "first_login": False})
+                versions.bump("customers")
                 if result.modified_count == 1:
                     return {
                         "success": True,
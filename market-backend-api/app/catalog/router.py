@@ -0,0 +1,62 @@
+"""
+Catalog sync router for POS terminals.
+"""
+
+import gzip
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from app.auth.dependencies import get_current_staff
+from app.catalog.schemas import CatalogChangesResponse, CatalogVersionResponse
+from app.catalog.service import CatalogService
+
+router = APIRouter()
+
+
+def _accepts_gzip(request: Request) -> bool:
+    """Whether the client's Accept-Encoding allows gzip (a `q=0` entry refuses it)."""
+    for entry in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = entry.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            quality = params.strip().lower()
+            if not quality.startswith("q="):
+                return True
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+@router.get("/snapshot")
+async def get_catalog_snapshot(request: Request, current_staff = Depends(get_current_staff)):
+    """Full catalog of active products and categories (Admin or Cashier).
+
+    Sent gzip-compressed to clients accepting gzip and uncompressed otherwise. The version
+    is returned in the body and in the `X-Catalog-Version` header.
+    """
+    snapshot, version = await CatalogService.get_snapshot()
+    headers = {"X-Catalog-Version": str(version), "Vary": "Accept-Encoding"}
+    if _accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        snapshot = gzip.decompress(snapshot)
+    return Response(content=snapshot, media_type="application/json", headers=headers)
+
+
+@router.get("/changes", response_model=CatalogChangesResponse)
+async def get_catalog_changes(
+    since: int = Query(..., ge=0, description="Version of the terminal's current catalog"),
+    limit: int = Query(5000, ge=1, le=20000),
+    current_staff = Depends(get_current_staff)
+):
+    """Products and categories changed since a catalog version (Admin or Cashier).
+
+    Responds 410 when the journal no longer covers `since`; download a new snapshot then.
+    """
+    return await CatalogService.get_changes(since, limit)
+
+
+@router.get("/version", response_model=CatalogVersionResponse)
+async def get_catalog_version(current_staff = Depends(get_current_staff)):
+    """Current catalog version (Admin or Cashier)."""
+    return {"version": await CatalogService.current_version()}
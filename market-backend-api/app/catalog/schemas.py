@@ -0,0 +1,44 @@
+"""
+Catalog sync Pydantic schemas.
+"""
+
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+class CatalogProduct(BaseModel):
+    """Compact product as shipped to POS terminals."""
+    id: str
+    product_id: Optional[str] = None
+    sku: Optional[str] = None
+    name: str
+    price: float
+    selling_price: Optional[float] = None
+    discount: Optional[float] = 0.0
+    quantity: int
+    category_id: Optional[str] = None
+    size_unit: Optional[str] = "piece"
+    expiry_date: Optional[datetime] = None
+
+
+class CatalogCategory(BaseModel):
+    """Compact category as shipped to POS terminals."""
+    id: str
+    name: str
+    description: Optional[str] = None
+
+
+class CatalogChangesResponse(BaseModel):
+    """Catalog changes after a version; apply upserts, then deletions, then sync again while has_more."""
+    since: int
+    version: int
+    has_more: bool
+    products: List[CatalogProduct]
+    categories: List[CatalogCategory]
+    deleted_products: List[str]
+    deleted_categories: List[str]
+
+
+class CatalogVersionResponse(BaseModel):
+    version: int
@@ -0,0 +1,196 @@
+"""
+Catalog sync for POS terminals.
+
+Every product or category write appends entries to the `catalog_changes` journal,
+each stamped with a version drawn from a monotonic counter in `counters`. Terminals
+download a gzip-compressed full snapshot once, remember its version, and then ask
+only for the changes journaled after it.
+"""
+
+import gzip
+import json
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+
+from app.config import CATALOG_SNAPSHOT_MAX_AGE_SECONDS
+from app.database.connection import db
+
+VERSION_COUNTER = "catalog_version"
+JOURNAL_GAP_GRACE = timedelta(seconds=10)
+
+PRODUCT_FIELDS = [
+    "product_id", "sku", "name", "price", "selling_price", "discount",
+    "quantity", "category_id", "size_unit", "expiry_date",
+]
+
+
+def catalog_product(doc: dict) -> dict:
+    """Compact product representation shipped to terminals."""
+    product = {"id": str(doc["_id"])}
+    product.update({field: doc.get(field) for field in PRODUCT_FIELDS})
+    return product
+
+
+def catalog_category(doc: dict) -> dict:
+    return {"id": str(doc["_id"]), "name": doc["name"], "description": doc.get("description")}
+
+
+def _journal_entries(kind: str, entity_ids: List[str], last_version: int, now: datetime) -> List[dict]:
+    first_version = last_version - len(entity_ids) + 1
+    return [
+        {"version": first_version + i, "kind": kind, "entity_id": entity_id, "created_at": now}
+        for i, entity_id in enumerate(entity_ids)
+    ]
+
+
+def record_changes_sync(sync_db, kind: str, entity_ids: Iterable) -> Optional[int]:
+    """Journal changed products or categories from a pymongo (job worker) connection."""
+    entity_ids = list(dict.fromkeys(str(entity_id) for entity_id in entity_ids))
+    if not entity_ids:
+        return None
+    counter = sync_db.counters.find_one_and_update(
+        {"_id": VERSION_COUNTER}, {"$inc": {"value": len(entity_ids)}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    sync_db.catalog_changes.insert_many(_journal_entries(kind, entity_ids, counter["value"], datetime.utcnow()))
+    return counter["value"]
+
+
+class CatalogService:
+    """Catalog sync service class."""
+
+    _snapshot: Optional[bytes] = None
+    _snapshot_version: Optional[int] = None
+    _snapshot_built_at: Optional[datetime] = None
+
+    @staticmethod
+    async def record_changes(kind: str, entity_ids: Iterable) -> Optional[int]:
+        """Journal changed products ("product") or categories ("category"); returns the last version."""
+        entity_ids = list(dict.fromkeys(str(entity_id) for entity_id in entity_ids))
+        if not entity_ids:
+            return None
+        counter = await db.counters.find_one_and_update(
+            {"_id": VERSION_COUNTER}, {"$inc": {"value": len(entity_ids)}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        await db.catalog_changes.insert_many(_journal_entries(kind, entity_ids, counter["value"], datetime.utcnow()))
+        return counter["value"]
+
+    @staticmethod
+    async def current_version() -> int:
+        counter = await db.counters.find_one({"_id": VERSION_COUNTER})
+        return counter["value"] if counter else 0
+
+    @staticmethod
+    async def _build_snapshot() -> Tuple[bytes, int]:
+        # Read the version first: anything written meanwhile is replayed by the next delta
+        version = await CatalogService.current_version()
+        categories = [catalog_category(doc) async for doc in db.categories.find({"is_active": True})]
+        products = [
+            catalog_product(doc)
+            async for doc in db.products.find({"is_active": True}, {field: 1 for field in PRODUCT_FIELDS})
+        ]
+        payload = {
+            "version": version,
+            "generated_at": datetime.utcnow(),
+            "categories": categories,
+            "products": products,
+        }
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return gzip.compress(body, compresslevel=6), version
+
+    @staticmethod
+    async def get_snapshot() -> Tuple[bytes, int]:
+        """Return the gzip-compressed snapshot and its version.
+
+        A snapshot is rebuilt only when the catalog changed and the cached one is older
+        than CATALOG_SNAPSHOT_MAX_AGE_SECONDS; terminals catch up with the delta endpoint.
+        """
+        now = datetime.utcnow()
+        if CatalogService._snapshot is not None:
+            fresh = now - CatalogService._snapshot_built_at < timedelta(seconds=CATALOG_SNAPSHOT_MAX_AGE_SECONDS)
+            if fresh or CatalogService._snapshot_version == await CatalogService.current_version():
+                return CatalogService._snapshot, CatalogService._snapshot_version
+
+        snapshot, version = await CatalogService._build_snapshot()
+        CatalogService._snapshot = snapshot
+        CatalogService._snapshot_version = version
+        CatalogService._snapshot_built_at = now
+        return snapshot, version
+
+    @staticmethod
+    async def get_changes(since: int, limit: int = 5000) -> dict:
+        """Products and categories changed after version `since`, in their current state."""
+        current = await CatalogService.current_version()
+        if since > current:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown catalog version {since} (current: {current})"
+            )
+
+        oldest = await db.catalog_changes.find_one({}, {"version": 1}, sort=[("version", 1)])
+        if since < current and (oldest is None or oldest["version"] > since + 1):
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Catalog changes since this version are no longer available, download a full snapshot"
+            )
+
+        entries = await db.catalog_changes.find(
+            {"version": {"$gt": since}}, {"kind": 1, "entity_id": 1, "version": 1, "created_at": 1}
+        ).sort("version", 1).limit(limit).to_list(length=limit)
+
+        entries = CatalogService._contiguous(entries, since)
+        version = entries[-1]["version"] if entries else since
+        product_ids = list({e["entity_id"] for e in entries if e["kind"] == "product"})
+        category_ids = list({e["entity_id"] for e in entries if e["kind"] == "category"})
+
+        products, deleted_products = await CatalogService._current_state(
+            db.products, product_ids, catalog_product, {field: 1 for field in PRODUCT_FIELDS + ["is_active"]}
+        )
+        categories, deleted_categories = await CatalogService._current_state(
+            db.categories, category_ids, catalog_category, None
+        )
+        return {
+            "since": since,
+            "version": version,
+            "has_more": version < current,
+            "products": products,
+            "categories": categories,
+            "deleted_products": deleted_products,
+            "deleted_categories": deleted_categories,
+        }
+
+    @staticmethod
+    def _contiguous(entries: List[dict], since: int) -> List[dict]:
+        """Cut the entries at the first missing version.
+
+        A version is allocated before its journal entry is written, so a gap usually
+        means a concurrent writer has not inserted yet; returning entries past it would
+        make the client skip that change. Gaps older than JOURNAL_GAP_GRACE are treated
+        as lost writes and skipped.
+        """
+        expected = since + 1
+        settled = datetime.utcnow() - JOURNAL_GAP_GRACE
+        for i, entry in enumerate(entries):
+            if entry["version"] != expected and entry["created_at"] > settled:
+                return entries[:i]
+            expected = entry["version"] + 1
+        return entries
+
+    @staticmethod
+    async def _current_state(collection, entity_ids: List[str], serialize, projection) -> Tuple[List[dict], List[str]]:
+        if not entity_ids:
+            return [], []
+        object_ids = [ObjectId(entity_id) for entity_id in entity_ids if ObjectId.is_valid(entity_id)]
+        active = []
+        found = set()
+        async for doc in collection.find({"_id": {"$in": object_ids}}, projection):
+            if doc.get("is_active", True):
+                active.append(serialize(doc))
+                found.add(str(doc["_id"]))
+        return active, [entity_id for entity_id in entity_ids if entity_id not in found]
@@ -2,19 +2,23 @@
 Categories router with CRUD operations.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from typing import List
 from app.auth.dependencies import get_current_admin, get_current_staff
 from app.products.service import ProductService
 from app.products.schemas import CategoryCreate, CategoryUpdate
 from app.products.models import Category
+from app.core.versions import conditional_response
 
 router = APIRouter()
 
 
 @router.get("/")
-async def get_categories(current_admin=Depends(get_current_staff)):
+async def get_categories(request: Request, response: Response, current_admin=Depends(get_current_staff)):
     """Get all categories (Admin or Cashier)."""
+    not_modified = conditional_response(request, response, ("categories",))
+    if not_modified:
+        return not_modified
     try:
         categories = await ProductService.get_categories()
         return categories
@@ -45,10 +49,15 @@ async def create_category(
 
 @router.get("/{category_id}")
 async def get_category(
+    request: Request,
+    response: Response,
     category_id: str,
     current_admin=Depends(get_current_admin)
 ):
     """Get a specific category by ID (Admin only)."""
+    not_modified = conditional_response(request, response, ("categories",))
+    if not_modified:
+        return not_modified
     try:
         category = await ProductService.get_category_by_id(category_id)
         if not category:
@@ -7,3 +7,60 @@ MONGO_URL = os.getenv("MONGO_URL")
 DB_NAME = os.getenv("DB_NAME", "sanabel-elkhair")
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecret")
 ALGORITHM = "HS256"
+
+# In-memory barcode index used by the POS scanner endpoint
+BARCODE_INDEX_POLL_SECONDS = float(os.getenv("BARCODE_INDEX_POLL_SECONDS", "5"))
+BARCODE_INDEX_RECONCILE_SECONDS = float(os.getenv("BARCODE_INDEX_RECONCILE_SECONDS", "300"))
+
+# Background jobs (exports and reports run in a process pool)
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+JOBS_RESULTS_DIR = os.getenv("JOBS_RESULTS_DIR", "job_results")
+JOBS_RESULT_TTL_HOURS = float(os.getenv("JOBS_RESULT_TTL_HOURS", "24"))
+UPLOADS_DIR = os.path.join(JOBS_RESULTS_DIR, "uploads")  # import jobs only read files from here
+
+# Stock ledger: how often per-product quantity snapshots are taken
+STOCK_SNAPSHOT_INTERVAL_HOURS = float(os.getenv("STOCK_SNAPSHOT_INTERVAL_HOURS", "24"))
+STOCK_SNAPSHOT_RETENTION_DAYS = int(os.getenv("STOCK_SNAPSHOT_RETENTION_DAYS", "90"))  # movements are kept
+
+# Stock and expiry alerts maintained by the background scanner
+ALERT_LOW_STOCK_THRESHOLD = int(os.getenv("ALERT_LOW_STOCK_THRESHOLD", "10"))
+ALERT_EXPIRY_DAYS = int(os.getenv("ALERT_EXPIRY_DAYS", "7"))
+ALERT_SCAN_SECONDS = float(os.getenv("ALERT_SCAN_SECONDS", "10"))
+ALERT_REBUILD_SECONDS = float(os.getenv("ALERT_REBUILD_SECONDS", "3600"))
+
+# Catalog sync for POS terminals
+CATALOG_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_MAX_AGE_SECONDS", "300"))
+CATALOG_JOURNAL_RETENTION_DAYS = int(os.getenv("CATALOG_JOURNAL_RETENTION_DAYS", "30"))
+
+# Cached totals of filtered list queries (invalidated by any write to the collection)
+COUNT_CACHE_SECONDS = float(os.getenv("COUNT_CACHE_SECONDS", "30"))
+
+# Dashboard snapshot: served from cache while fresh, then stale while one refresh runs
+DASHBOARD_SNAPSHOT_TTL_SECONDS = float(os.getenv("DASHBOARD_SNAPSHOT_TTL_SECONDS", "15"))
+DASHBOARD_SNAPSHOT_STALE_SECONDS = float(os.getenv("DASHBOARD_SNAPSHOT_STALE_SECONDS", "120"))
+# Live dashboard: invoice writes within this window are folded into one revenue push
+DASHBOARD_PUSH_SECONDS = float(os.getenv("DASHBOARD_PUSH_SECONDS", "2"))
+
+# Activity feed entries shown on the dashboard expire after this many days
+ACTIVITY_FEED_RETENTION_DAYS = int(os.getenv("ACTIVITY_FEED_RETENTION_DAYS", "30"))
+
+# Store-local timezone: sales reports bucket invoices by this calendar day
+STORE_TIMEZONE = os.getenv("STORE_TIMEZONE", "Africa/Cairo")
+
+# Demand forecast and reorder points, recomputed by the `demand_forecast` job
+FORECAST_INTERVAL_HOURS = float(os.getenv("FORECAST_INTERVAL_HOURS", "24"))
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "84"))  # whole weeks
+REORDER_LEAD_TIME_DAYS = int(os.getenv("REORDER_LEAD_TIME_DAYS", "3"))
+REORDER_CYCLE_DAYS = int(os.getenv("REORDER_CYCLE_DAYS", "7"))  # demand an order covers after delivery
+REORDER_SERVICE_Z = float(os.getenv("REORDER_SERVICE_Z", "1.65"))  # ~95% of lead times without a stock-out
+
+# "Frequently bought together" suggestions, recomputed by the `basket_analysis` job
+BASKET_INTERVAL_HOURS = float(os.getenv("BASKET_INTERVAL_HOURS", "24"))
+BASKET_HISTORY_DAYS = int(os.getenv("BASKET_HISTORY_DAYS", "180"))
+BASKET_TOP_K = int(os.getenv("BASKET_TOP_K", "10"))  # neighbours stored per product
+BASKET_MIN_PAIR_COUNT = int(os.getenv("BASKET_MIN_PAIR_COUNT", "3"))  # shared invoices before a pair counts
+
+# Columnar fact store of invoice lines, appended by the `fact_store_append` job
+FACT_STORE_DIR = os.getenv("FACT_STORE_DIR", "fact_store")
+FACT_STORE_INTERVAL_MINUTES = float(os.getenv("FACT_STORE_INTERVAL_MINUTES", "15"))
+FACT_STORE_REVERSAL_RETENTION_DAYS = int(os.getenv("FACT_STORE_REVERSAL_RETENTION_DAYS", "30"))
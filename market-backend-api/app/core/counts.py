@@ -0,0 +1,105 @@
+"""
+Counts for paginated list endpoints.
+
+`count_documents` costs as much as the page query itself, so list endpoints pick
+one of three counting modes per request:
+
+- ``auto``: unfiltered lists use the collection's `estimated_document_count`
+  (metadata only); filtered counts are cached for COUNT_CACHE_SECONDS, keyed by the
+  normalized filter and dropped as soon as the collection version changes.
+- ``exact``: always run `count_documents` (and refresh the cache).
+- ``none``: skip counting; the endpoint fetches one extra row to report `has_more`.
+"""
+
+import json
+import math
+import time
+from enum import Enum
+from typing import Dict, Optional, Tuple
+
+from app.config import COUNT_CACHE_SECONDS
+from app.core.versions import versions
+
+COUNT_CACHE_MAX_ENTRIES = 1000
+
+
+class CountMode(str, Enum):
+    """How a list endpoint computes its total."""
+    AUTO = "auto"
+    EXACT = "exact"
+    NONE = "none"
+
+
+def _filter_key(query: dict) -> str:
+    return json.dumps(query, sort_keys=True, default=str, ensure_ascii=False)
+
+
+class CountService:
+    """Count service class."""
+
+    # (collection, normalized filter) -> (collection version, expires at, count)
+    _cache: Dict[Tuple[str, str], Tuple[int, float, int]] = {}
+
+    @staticmethod
+    async def _cached_count(collection, query: dict, refresh: bool = False) -> int:
+        key = (collection.name, _filter_key(query))
+        version = versions.get(collection.name)
+        now = time.monotonic()
+        cached = CountService._cache.get(key)
+        if not refresh and cached and cached[0] == version and cached[1] > now:
+            return cached[2]
+
+        count = await collection.count_documents(query)
+        if len(CountService._cache) >= COUNT_CACHE_MAX_ENTRIES:
+            CountService._cache = {k: v for k, v in CountService._cache.items() if v[1] > now}
+            if len(CountService._cache) >= COUNT_CACHE_MAX_ENTRIES:
+                CountService._cache.clear()
+        CountService._cache[key] = (version, now + COUNT_CACHE_SECONDS, count)
+        return count
+
+    @staticmethod
+    async def count(collection, query: dict, mode: CountMode = CountMode.AUTO,
+                    base_query: Optional[dict] = None) -> Optional[int]:
+        """Total for a list query, or None in `none` mode.
+
+        `base_query` is the filter every request of the list applies (e.g. only active
+        documents). When `query` is just that, the total is the estimated collection
+        size minus the cached count of the documents it excludes.
+        """
+        mode = CountMode(mode)
+        if mode == CountMode.NONE:
+            return None
+        if mode == CountMode.EXACT:
+            return await CountService._cached_count(collection, query, refresh=True)
+
+        base_query = base_query or {}
+        if query == base_query:
+            estimated = await collection.estimated_document_count()
+            if not base_query:
+                return estimated
+            excluded = await CountService._cached_count(collection, {"$nor": [base_query]})
+            return max(estimated - excluded, 0)
+        return await CountService._cached_count(collection, query)
+
+
+def page_info(total: Optional[int], fetched: int, page: int, page_size: int) -> dict:
+    """Pagination fields of a list response.
+
+    Without a total (`none` mode) the endpoint fetched `page_size + 1` rows, so more
+    rows than `page_size` means there is a next page.
+    """
+    if total is None:
+        return {"total": None, "page": page, "page_size": page_size,
+                "total_pages": None, "has_more": fetched > page_size}
+    return {
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": math.ceil(total / page_size) if total > 0 else 1,
+        "has_more": page * page_size < total,
+    }
+
+
+def fetch_limit(page_size: int, mode: CountMode) -> int:
+    """Rows to fetch for one page: one extra when `has_more` replaces the total."""
+    return page_size + 1 if CountMode(mode) == CountMode.NONE else page_size
@@ -0,0 +1,130 @@
+"""
+In-process event hub and server-sent events (SSE) streaming.
+
+Services publish small JSON-serialisable events; every connected SSE client gets
+its own bounded buffer holding only the events it subscribed to, so a slow client
+can only lose its own oldest events. Events published with a `key` (running
+counters, for instance) replace a still-undelivered event with the same key
+instead of queueing behind it. A client that lost events is sent a `resync` event
+telling it to reload the full state.
+"""
+
+import asyncio
+import itertools
+import json
+from collections import OrderedDict
+from typing import AsyncIterator, Hashable, Iterable, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+SUBSCRIBER_QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+
+class Subscriber:
+    """Bounded, coalescing buffer of the events one consumer has not read yet."""
+
+    def __init__(self, size: int, events: Optional[Set[str]] = None):
+        self.size = size
+        self.events = events
+        self.dropped = 0
+        self._pending: "OrderedDict[Hashable, Tuple[str, dict]]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._sequence = itertools.count()
+
+    def wants(self, event: str) -> bool:
+        return self.events is None or event in self.events
+
+    def put(self, event: str, data: dict, key: Optional[Hashable] = None):
+        if key is not None and (event, key) in self._pending:
+            self._pending[(event, key)] = (event, data)
+            return
+        if len(self._pending) >= self.size:
+            # Slow client: drop its oldest event rather than stall the writer
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._pending[(event, key) if key is not None else next(self._sequence)] = (event, data)
+        self._ready.set()
+
+    def get_nowait(self) -> Tuple[str, dict]:
+        if not self._pending:
+            raise asyncio.QueueEmpty
+        message = self._pending.popitem(last=False)[1]
+        if not self._pending:
+            self._ready.clear()
+        return message
+
+    async def get(self) -> Tuple[str, dict]:
+        while not self._pending:
+            await self._ready.wait()
+        return self.get_nowait()
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+
+class EventHub:
+    """Fan-out of published events to subscribers."""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+
+    def subscribe(self, events: Optional[Iterable[str]] = None) -> Subscriber:
+        subscriber = Subscriber(self.queue_size, set(events) if events is not None else None)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: dict, key: Optional[Hashable] = None):
+        """Buffer an event for every interested subscriber without ever blocking the publisher."""
+        message = jsonable_encoder(data)
+        for subscriber in self._subscribers:
+            if subscriber.wants(event):
+                subscriber.put(event, message, key)
+
+    def has_subscribers(self, event: str) -> bool:
+        return any(subscriber.wants(event) for subscriber in self._subscribers)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream(hub: EventHub, request: Request, events: Optional[Set[str]]) -> AsyncIterator[str]:
+    subscriber = hub.subscribe(events)
+    try:
+        while True:
+            try:
+                event, data = await asyncio.wait_for(subscriber.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if subscriber.dropped:
+                yield format_sse("resync", {"dropped": subscriber.dropped})
+                subscriber.dropped = 0
+            yield format_sse(event, data)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def sse_response(hub: EventHub, request: Request, events: Optional[Iterable[str]] = None) -> StreamingResponse:
+    """Stream the hub's events (optionally only the named ones) to one client."""
+    return StreamingResponse(
+        _stream(hub, request, set(events) if events is not None else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+event_hub = EventHub()
@@ -0,0 +1,51 @@
+"""
+Helpers for building Excel exports with openpyxl's write-only mode.
+"""
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+from typing import List, Optional
+
+
+def new_write_only_sheet(title: str, headers: List[str], widths: List[float]):
+    """Create a write-only workbook whose single sheet starts with a styled header row.
+
+    Column widths are fixed up front: write-only sheets cannot be re-scanned for auto-sizing.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+
+    for col, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    # Style for headers
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+    return wb, ws
+
+
+def append_totals_row(ws, values: List[Optional[object]]):
+    """Append a blank spacer row followed by a bold totals row (None leaves a cell empty)."""
+    ws.append([])
+    bold = Font(bold=True)
+    row = []
+    for value in values:
+        if value is None:
+            row.append(None)
+            continue
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = bold
+        row.append(cell)
+    ws.append(row)
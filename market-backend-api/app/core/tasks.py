@@ -0,0 +1,54 @@
+"""
+Background task registry for work that runs alongside the API on the event loop.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def start_background(name: str, coro: Awaitable) -> asyncio.Task:
+    """Start a long-running coroutine and keep a handle so it can be cancelled on shutdown."""
+    existing = _tasks.get(name)
+    if existing and not existing.done():
+        return existing
+    task = asyncio.create_task(coro, name=name)
+    _tasks[name] = task
+    return task
+
+
+def start_periodic(
+    name: str,
+    interval_seconds: float,
+    func: Callable[[], Awaitable],
+    run_immediately: bool = False,
+) -> asyncio.Task:
+    """Run `func` every `interval_seconds`; errors are logged and never stop the loop."""
+
+    async def _loop():
+        if not run_immediately:
+            await asyncio.sleep(interval_seconds)
+        while True:
+            try:
+                await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Background task '{name}' failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    return start_background(name, _loop())
+
+
+async def stop_all():
+    """Cancel every registered background task."""
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
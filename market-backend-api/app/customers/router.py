@@ -2,15 +2,17 @@
 Customer router with endpoints for customer management (MongoDB + Motor).
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from typing import Optional, List
-import math
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import Optional, List, Literal
 from app.auth.dependencies import get_current_admin, get_current_customer, get_current_staff
 from app.customers.schemas import (
     CustomerCreate, CustomerUpdate, CustomerResponse,
-    WalletTransaction, CustomerFilter, CustomerStats, CustomerListResponse
+    WalletTransaction, CustomerFilter, CustomerStats, CustomerListResponse,
+    CustomerOverview
 )
 from app.customers.service import CustomerService
+from app.core.versions import conditional_response, versions
+from app.core.counts import CountMode, fetch_limit, page_info
 from app.database.connection import get_db
 
 router = APIRouter()
@@ -27,6 +29,8 @@ async def create_customer(
 
 @router.get("/", response_model=CustomerListResponse)
 async def get_customers(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: Optional[str] = Query(None),
@@ -34,28 +38,31 @@ async def get_customers(
     status: Optional[str] = Query(None),
     min_balance: Optional[float] = Query(None, ge=0),
     max_balance: Optional[float] = Query(None, ge=0),
+    sort: Optional[Literal["spend", "recent"]] = Query(None),
+    count: CountMode = Query(CountMode.AUTO, description="auto, exact or none (has_more only)"),
     current_admin = Depends(get_current_staff)
 ):
     """Get customers with filtering and pagination (Admin only)."""
+    not_modified = conditional_response(request, response, ("customers",))
+    if not_modified:
+        return not_modified
     filters = CustomerFilter(
         search=search,
         has_balance=has_balance,
         status=status,
         min_balance=min_balance,
-        max_balance=max_balance
+        max_balance=max_balance,
+        sort=sort
     )
     skip = (page - 1) * page_size
 
-    customers, total = await CustomerService.get_customers(skip=skip, limit=page_size, filters=filters)
-
-    total_pages = math.ceil(total / page_size) if total > 0 else 1
+    customers, total = await CustomerService.get_customers(
+        skip=skip, limit=fetch_limit(page_size, count), filters=filters, count_mode=count
+    )
 
     return CustomerListResponse(
-        customers=customers,
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages
+        customers=customers[:page_size],
+        **page_info(total, len(customers), page, page_size)
     )
 
 
@@ -86,6 +93,9 @@ async def get_my_profile(
         "wallet_balance": customer.get("wallet_balance", 0.0),
         "is_active": customer.get("is_active", True),
         "first_login": customer.get("first_login", True),
+        "total_spent": customer.get("total_spent", 0.0),
+        "invoice_count": customer.get("invoice_count", 0),
+        "last_purchase_at": customer.get("last_purchase_at"),
         "created_at": customer["created_at"],
         "updated_at": customer.get("updated_at")
     }
@@ -96,6 +106,7 @@ async def get_my_profile(
             {"_id": customer["_id"]},
             {"$set": {"wallet_balance": 0.0}}
         )
+        versions.bump("customers")
         customer_response["wallet_balance"] = 0.0
     
     return customer_response
@@ -111,10 +122,15 @@ async def get_customer_statistics(
 
 @router.get("/{customer_id}", response_model=CustomerResponse)
 async def get_customer(
+    request: Request,
+    response: Response,
     customer_id: str,
     current_admin = Depends(get_current_staff)
 ):
     """Get customer by ID (Admin only)."""
+    not_modified = conditional_response(request, response, ("customers",))
+    if not_modified:
+        return not_modified
     customer = await CustomerService.get_customer_by_id(customer_id)
     if not customer:
         raise HTTPException(
@@ -124,6 +140,22 @@ async def get_customer(
     return customer
 
 
+@router.get("/{customer_id}/overview", response_model=CustomerOverview)
+async def get_customer_overview(
+    request: Request,
+    response: Response,
+    customer_id: str,
+    invoices_limit: int = Query(10, ge=1, le=50),
+    movements_limit: int = Query(10, ge=1, le=50),
+    current_admin = Depends(get_current_staff)
+):
+    """Get the customer detail screen in one request (Admin only)."""
+    not_modified = conditional_response(request, response, ("customers", "invoices"))
+    if not_modified:
+        return not_modified
+    return await CustomerService.get_customer_overview(customer_id, invoices_limit, movements_limit)
+
+
 @router.put("/{customer_id}", response_model=CustomerResponse)
 async def update_customer(
     customer_id: str,
@@ -3,7 +3,7 @@ Customer related Pydantic schemas.
 """
 
 from pydantic import BaseModel, validator
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 
 
@@ -61,6 +61,9 @@ class CustomerResponse(CustomerBase):
     id: str
     first_login: bool
     is_active: bool
+    total_spent: float = 0.0
+    invoice_count: int = 0
+    last_purchase_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -71,10 +74,11 @@ class CustomerResponse(CustomerBase):
 class CustomerListResponse(BaseModel):
     """Customer list response schema."""
     customers: List[CustomerResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    has_more: bool = False
 
 
 class WalletTransaction(BaseModel):
@@ -103,6 +107,7 @@ class CustomerFilter(BaseModel):
     status: Optional[str] = None  # "active", "inactive", "first_login"
     min_balance: Optional[float] = None
     max_balance: Optional[float] = None
+    sort: Optional[Literal["spend", "recent"]] = None  # lifetime spend / last purchase, descending
 
 
 class CustomerStats(BaseModel):
@@ -114,3 +119,43 @@ class CustomerStats(BaseModel):
     customers_with_balance: int
     total_wallet_balance: float
     average_wallet_balance: float
+    total_spent: float = 0.0
+    invoice_count: int = 0
+
+
+class WalletMovement(BaseModel):
+    """Wallet transaction shown on the customer overview."""
+    id: str
+    invoice_id: Optional[str] = None
+    amount: float
+    transaction_type: str
+    description: Optional[str] = None
+    created_at: datetime
+
+
+class InvoiceSummary(BaseModel):
+    """Invoice header shown on the customer overview (no line items)."""
+    id: str
+    total: float
+    status: str
+    wallet_payment: float = 0.0
+    wallet_add: float = 0.0
+    discount_amount: float = 0.0
+    created_at: datetime
+
+
+class CustomerTotals(BaseModel):
+    """Lifetime purchase totals of a customer."""
+    total_spent: float = 0.0
+    invoice_count: int = 0
+    average_invoice: float = 0.0
+    last_purchase_at: Optional[datetime] = None
+
+
+class CustomerOverview(BaseModel):
+    """Everything the customer detail screen shows, in one response."""
+    customer: CustomerResponse
+    wallet_balance: float
+    wallet_movements: List[WalletMovement]
+    recent_invoices: List[InvoiceSummary]
+    totals: CustomerTotals
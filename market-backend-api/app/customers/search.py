@@ -0,0 +1,92 @@
+"""
+Normalized customer search keys.
+
+Every customer stores digits-only `search_phone`, its reverse `search_phone_rev`
+(so "last 4 digits" becomes a prefix match) and a normalized Arabic `search_name`
+plus its words. Searches are anchored, case-sensitive prefix regexes on these
+fields, which MongoDB answers with an index range scan instead of a collection scan.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+# Arabic-Indic (U+0660..) and Eastern Arabic-Indic (U+06F0..) digits
+_DIGITS = {**{0x0660 + i: str(i) for i in range(10)}, **{0x06F0 + i: str(i) for i in range(10)}}
+_NON_DIGITS = re.compile(r"\D")
+
+# Tashkeel, superscript alef and tatweel are dropped; letter variants are folded
+_DIACRITICS = re.compile("[\u064B-\u0652\u0670\u0640]")
+_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه",
+})
+_SPACES = re.compile(r"\s+")
+_PHONE_TERM = re.compile(r"^[\d\s+\-()]+$")
+
+SEARCH_INDEXES = ("search_phone", "search_phone_rev", "search_name", "search_name_words")
+
+def normalize_phone(value: Optional[str]) -> str:
+    """Digits only, with Arabic-Indic digits mapped to ASCII."""
+    return _NON_DIGITS.sub("", (value or "").translate(_DIGITS))
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """Lower-cased name with Arabic diacritics removed and letter variants unified."""
+    value = _DIACRITICS.sub("", (value or "").translate(_LETTERS))
+    return _SPACES.sub(" ", value).strip().lower()
+
+
+def search_keys(name: Optional[str], phone: Optional[str]) -> Dict[str, object]:
+    """The stored search fields for a customer's name and phone."""
+    digits = normalize_phone(phone)
+    normalized = normalize_name(name)
+    return {
+        "search_phone": digits,
+        "search_phone_rev": digits[::-1],
+        "search_name": normalized,
+        "search_name_words": normalized.split(),
+    }
+
+
+def _prefix(value: str) -> dict:
+    return {"$regex": f"^{re.escape(value)}"}
+
+
+def search_query(term: str) -> Optional[dict]:
+    """An `$or` condition matching customers by phone prefix/suffix or name prefix."""
+    term = term.strip()
+    if _PHONE_TERM.match(term):
+        digits = normalize_phone(term)
+        if not digits:
+            return None
+        return {"$or": [
+            {"search_phone": _prefix(digits)},
+            {"search_phone_rev": _prefix(digits[::-1])},
+        ]}
+
+    name = normalize_name(term)
+    if not name:
+        return None
+    if " " in name:
+        return {"search_name": _prefix(name)}
+    # A single word matches the start of any word of the name
+    return {"search_name_words": _prefix(name)}
+
+
+def backfill_search_keys(sync_db, batch_size: int = 1000) -> int:
+    """Store the search keys on every customer missing them (pymongo, batched)."""
+    updated = 0
+    operations: List[UpdateOne] = []
+    cursor = sync_db.customers.find({"search_phone": {"$exists": False}}, {"name": 1, "phone": 1})
+    for doc in cursor:
+        operations.append(UpdateOne(
+            {"_id": doc["_id"]}, {"$set": search_keys(doc.get("name"), doc.get("phone"))}
+        ))
+        if len(operations) >= batch_size:
+            updated += sync_db.customers.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += sync_db.customers.bulk_write(operations, ordered=False).modified_count
+    return updated
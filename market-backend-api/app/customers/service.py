@@ -2,15 +2,83 @@
 Customer service layer.
 """
 
+import asyncio
 from typing import List, Optional, Tuple
 from fastapi import HTTPException, status
 import math
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
 import re
 from app.customers.models import Customer
 from app.customers.schemas import CustomerCreate, CustomerUpdate, CustomerFilter
+from app.customers.search import backfill_search_keys, search_keys, search_query
 from app.database.connection import db
+from app.core.versions import versions
+from app.core.counts import CountMode, CountService
+from app.activity.service import ActivityService, customer_activity
+
+STATS_ID = "customers"
+
+# Sort orders of the customer list, each backed by an index
+CUSTOMER_SORTS = {
+    "spend": [("total_spent", -1), ("_id", -1)],
+    "recent": [("last_purchase_at", -1), ("_id", -1)],
+}
+
+
+def stats_contribution(doc: Optional[dict]) -> dict:
+    """What one customer document adds to the global statistics document."""
+    if not doc:
+        return {
+            "total_customers": 0, "active_customers": 0, "inactive_customers": 0,
+            "first_login_customers": 0, "customers_with_balance": 0, "total_wallet_balance": 0.0,
+        }
+    balance = doc.get("wallet_balance") or 0.0
+    return {
+        "total_customers": 1,
+        "active_customers": int(doc.get("is_active") is True and doc.get("first_login") is False),
+        "inactive_customers": int(doc.get("is_active") is False),
+        "first_login_customers": int(doc.get("first_login") is True),
+        "customers_with_balance": int(balance > 0),
+        "total_wallet_balance": balance,
+    }
+
+
+def rebuild_statistics(sync_db) -> dict:
+    """Recompute per-customer purchase aggregates and the global statistics document (pymongo)."""
+    totals = {}
+    for row in sync_db.invoices.aggregate([{"$group": {
+        "_id": {"$toString": "$customer_id"},
+        "total_spent": {"$sum": "$total"},
+        "invoice_count": {"$sum": 1},
+        "last_purchase_at": {"$max": "$created_at"},
+    }}]):
+        totals[row.pop("_id")] = row
+
+    stats = stats_contribution(None)
+    stats.update({"total_spent": 0.0, "invoice_count": 0})
+    operations = []
+    for doc in sync_db.customers.find({}, {"is_active": 1, "first_login": 1, "wallet_balance": 1}):
+        purchases = totals.get(str(doc["_id"]))
+        if purchases:
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": purchases}))
+        else:
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"total_spent": 0.0, "invoice_count": 0}, "$unset": {"last_purchase_at": ""}}
+            ))
+        for field, value in stats_contribution(doc).items():
+            stats[field] += value
+    if operations:
+        sync_db.customers.bulk_write(operations, ordered=False)
+
+    # Invoices of deleted customers still count towards the global totals
+    stats["total_spent"] = sum(row["total_spent"] for row in totals.values())
+    stats["invoice_count"] = sum(row["invoice_count"] for row in totals.values())
+    stats["updated_at"] = datetime.utcnow()
+    sync_db.stats.replace_one({"_id": STATS_ID}, stats, upsert=True)
+    return stats
 
 
 class CustomerService:
@@ -32,8 +100,15 @@ class CustomerService:
         customer_data["is_active"] = True
         customer_data["first_login"] = True
         customer_data["wallet_balance"] = 0.0
+        customer_data.update(search_keys(customer.name, customer.phone))
+        customer_data.update({"total_spent": 0.0, "invoice_count": 0})
 
         insert_result = await db.customers.insert_one(customer_data)
+        await CustomerService.record_stats_change(None, customer_data)
+        versions.bump("customers")
+        await ActivityService.record(customer_activity(
+            str(insert_result.inserted_id), customer.name, customer.phone, customer_data["created_at"]
+        ))
         created_customer = await db.customers.find_one({"_id": insert_result.inserted_id})
 
         created_customer["id"] = str(created_customer["_id"])
@@ -44,17 +119,19 @@ class CustomerService:
     async def get_customers(
         skip: int = 0, 
         limit: int = 100,
-        filters: Optional[CustomerFilter] = None
-    ) -> Tuple[List[Customer], int]:
+        filters: Optional[CustomerFilter] = None,
+        count_mode: CountMode = CountMode.AUTO
+    ) -> Tuple[List[Customer], Optional[int]]:
         """Get customers with filtering and pagination."""
         query = {"is_active": True}
 
         if filters:
             if filters.search:
-                query["$or"] = [
-                    {"name": {"$regex": filters.search, "$options": "i"}},
-                    {"phone": {"$regex": filters.search, "$options": "i"}},
-                ]
+                search = search_query(filters.search)
+                # A term with nothing searchable left after normalizing matches no customer
+                if search is None:
+                    return [], 0
+                query.update(search)
             if filters.has_balance is not None:
                 if filters.has_balance:
                     query["wallet_balance"] = {"$gt": 0}
@@ -72,8 +149,11 @@ class CustomerService:
             if filters.max_balance is not None:
                 query.setdefault("wallet_balance", {}).update({"$lte": filters.max_balance})
 
-        total = await db.customers.count_documents(query)
-        cursor = db.customers.find(query).skip(skip).limit(limit)
+        total = await CountService.count(db.customers, query, count_mode, base_query={"is_active": True})
+        cursor = db.customers.find(query)
+        if filters and filters.sort:
+            cursor = cursor.sort(CUSTOMER_SORTS[filters.sort])
+        cursor = cursor.skip(skip).limit(limit)
         customers = []
         async for customer in cursor:
             customer["id"] = str(customer["_id"])
@@ -91,6 +171,65 @@ class CustomerService:
         return customer
 
     
+    @staticmethod
+    async def get_customer_overview(customer_id: str, invoices_limit: int = 10, movements_limit: int = 10) -> dict:
+        """Profile, wallet movements, recent invoices and lifetime totals in one aggregation.
+
+        Both lookups are bounded and served by the (customer_id, created_at) indexes, and the
+        totals come from the aggregates kept on the customer, so the cost does not grow with
+        the customer's history.
+        """
+        if not ObjectId.is_valid(customer_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found")
+
+        def recent(collection: str, limit: int, fields: dict) -> dict:
+            return {"$lookup": {
+                "from": collection,
+                "let": {"customer_id": {"$toString": "$_id"}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$customer_id", "$$customer_id"]}}},
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": limit},
+                    {"$project": fields},
+                ],
+                "as": collection,
+            }}
+
+        pipeline = [
+            {"$match": {"_id": ObjectId(customer_id), "is_active": True}},
+            {"$project": {"password_hash": 0}},
+            recent("wallet_transactions", movements_limit, {
+                "invoice_id": 1, "amount": 1, "transaction_type": 1, "description": 1, "created_at": 1,
+            }),
+            recent("invoices", invoices_limit, {
+                "total": 1, "status": 1, "wallet_payment": 1, "wallet_add": 1,
+                "discount_amount": 1, "created_at": 1,
+            }),
+        ]
+        result = await db.customers.aggregate(pipeline).to_list(length=1)
+        if not result:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found")
+
+        customer = result[0]
+        movements = customer.pop("wallet_transactions")
+        invoices = customer.pop("invoices")
+        customer["id"] = str(customer["_id"])
+        total_spent = customer.get("total_spent", 0.0)
+        invoice_count = customer.get("invoice_count", 0)
+
+        return {
+            "customer": customer,
+            "wallet_balance": customer.get("wallet_balance", 0.0),
+            "wallet_movements": [{**doc, "id": str(doc["_id"])} for doc in movements],
+            "recent_invoices": [{**doc, "id": str(doc["_id"])} for doc in invoices],
+            "totals": {
+                "total_spent": total_spent,
+                "invoice_count": invoice_count,
+                "average_invoice": total_spent / invoice_count if invoice_count else 0.0,
+                "last_purchase_at": customer.get("last_purchase_at"),
+            },
+        }
+
     @staticmethod
     async def update_customer(customer_id: str, customer_update: CustomerUpdate) -> Optional[Customer]:
         """Update a customer."""
@@ -102,9 +241,15 @@ class CustomerService:
             )
         
         update_data = {k: v for k, v in customer_update.dict().items() if v is not None}
+        if "name" in update_data or "phone" in update_data:
+            update_data.update(search_keys(
+                update_data.get("name", customer["name"]), update_data.get("phone", customer["phone"])
+            ))
         await db.customers.update_one({"_id": ObjectId(customer_id)}, {"$set": update_data})
+        versions.bump("customers")
         updated_customer = await db.customers.find_one({"_id": ObjectId(customer_id)})
         if updated_customer:
+            await CustomerService.record_stats_change(customer, updated_customer)
             updated_customer["id"] = str(updated_customer["_id"])
         return updated_customer
 
@@ -123,6 +268,8 @@ class CustomerService:
             {"_id": ObjectId(customer_id)},
             {"$set": {"is_active": False}}
         )
+        await CustomerService.record_stats_change(customer, {**customer, "is_active": False})
+        versions.bump("customers")
         return result.modified_count > 0
 
     
@@ -147,6 +294,8 @@ class CustomerService:
             {"_id": ObjectId(customer_id)},
             {"$set": {"wallet_balance": new_balance}}
         )
+        await CustomerService.record_stats_change(customer, {**customer, "wallet_balance": new_balance})
+        versions.bump("customers")
 
         updated_customer = await db.customers.find_one({"_id": ObjectId(customer_id)})
         if updated_customer:
@@ -155,37 +304,57 @@ class CustomerService:
 
     
     @staticmethod
-    async def get_customer_statistics() -> dict:
-        """Get customer statistics."""
-        pipeline = [
-            {
-                "$group": {
-                    "_id": None,
-                    "total_customers": {"$sum": 1},
-                    "active_customers": {
-                        "$sum": {
-                            "$cond": [{"$and": [{"$eq": ["$is_active", True]}, {"$eq": ["$first_login", False]}]}, 1, 0]
-                        }
-                    },
-                    "inactive_customers": {
-                        "$sum": {"$cond": [{"$eq": ["$is_active", False]}, 1, 0]}
-                    },
-                    "first_login_customers": {
-                        "$sum": {"$cond": [{"$eq": ["$first_login", True]}, 1, 0]}
-                    },
-                    "customers_with_balance": {
-                        "$sum": {"$cond": [{"$gt": ["$wallet_balance", 0]}, 1, 0]}
-                    },
-                    "total_wallet_balance": {"$sum": "$wallet_balance"}
-                }
-            }
-        ]
+    async def ensure_search_keys():
+        """Backfill the search keys of customers created before they existed."""
+        if await db.customers.find_one({"search_phone": {"$exists": False}}, {"_id": 1}):
+            from app.database.sync_connection import get_sync_db
+            updated = await asyncio.to_thread(backfill_search_keys, get_sync_db())
+            print(f"✅ Customer search keys backfilled for {updated} customers")
 
-        result = await db.customers.aggregate(pipeline).to_list(length=1)
-        stats = result[0] if result else {}
+    @staticmethod
+    async def record_stats_change(before: Optional[dict], after: Optional[dict]):
+        """Apply the difference a customer write made to the global statistics document."""
+        old, new = stats_contribution(before), stats_contribution(after)
+        delta = {field: new[field] - old[field] for field in new if new[field] != old[field]}
+        if delta:
+            await db.stats.update_one({"_id": STATS_ID}, {"$inc": delta}, upsert=True)
+
+    @staticmethod
+    async def record_purchase(customer_id: str, amount: float, invoices: int = 1,
+                              purchased_at: Optional[datetime] = None):
+        """Add an invoice (or a negative correction) to a customer's lifetime aggregates."""
+        if not amount and not invoices:
+            return
+        update = {"$inc": {"total_spent": amount, "invoice_count": invoices}}
+        if purchased_at is not None:
+            update["$max"] = {"last_purchase_at": purchased_at}
+        if ObjectId.is_valid(customer_id):
+            await db.customers.update_one({"_id": ObjectId(customer_id)}, update)
+        await db.stats.update_one(
+            {"_id": STATS_ID}, {"$inc": {"total_spent": amount, "invoice_count": invoices}}, upsert=True
+        )
+        versions.bump("customers")
+
+    @staticmethod
+    async def ensure_statistics():
+        """Build the aggregates once for databases created before they existed."""
+        if not await db.stats.find_one({"_id": STATS_ID}, {"_id": 1}):
+            from app.database.sync_connection import get_sync_db
+            stats = await asyncio.to_thread(rebuild_statistics, get_sync_db())
+            versions.bump("customers")
+            print(f"✅ Customer statistics rebuilt for {stats['total_customers']} customers")
+
+    @staticmethod
+    async def get_customer_statistics() -> dict:
+        """Get customer statistics from the incrementally maintained statistics document."""
+        stats = await db.stats.find_one({"_id": STATS_ID})
+        if not stats:
+            await CustomerService.ensure_statistics()
+            stats = await db.stats.find_one({"_id": STATS_ID}) or {}
 
         total_customers = stats.get("total_customers", 0)
-        average_wallet_balance = stats["total_wallet_balance"] / total_customers if total_customers else 0.0
+        total_wallet_balance = stats.get("total_wallet_balance", 0.0)
+        average_wallet_balance = total_wallet_balance / total_customers if total_customers else 0.0
 
         return {
             "total_customers": total_customers,
@@ -193,7 +362,8 @@ class CustomerService:
             "inactive_customers": stats.get("inactive_customers", 0),
             "first_login_customers": stats.get("first_login_customers", 0),
             "customers_with_balance": stats.get("customers_with_balance", 0),
-            "total_wallet_balance": stats.get("total_wallet_balance", 0.0),
-            "average_wallet_balance": average_wallet_balance
+            "total_wallet_balance": total_wallet_balance,
+            "average_wallet_balance": average_wallet_balance,
+            "total_spent": stats.get("total_spent", 0.0),
+            "invoice_count": stats.get("invoice_count", 0),
         }
-
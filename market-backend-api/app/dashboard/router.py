@@ -2,69 +2,53 @@
 Dashboard router with analytics and statistics endpoints.
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.auth.dependencies import get_current_admin
 from app.products.service import ProductService
-from app.customers.service import CustomerService
-from app.invoices.service import InvoiceService
+from app.dashboard.service import LIVE_EVENTS, DashboardService
+from app.activity.service import ActivityService
+from app.reports.service import store_today
+from app.core.events import event_hub, sse_response
 from app.database.connection import db
 from app.database.connection import get_db as get_database
-from bson import ObjectId
 
 router = APIRouter()
 
 
 @router.get("/stats")
 async def get_dashboard_statistics(current_admin = Depends(get_current_admin)):
-    """Get comprehensive dashboard statistics (Admin only)."""
-    
-    # Products
-    products, _ = await ProductService.get_products(skip=0, limit=1000)
-    low_stock = await ProductService.get_low_stock_products()
-    
-    # Customers
-    customer_stats = await CustomerService.get_customer_statistics()
+    """Get comprehensive dashboard statistics (Admin only).
 
-    # Invoices
-    invoice_stats = await InvoiceService.get_invoice_statistics()
-    
+    Served from a cached snapshot refreshed at most every few seconds.
+    """
+    return await DashboardService.get_snapshot()
 
-    today = datetime.combine(date.today(), datetime.min.time())
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
 
-    # Sales for periods
-    async def total_sales(start_date):
-        pipeline = [
-            {"$match": {
-                "created_at": {"$gte": start_date},
-                "status": "Paid"
-            }},
-            {"$group": {"_id": None, "total": {"$sum": "$total"}}}
-        ]
-        result = await db.invoices.aggregate(pipeline).to_list(length=1)
-        return result[0]["total"] if result else 0.0
+@router.get("/stream")
+async def stream_dashboard(request: Request, current_admin = Depends(get_current_admin)):
+    """Server-sent events stream of dashboard deltas (Admin only).
 
-    today_sales = await total_sales(today)
-    week_sales = await total_sales(week_ago)
-    month_sales = await total_sales(month_ago)
+    Events: `invoice`, `invoice_updated`, `invoice_deleted`, `alert`, `revenue`, and
+    `resync` when this client fell behind and should reload `/stats`.
+    """
+    return sse_response(event_hub, request, events=LIVE_EVENTS)
 
-    return {
-        "products": {
-            "total": len(products),
-            "low_stock": len(low_stock)
-        },
-        "customers": customer_stats,
-        "invoices": invoice_stats,
-        "sales": {
-            "today": today_sales,
-            "week": week_sales,
-            "month": month_sales,
-            "total": invoice_stats["total_revenue"]
-        }
-    }
+
+@router.get("/heatmap")
+async def get_sales_heatmap(
+    start: Optional[date] = Query(None, description="First day (store-local), default 27 days before end"),
+    end: Optional[date] = Query(None, description="Last day (store-local), default today"),
+    current_admin=Depends(get_current_admin)
+):
+    """Sales by weekday and hour of day in the store's timezone (Admin only).
+
+    `revenue` and `invoices` are 7x24 matrices: rows follow `weekdays`, columns are hours 0-23.
+    """
+    end = end or store_today()
+    start = start or end - timedelta(days=27)
+    return await DashboardService.get_heatmap(start, end)
 
 
 @router.get("/sales-trend")
@@ -108,35 +92,11 @@ async def get_sales_trend(
 async def get_category_distribution(
     current_admin=Depends(get_current_admin)
 ):
-    """Get product distribution by category (Admin only)."""
-    
-    pipeline = [
-        {
-            "$match": {"is_active": True}
-        },
-        {
-            "$lookup": {
-                "from": "products",
-                "localField": "_id",
-                "foreignField": "category_id",
-                "as": "products"
-            }
-        },
-        {
-            "$project": {
-                "name": 1,
-                "product_count": {"$size": "$products"}
-            }
-        }
-    ]
-
-    categories = await db.categories.aggregate(pipeline).to_list(length=100)
+    """Get product distribution by category (Admin only).
 
-    return {
-        "categories": [
-            {"name": c["name"], "value": c["product_count"]} for c in categories
-        ]
-    }
+    Served from the per-category counters kept up to date by product writes.
+    """
+    return {"categories": await ProductService.get_category_distribution()}
 
 
 @router.get("/recent-activities")
@@ -145,43 +105,20 @@ async def get_recent_activities(
     current_admin=Depends(get_current_admin)
 ):
     """Get recent activities (invoices + customers) (Admin only)."""
-
-    activities = []
-
-    # Last 5 invoices
-    invoices_cursor = db.invoices.find().sort("created_at", -1).limit(limit // 2)
-    async for inv in invoices_cursor:
-        customer = await db.customers.find_one({"_id": ObjectId(inv["customer_id"])})
-        customer_name = customer["name"] if customer else "Unknown"
-        activities.append({
-            "type": "invoice",
-            "description": f"New invoice #{str(inv['_id'])[:6]} for {customer_name}",
-            "amount": inv["total"],
-            "timestamp": inv["created_at"],
-            "status": inv["status"]
-        })
-
-    # Last 5 customers
-    customers_cursor = db.customers.find().sort("created_at", -1).limit(limit // 2)
-    async for c in customers_cursor:
-        activities.append({
-            "type": "customer",
-            "description": f"New customer: {c['name']}",
-            "phone": c["phone"],
-            "timestamp": c["created_at"],
-            "status": "active"
-        })
-
-    activities.sort(key=lambda x: x["timestamp"], reverse=True)
-
     return {
-        "activities": activities[:limit]
+        "activities": await ActivityService.get_recent(limit)
     }
 
 
+@router.get("/recent-activities/stream")
+async def stream_recent_activities(request: Request, current_admin=Depends(get_current_admin)):
+    """Server-sent events stream of new activities (Admin only)."""
+    return sse_response(event_hub, request, events=["activity"])
+
+
 @router.get("/low-stock-products")
 async def get_low_stock_products(
-    threshold: int = Query(10, ge=1, le=100),
+    threshold: Optional[int] = Query(None, ge=1, le=100, description="Fixed threshold instead of reorder points"),
     current_admin=Depends(get_current_admin)
 ):
     """Get products with low stock (Admin only)."""
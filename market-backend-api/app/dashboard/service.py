@@ -0,0 +1,184 @@
+"""
+Dashboard snapshot service.
+
+The dashboard statistics are computed by concurrent count-only queries and cached.
+A snapshot younger than DASHBOARD_SNAPSHOT_TTL_SECONDS is served as is; an older one
+is still served (stale-while-revalidate) for up to DASHBOARD_SNAPSHOT_STALE_SECONDS
+while a single background refresh runs. Concurrent requests without a usable
+snapshot all await that same refresh, so several admins refreshing at once cost one
+recomputation.
+
+The live dashboard stream carries the hub's invoice and alert events plus a
+`revenue` event with fresh sales counters, recomputed once per burst of invoice
+writes and coalesced for clients that have not read the previous one yet.
+
+The sales heatmap sums the hourly buckets of the sales rollup (one document per
+store-local day) into a weekday by hour-of-day matrix.
+"""
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from app.alerts.models import AlertType
+from app.alerts.service import AlertService
+from app.config import (
+    DASHBOARD_PUSH_SECONDS, DASHBOARD_SNAPSHOT_STALE_SECONDS,
+    DASHBOARD_SNAPSHOT_TTL_SECONDS, STORE_TIMEZONE
+)
+from app.core.counts import CountService
+from app.core.events import event_hub
+from app.core.tasks import start_background
+from app.customers.service import CustomerService
+from app.database.connection import db
+from app.invoices.models import PaymentStatus
+from app.invoices.service import InvoiceService
+from app.reports.service import report_days
+
+INVOICE_EVENTS = ("invoice", "invoice_updated", "invoice_deleted")
+LIVE_EVENTS = INVOICE_EVENTS + ("alert", "revenue")
+
+# Heatmap rows: the store's week starts on Saturday
+HEATMAP_WEEKDAYS = ("Saturday", "Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+HEATMAP_FIRST_WEEKDAY = 5  # date.weekday() of Saturday
+
+
+class DashboardService:
+    """Dashboard service class."""
+
+    _snapshot: Optional[dict] = None
+    _computed_at: float = 0.0
+    _refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def _sales_totals() -> dict:
+        """Paid sales of today, the last 7 days and the last 30 days in one aggregation."""
+        today = datetime.combine(date.today(), datetime.min.time())
+        week_ago = today - timedelta(days=7)
+        month_ago = today - timedelta(days=30)
+
+        def since(start: datetime) -> dict:
+            return {"$sum": {"$cond": [{"$gte": ["$created_at", start]}, "$total", 0]}}
+
+        pipeline = [
+            {"$match": {"status": PaymentStatus.PAID.value, "created_at": {"$gte": month_ago}}},
+            {"$group": {"_id": None, "today": since(today), "week": since(week_ago), "month": since(month_ago)}},
+        ]
+        result = await db.invoices.aggregate(pipeline).to_list(length=1)
+        totals = result[0] if result else {}
+        return {period: float(totals.get(period, 0.0)) for period in ("today", "week", "month")}
+
+    @staticmethod
+    async def _compute() -> dict:
+        products_total, low_stock, customer_stats, invoice_stats, sales = await asyncio.gather(
+            CountService.count(db.products, {"is_active": True}, base_query={"is_active": True}),
+            AlertService.count_products([AlertType.OUT_OF_STOCK, AlertType.LOW_STOCK]),
+            CustomerService.get_customer_statistics(),
+            InvoiceService.get_invoice_statistics(),
+            DashboardService._sales_totals(),
+        )
+        return {
+            "products": {
+                "total": products_total,
+                "low_stock": low_stock
+            },
+            "customers": customer_stats,
+            "invoices": invoice_stats,
+            "sales": {**sales, "total": invoice_stats["total_revenue"]},
+            "generated_at": datetime.utcnow(),
+        }
+
+    @staticmethod
+    async def _recompute() -> dict:
+        snapshot = await DashboardService._compute()
+        DashboardService._snapshot = snapshot
+        DashboardService._computed_at = time.monotonic()
+        return snapshot
+
+    @staticmethod
+    def _refresh() -> asyncio.Task:
+        """The running refresh, or a new one when none is in flight."""
+        task = DashboardService._refresh_task
+        if task is None or task.done():
+            task = start_background("dashboard-snapshot", DashboardService._recompute())
+            task.add_done_callback(DashboardService._log_failure)
+            DashboardService._refresh_task = task
+        return task
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Dashboard snapshot refresh failed: {task.exception()}")
+
+    @staticmethod
+    async def get_snapshot() -> dict:
+        """The dashboard statistics, recomputed at most once per TTL across all requests."""
+        age = time.monotonic() - DashboardService._computed_at
+        snapshot = DashboardService._snapshot
+        if snapshot is not None and age < DASHBOARD_SNAPSHOT_TTL_SECONDS:
+            return snapshot
+        if snapshot is not None and age < DASHBOARD_SNAPSHOT_TTL_SECONDS + DASHBOARD_SNAPSHOT_STALE_SECONDS:
+            DashboardService._refresh()
+            return snapshot
+        # Shielded so a client disconnecting does not cancel the refresh other requests await
+        return await asyncio.shield(DashboardService._refresh())
+
+    @staticmethod
+    async def revenue_counters() -> dict:
+        today = datetime.combine(date.today(), datetime.min.time())
+        sales, today_invoices = await asyncio.gather(
+            DashboardService._sales_totals(),
+            db.invoices.count_documents({"created_at": {"$gte": today}}),
+        )
+        return {"sales": sales, "today_invoices": today_invoices, "computed_at": datetime.utcnow()}
+
+    @staticmethod
+    async def push_revenue():
+        """Publish `revenue` counters after invoice writes, at most once per DASHBOARD_PUSH_SECONDS."""
+        subscriber = event_hub.subscribe(INVOICE_EVENTS)
+        try:
+            while True:
+                await subscriber.get()
+                # Let a burst of invoice writes settle, then recompute once for all of them
+                await asyncio.sleep(DASHBOARD_PUSH_SECONDS)
+                while subscriber.qsize():
+                    subscriber.get_nowait()
+                subscriber.dropped = 0
+                if not event_hub.has_subscribers("revenue"):
+                    continue
+                try:
+                    event_hub.publish("revenue", await DashboardService.revenue_counters(), key="revenue")
+                except Exception as e:
+                    print(f"❌ Dashboard revenue push failed: {e}")
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    @staticmethod
+    async def get_heatmap(start: date, end: date) -> dict:
+        """Revenue and invoice count per weekday (rows) and store-local hour (columns)."""
+        days = report_days(start, end)
+        revenue = [[0.0] * 24 for _ in HEATMAP_WEEKDAYS]
+        invoices = [[0] * 24 for _ in HEATMAP_WEEKDAYS]
+        # How many of each weekday the range covers, to turn totals into averages
+        day_counts = [0] * len(HEATMAP_WEEKDAYS)
+        for day in days:
+            day_counts[(day.weekday() - HEATMAP_FIRST_WEEKDAY) % 7] += 1
+
+        cursor = db.sales_hourly.find({"_id": {"$gte": start.isoformat(), "$lte": end.isoformat()}})
+        async for doc in cursor:
+            row = (date.fromisoformat(doc["_id"]).weekday() - HEATMAP_FIRST_WEEKDAY) % 7
+            for hour, amount in doc.get("revenue", {}).items():
+                revenue[row][int(hour)] += amount
+            for hour, count in doc.get("invoices", {}).items():
+                invoices[row][int(hour)] += count
+
+        return {
+            "start": start,
+            "end": end,
+            "timezone": STORE_TIMEZONE,
+            "weekdays": list(HEATMAP_WEEKDAYS),
+            "day_counts": day_counts,
+            "revenue": [[round(amount, 2) for amount in row] for row in revenue],
+            "invoices": invoices,
+        }
@@ -77,5 +77,20 @@ async def close_mongo_connection():
     client.close()
     print("❌ Disconnected from MongoDB!")
 
+_transactions_supported = None
+
+
+async def transactions_supported() -> bool:
+    """Whether the server is a replica set or sharded cluster, where multi-document transactions work."""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            print(f"ℹ️ Transactions unavailable, writes are not grouped: {e}")
+            _transactions_supported = False
+    return _transactions_supported
+
 def get_motor_client():
     return db
\ No newline at end of file
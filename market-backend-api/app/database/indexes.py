@@ -0,0 +1,74 @@
+"""
+Index definitions for the collections used by the API, created at startup.
+"""
+
+from app.config import (
+    ACTIVITY_FEED_RETENTION_DAYS, CATALOG_JOURNAL_RETENTION_DAYS, FACT_STORE_REVERSAL_RETENTION_DAYS
+)
+from app.customers.search import SEARCH_INDEXES
+from app.database.connection import db
+
+
+async def ensure_indexes():
+    """Create the indexes the services rely on (no-op when they already exist)."""
+    # Barcode / QR scanning and the barcode index poller
+    await db.products.create_index("product_id")
+    await db.products.create_index("sku")
+    await db.products.create_index("updated_at")
+    await db.products.create_index("expiry_date")
+    # Latest demand forecast run, checked by the periodic forecast scheduler
+    await db.products.create_index("forecast.computed_at", sparse=True)
+
+    # Background jobs: polling by type and expiry cleanup
+    await db.jobs.create_index([("type", 1), ("created_at", -1)])
+    await db.jobs.create_index("expires_at")
+
+    # Stock-takes: variance lines are read per stock-take
+    await db.stock_take_lines.create_index([("stock_take_id", 1), ("variance", 1)])
+    await db.stock_takes.create_index([("created_at", -1)])
+
+    # Stock ledger: per-product history and as-of range scans
+    await db.stock_movements.create_index([("product_id", 1), ("created_at", 1)])
+    await db.stock_movements.create_index([("created_at", 1)])
+    await db.stock_snapshots.create_index([("taken_at", 1), ("product_id", 1)])
+    await db.stock_snapshot_runs.create_index([("taken_at", 1)])
+
+    # Alerts: listed by type, re-evaluated per product
+    await db.alerts.create_index([("type", 1), ("quantity", 1)])
+    await db.alerts.create_index("product_id")
+
+    # Catalog sync journal: delta reads by version, old entries expire
+    await db.catalog_changes.create_index("version", unique=True)
+    await db.catalog_changes.create_index("created_at", expireAfterSeconds=CATALOG_JOURNAL_RETENTION_DAYS * 86400)
+
+    # Customer search: anchored prefix matches on the normalized keys
+    for field in SEARCH_INDEXES:
+        await db.customers.create_index(field)
+
+    # Customer list sorted by lifetime spend / last purchase
+    await db.customers.create_index([("is_active", 1), ("total_spent", -1), ("_id", -1)])
+    await db.customers.create_index([("is_active", 1), ("last_purchase_at", -1), ("_id", -1)])
+
+    # Customer overview: latest invoices and wallet movements per customer
+    await db.invoices.create_index([("customer_id", 1), ("created_at", -1)])
+    await db.wallet_transactions.create_index([("customer_id", 1), ("created_at", -1)])
+
+    # Invoice statistics and sales windows
+    await db.invoices.create_index([("status", 1), ("created_at", 1)])
+    await db.invoices.create_index([("created_at", -1)])
+
+    # Activity feed: latest entries first, old entries expire
+    await db.activity_feed.create_index("timestamp", expireAfterSeconds=ACTIVITY_FEED_RETENTION_DAYS * 86400)
+
+    # Sales reports: invoice items by store-local day, stored profit rows per closed day
+    await db.invoice_items.create_index([("day", 1), ("product_id", 1)])
+    await db.profit_daily.create_index("day")
+
+    # Sales rollup: product totals over a range of days, last sale per product
+    await db.sales_daily.create_index([("day", 1), ("product_id", 1)])
+    await db.sales_daily.create_index([("product_id", 1), ("day", -1)])
+
+    # Fact store: reversed invoice items are consumed by the next append, then expire
+    await db.invoice_item_reversals.create_index(
+        "reversed_at", expireAfterSeconds=FACT_STORE_REVERSAL_RETENTION_DAYS * 86400
+    )
@@ -0,0 +1,38 @@
+"""
+Synchronous MongoDB access for code running outside the event loop (job worker processes).
+"""
+
+from pymongo import MongoClient
+
+from app.database.connection import MONGODB_URI, MONGO_DB_NAME
+
+_client = None
+_transactions_supported = None
+
+
+def get_sync_db():
+    """Return a pymongo database handle, creating one client per process."""
+    global _client
+    if _client is None:
+        _client = MongoClient(
+            MONGODB_URI,
+            tlsAllowInvalidCertificates=True,
+            tlsAllowInvalidHostnames=True,
+        )
+    return _client[MONGO_DB_NAME]
+
+
+def in_transaction_sync(sync_db, write):
+    """Call `write(session)` in one transaction where the server supports them, else `write(None)`."""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = sync_db.client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    if not _transactions_supported:
+        return write(None)
+    with sync_db.client.start_session() as session:
+        with session.start_transaction():
+            return write(session)
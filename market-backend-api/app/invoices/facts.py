@@ -0,0 +1,123 @@
+"""
+Sale facts stored on every invoice item.
+
+Besides quantity and unit price, each `invoice_items` document carries what the
+sales reports group and filter on, captured when the invoice is written: the sale
+instant with its store-local `day` and `hour`, the cashier, the product's category and unit
+`cost` (buying price) at that time, the line `revenue` after the invoice's
+discount share, and the invoice's payment `status` (kept in step by the status
+write paths). Reports then aggregate `invoice_items` alone, without joining
+invoices or products.
+"""
+
+from datetime import date, datetime, time, timezone
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.config import STORE_TIMEZONE
+from app.invoices.models import PaymentStatus
+
+STORE_TZ = ZoneInfo(STORE_TIMEZONE)
+
+# Items to backfill: written before the sale facts, or before the payment status was captured
+SALE_FACTS_MISSING = {"$or": [{"hour": {"$exists": False}}, {"status": {"$exists": False}}]}
+
+
+def local_time(moment: datetime) -> datetime:
+    """A naive UTC timestamp (as stored) in the store's timezone."""
+    return moment.replace(tzinfo=timezone.utc).astimezone(STORE_TZ)
+
+
+def day_start_utc(day: date) -> datetime:
+    """The naive UTC timestamp at which a store-local day starts."""
+    start = datetime.combine(day, time.min, tzinfo=STORE_TZ)
+    return start.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def sale_day(moment: datetime) -> str:
+    """The store-local calendar day (YYYY-MM-DD) of a naive UTC timestamp."""
+    return local_time(moment).date().isoformat()
+
+
+def net_ratio(total: float, discount_amount: float) -> float:
+    """Share of the list price kept after the invoice discount."""
+    subtotal = (total or 0) + (discount_amount or 0)
+    return (total or 0) / subtotal if subtotal > 0 else 1.0
+
+
+def product_facts(product: dict) -> dict:
+    """The product attributes captured on an item at sale time."""
+    category_id = product.get("category_id")
+    return {
+        "category_id": str(category_id) if category_id else None,
+        "cost": product.get("buying_price"),
+    }
+
+
+def sale_facts(item: dict, created_at: datetime, cashier_id: Optional[str], ratio: float,
+               status: Optional[str]) -> dict:
+    """The invoice-level facts of one item: when, by whom, its net revenue and the payment status."""
+    local = local_time(created_at)
+    return {
+        "created_at": created_at,
+        "day": local.date().isoformat(),
+        "hour": local.hour,
+        "cashier_id": cashier_id,
+        "revenue": round(item["price"] * item["quantity"] * ratio, 2),
+        "status": PaymentStatus(status).value if status else None,
+    }
+
+
+def backfill_sale_facts(sync_db, batch_size: int = 1000) -> int:
+    """Store the sale facts on items written before they existed, or before the status was captured
+    (pymongo, batched).
+
+    The unit cost is left unset: reports fall back to the product's current buying price.
+    A category captured at sale time is kept.
+    """
+    updated = 0
+    cursor = sync_db.invoice_items.find(
+        SALE_FACTS_MISSING,
+        {"invoice_id": 1, "product_id": 1, "quantity": 1, "price": 1, "category_id": 1}
+    )
+    batch: List[dict] = []
+
+    def flush(items: List[dict]) -> int:
+        invoice_ids = {item["invoice_id"] for item in items if ObjectId.is_valid(item.get("invoice_id"))}
+        product_ids = {item["product_id"] for item in items if ObjectId.is_valid(item.get("product_id"))}
+        invoices: Dict[str, dict] = {
+            str(doc["_id"]): doc for doc in sync_db.invoices.find(
+                {"_id": {"$in": [ObjectId(i) for i in invoice_ids]}},
+                {"created_at": 1, "created_by": 1, "total": 1, "discount_amount": 1, "status": 1}
+            )
+        }
+        categories: Dict[str, Optional[str]] = {
+            str(doc["_id"]): product_facts(doc)["category_id"] for doc in sync_db.products.find(
+                {"_id": {"$in": [ObjectId(p) for p in product_ids]}}, {"category_id": 1}
+            )
+        }
+        operations = []
+        for item in items:
+            invoice = invoices.get(item.get("invoice_id"))
+            if not invoice or not invoice.get("created_at"):
+                continue
+            ratio = net_ratio(invoice.get("total"), invoice.get("discount_amount"))
+            facts = sale_facts(item, invoice["created_at"], invoice.get("created_by"), ratio, invoice.get("status"))
+            if not item.get("category_id"):
+                facts["category_id"] = categories.get(item.get("product_id"))
+            operations.append(UpdateOne({"_id": item["_id"]}, {"$set": facts}))
+        if not operations:
+            return 0
+        return sync_db.invoice_items.bulk_write(operations, ordered=False).modified_count
+
+    for item in cursor:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            updated += flush(batch)
+            batch = []
+    if batch:
+        updated += flush(batch)
+    return updated
@@ -25,6 +25,7 @@ class Invoice(BaseModel):
     notes: Optional[str] = None
     wallet_payment: Optional[float] = Field(default=0.0, description="المبلغ المدفوع من المحفظة")
     wallet_add: Optional[float] = Field(default=0.0, description="المبلغ المضاف للمحفظة")
+    created_by: Optional[str] = None  # reference to User._id (cashier)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
 
@@ -35,3 +36,12 @@ class InvoiceItem(BaseModel):
     product_id: str  # reference to Product._id
     quantity: int
     price: float  # unit price
+    # Sale facts captured when the invoice is written (see app.invoices.facts)
+    cost: Optional[float] = None  # unit buying price at sale time
+    category_id: Optional[str] = None
+    cashier_id: Optional[str] = None
+    revenue: Optional[float] = None  # line total after the invoice discount share
+    day: Optional[str] = None  # store-local sale day, YYYY-MM-DD
+    hour: Optional[int] = None  # store-local sale hour, 0-23
+    status: Optional[PaymentStatus] = None  # the invoice's payment status, kept in step with it
+    created_at: Optional[datetime] = None
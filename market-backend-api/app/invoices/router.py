@@ -5,13 +5,13 @@ Invoice router with endpoints for invoice management.
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import Optional, List
 from datetime import datetime
-import math
 from app.auth.dependencies import get_current_admin, get_current_user, get_current_customer, get_current_staff
 from app.invoices.schemas import (
     InvoiceCreate, InvoiceUpdate, InvoiceResponse, InvoiceListResponse,
     InvoiceFilter, PaymentStatus
 )
 from app.invoices.service import InvoiceService
+from app.core.counts import CountMode, fetch_limit, page_info
 
 router = APIRouter()
 
@@ -23,7 +23,7 @@ async def create_invoice(
     current_admin = Depends(get_current_staff)
 ):
     """Create a new invoice (Admin only)."""
-    return await InvoiceService.create_invoice( invoice)
+    return await InvoiceService.create_invoice(invoice, created_by=current_admin.get("id"))
 
 
 @router.get("/", response_model=InvoiceListResponse)
@@ -36,6 +36,7 @@ async def get_invoices(
     max_total: Optional[float] = Query(None, ge=0),
     min_date: Optional[str] = Query(None),
     max_date: Optional[str] = Query(None),
+    count: CountMode = Query(CountMode.AUTO, description="auto, exact or none (has_more only)"),
     current_admin = Depends(get_current_staff)
 ):
     """Get invoices with filtering and pagination (Admin only)."""
@@ -57,17 +58,13 @@ async def get_invoices(
     skip = (page - 1) * page_size
     
     # Get invoices
-    invoices, total = await InvoiceService.get_invoices( skip=skip, limit=page_size, filters=filters)
-    
-    # Calculate total pages
-    total_pages = math.ceil(total / page_size) if total > 0 else 1
-    
+    invoices, total = await InvoiceService.get_invoices(
+        skip=skip, limit=fetch_limit(page_size, count), filters=filters, count_mode=count
+    )
+
     return InvoiceListResponse(
-        invoices=invoices,
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages
+        invoices=invoices[:page_size],
+        **page_info(total, len(invoices), page, page_size)
     )
 
 
@@ -74,10 +74,11 @@ class InvoiceResponse(InvoiceBase):
 class InvoiceListResponse(BaseModel):
     """Invoice list response schema."""
     invoices: List[InvoiceResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    has_more: bool = False
 
 
 class InvoiceFilter(BaseModel):
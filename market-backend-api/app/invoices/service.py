@@ -1,4 +1,5 @@
-from typing import List, Optional, Tuple
+import asyncio
+from typing import Iterable, List, Optional, Tuple
 from fastapi import HTTPException, status
 from bson import ObjectId
 from datetime import datetime, date
@@ -7,18 +8,46 @@ from app.invoices.schemas import InvoiceCreate, InvoiceUpdate, InvoiceFilter, Pa
 from app.invoices.models import Invoice, InvoiceItem
 from app.products.models import Product
 from app.customers.models import Customer
+from app.stock.models import MovementReason
+from app.stock.service import StockService
+from app.core.versions import versions
+from app.core.counts import CountMode, CountService
+from app.customers.service import CustomerService
+from app.activity.service import ActivityService, invoice_activity
+from app.core.events import event_hub
+from app.core.excel import new_write_only_sheet, append_totals_row
+from app.invoices.facts import SALE_FACTS_MISSING, backfill_sale_facts, net_ratio, product_facts, sale_day, sale_facts
+from app.reports.service import ProfitService
+from app.reports.rollup import SalesRollupService, rebuild_sales_rollup
+from app.reports.fact_store import FactStoreService
+
+# Invoice export layout
+INVOICE_EXPORT_HEADERS = [
+    "رقم الفاتورة",
+    "التاريخ",
+    "العميل",
+    "الحالة",
+    "الإجمالي قبل الخصم",
+    "الخصم",
+    "الإجمالي",
+    "الدفع من المحفظة",
+    "عدد القطع"
+]
+INVOICE_EXPORT_COLUMN_WIDTHS = [26, 20, 30, 10, 18, 12, 14, 16, 12]
 
 
 class InvoiceService:
 
     @staticmethod
-    async def create_invoice(invoice: InvoiceCreate) -> dict:
+    async def create_invoice(invoice: InvoiceCreate, created_by: Optional[str] = None) -> dict:
         customer = await db.customers.find_one({"_id": ObjectId(invoice.customer_id)})
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
 
         total_amount = 0
         items_data = []
+        stock_deltas = {}
+        invoice_oid = ObjectId()
 
         for item in invoice.invoice_items:
             product = await db.products.find_one({"_id": ObjectId(item.product_id)})
@@ -35,14 +64,13 @@ class InvoiceService:
             items_data.append({
                 "product_id": item.product_id,
                 "quantity": item.quantity,
-                "price": price
+                "price": price,
+                **product_facts(product)
             })
+            stock_deltas[item.product_id] = stock_deltas.get(item.product_id, 0) - item.quantity
 
-            # Update stock
-            await db.products.update_one(
-                {"_id": ObjectId(item.product_id)},
-                {"$inc": {"quantity": -item.quantity}}
-            )
+        # Update stock and the movement ledger
+        await StockService.apply_deltas(stock_deltas, MovementReason.SALE, "invoice", str(invoice_oid))
 
         # Calculate discount
         discount_amount = 0
@@ -71,6 +99,10 @@ class InvoiceService:
                 {"_id": ObjectId(invoice.customer_id)},
                 {"$inc": {"wallet_balance": -invoice.wallet_payment}}
             )
+            customer_after = {**customer, "wallet_balance": current_balance - invoice.wallet_payment}
+            await CustomerService.record_stats_change(customer, customer_after)
+            customer = customer_after
+            versions.bump("customers")
             
             # Log wallet transaction
             await db.wallet_transactions.insert_one({
@@ -88,6 +120,10 @@ class InvoiceService:
                 {"_id": ObjectId(invoice.customer_id)},
                 {"$inc": {"wallet_balance": invoice.wallet_add}}
             )
+            await CustomerService.record_stats_change(
+                customer, {**customer, "wallet_balance": customer.get("wallet_balance", 0) + invoice.wallet_add}
+            )
+            versions.bump("customers")
             
             # Log wallet transaction
             await db.wallet_transactions.insert_one({
@@ -100,6 +136,7 @@ class InvoiceService:
             })
 
         invoice_data = {
+            "_id": invoice_oid,
             "customer_id": invoice.customer_id,
             "total": total_amount,
             "status": invoice.status,
@@ -110,11 +147,27 @@ class InvoiceService:
             "discount_type": invoice.discount_type or "percentage",
             "discount_amount": discount_amount,
             "subtotal": total_amount + discount_amount,  # Original amount before discount
+            "created_by": created_by,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
         result = await db.invoices.insert_one(invoice_data)
+        versions.bump("invoices")
         invoice_id = str(result.inserted_id)
+        await CustomerService.record_purchase(invoice.customer_id, total_amount, 1, invoice_data["created_at"])
+        await ActivityService.record(invoice_activity(
+            invoice_id, invoice.customer_id, customer["name"], total_amount,
+            PaymentStatus(invoice.status).value, invoice_data["created_at"]
+        ))
+        event_hub.publish("invoice", {
+            "id": invoice_id,
+            "customer_id": invoice.customer_id,
+            "customer_name": customer["name"],
+            "total": total_amount,
+            "status": PaymentStatus(invoice.status).value,
+            "items": len(items_data),
+            "created_at": invoice_data["created_at"],
+        })
 
         # Update wallet transactions with invoice ID
         if invoice.wallet_payment or invoice.wallet_add:
@@ -123,11 +176,14 @@ class InvoiceService:
                 {"$set": {"invoice_id": invoice_id}}
             )
 
-        for item in items_data:
-            await db.invoice_items.insert_one({
-                "invoice_id": invoice_id,
-                **item
-            })
+        ratio = net_ratio(total_amount, discount_amount)
+        item_docs = [
+            {"invoice_id": invoice_id, **item, **sale_facts(item, invoice_data["created_at"], created_by, ratio, invoice.status)}
+            for item in items_data
+        ]
+        for item_doc in item_docs:
+            await db.invoice_items.insert_one(item_doc)
+        await SalesRollupService.record(item_docs)
 
         # Return InvoiceResponse format
         return {
@@ -153,7 +209,8 @@ class InvoiceService:
         }
 
     @staticmethod
-    async def get_invoices(skip=0, limit=100, filters: Optional[InvoiceFilter] = None) -> Tuple[List[dict], int]:
+    async def get_invoices(skip=0, limit=100, filters: Optional[InvoiceFilter] = None,
+                           count_mode: CountMode = CountMode.AUTO) -> Tuple[List[dict], Optional[int]]:
         query = {}
 
         if filters:
@@ -205,7 +262,7 @@ class InvoiceService:
             }
             invoices_data.append(invoice_response)
             
-        total = await db.invoices.count_documents(query)
+        total = await CountService.count(db.invoices, query, count_mode)
         return invoices_data, total
 
     @staticmethod
@@ -328,18 +385,19 @@ class InvoiceService:
         # Handle invoice items update
         if update.invoice_items is not None:
             # First, restore original stock quantities
-            original_items_cursor = db.invoice_items.find({"invoice_id": invoice_id})
-            async for item in original_items_cursor:
-                await db.products.update_one(
-                    {"_id": ObjectId(item["product_id"])},
-                    {"$inc": {"quantity": item["quantity"]}}
-                )
+            restored = {}
+            original_items = await db.invoice_items.find({"invoice_id": invoice_id}).to_list(length=None)
+            for item in original_items:
+                restored[item["product_id"]] = restored.get(item["product_id"], 0) + item["quantity"]
+            await StockService.apply_deltas(restored, MovementReason.INVOICE_EDIT, "invoice", invoice_id)
 
             # Delete all existing invoice items
             await db.invoice_items.delete_many({"invoice_id": invoice_id})
 
             # Validate and insert new invoice items
             total_amount = 0
+            stock_deltas = {}
+            new_items = []
             for item in update.invoice_items:
                 # Validate product exists
                 product = await db.products.find_one({"_id": ObjectId(item.product_id)})
@@ -355,19 +413,18 @@ class InvoiceService:
                 total = price * item.quantity
                 total_amount += total
 
-                # Insert new invoice item
-                await db.invoice_items.insert_one({
+                new_items.append({
                     "invoice_id": invoice_id,
                     "product_id": item.product_id,
                     "quantity": item.quantity,
-                    "price": price
+                    "price": price,
+                    **product_facts(product)
                 })
 
-                # Update product stock
-                await db.products.update_one(
-                    {"_id": ObjectId(item.product_id)},
-                    {"$inc": {"quantity": -item.quantity}}
-                )
+                stock_deltas[item.product_id] = stock_deltas.get(item.product_id, 0) - item.quantity
+
+            # Update product stock
+            await StockService.apply_deltas(stock_deltas, MovementReason.INVOICE_EDIT, "invoice", invoice_id)
 
             # Calculate discount
             discount_amount = 0
@@ -381,6 +438,21 @@ class InvoiceService:
                 discount_amount = min(discount_amount, total_amount)
                 total_amount = max(0, total_amount - discount_amount)
 
+            # Insert the new items with the sale facts of the original sale
+            stored = await db.invoices.find_one({"_id": ObjectId(invoice_id)}, {"created_by": 1})
+            ratio = net_ratio(total_amount, discount_amount)
+            status_ = update.status or invoice["status"]
+            item_docs = [
+                {**new_item, **sale_facts(new_item, invoice["created_at"], stored.get("created_by"), ratio, status_)}
+                for new_item in new_items
+            ]
+            for item_doc in item_docs:
+                await db.invoice_items.insert_one(item_doc)
+            await SalesRollupService.record(original_items, -1)
+            await SalesRollupService.record(item_docs)
+            await FactStoreService.record_reversals(original_items)
+            await ProfitService.invalidate([sale_day(invoice["created_at"])])
+
             # Update invoice total - calculate and store in database, not in update object
             print(f"Updated invoice total: {total_amount}")
 
@@ -405,6 +477,10 @@ class InvoiceService:
                 {"_id": ObjectId(customer_id)},
                 {"$inc": {"wallet_balance": -update.wallet_payment}}
             )
+            await CustomerService.record_stats_change(
+                customer, {**customer, "wallet_balance": current_balance - update.wallet_payment}
+            )
+            versions.bump("customers")
             
             # Log wallet transaction
             await db.wallet_transactions.insert_one({
@@ -428,6 +504,10 @@ class InvoiceService:
                 {"_id": ObjectId(customer_id)},
                 {"$inc": {"wallet_balance": update.wallet_add}}
             )
+            await CustomerService.record_stats_change(
+                customer, {**customer, "wallet_balance": customer.get("wallet_balance", 0) + update.wallet_add}
+            )
+            versions.bump("customers")
             
             # Log wallet transaction
             await db.wallet_transactions.insert_one({
@@ -442,7 +522,8 @@ class InvoiceService:
         # Update invoice data
         update_data = {k: v for k, v in update.dict().items() if v is not None and k != "invoice_items"}
         update_data["updated_at"] = datetime.utcnow()
-        update_data["total"] = total_amount  # Add total to update data
+        if update.invoice_items is not None:
+            update_data["total"] = total_amount  # Add total to update data
         
         # Add discount fields if provided
         if update.discount is not None:
@@ -454,7 +535,33 @@ class InvoiceService:
             update_data["subtotal"] = total_amount + discount_amount
 
         await db.invoices.update_one({"_id": ObjectId(invoice_id)}, {"$set": update_data})
-        return await InvoiceService.get_invoice_by_id(invoice_id)
+        versions.bump("invoices")
+        if update.status is not None and update.invoice_items is None:
+            await InvoiceService._set_items_status(invoice_id, update.status, invoice["created_at"])
+
+        # Move the invoice between customers' lifetime aggregates or adjust its amount
+        old_customer, old_total = invoice["customer_id"], invoice["total"]
+        new_customer, new_total = update_data.get("customer_id", old_customer), update_data.get("total", old_total)
+        if new_customer != old_customer:
+            await CustomerService.record_purchase(old_customer, -old_total, -1)
+            await CustomerService.record_purchase(new_customer, new_total, 1, invoice["created_at"])
+        elif new_total != old_total:
+            await CustomerService.record_purchase(old_customer, new_total - old_total, 0)
+
+        updated = await InvoiceService.get_invoice_by_id(invoice_id)
+        event_hub.publish("invoice_updated", {
+            "id": invoice_id, "customer_id": updated["customer_id"], "total": updated["total"],
+            "status": updated["status"],
+        })
+        return updated
+
+    @staticmethod
+    async def _set_items_status(invoice_id: str, status_: PaymentStatus, created_at: datetime):
+        """Copy a new payment status onto the invoice's items; profit counts paid items only."""
+        await db.invoice_items.update_many(
+            {"invoice_id": invoice_id}, {"$set": {"status": PaymentStatus(status_).value}}
+        )
+        await ProfitService.invalidate([sale_day(created_at)])
 
     @staticmethod
     async def update_payment_status(invoice_id: str, status_: PaymentStatus) -> dict:
@@ -463,6 +570,12 @@ class InvoiceService:
             raise HTTPException(status_code=404, detail="Invoice not found")
 
         await db.invoices.update_one({"_id": ObjectId(invoice_id)}, {"$set": {"status": status_, "updated_at": datetime.utcnow()}})
+        versions.bump("invoices")
+        await InvoiceService._set_items_status(invoice_id, status_, invoice["created_at"])
+        event_hub.publish("invoice_updated", {
+            "id": invoice_id, "customer_id": invoice["customer_id"], "total": invoice["total"],
+            "status": PaymentStatus(status_).value,
+        })
         return await InvoiceService.get_invoice_by_id(invoice_id)
 
     @staticmethod
@@ -471,15 +584,20 @@ class InvoiceService:
         if not invoice:
             raise HTTPException(status_code=404, detail="Invoice not found")
 
-        items_cursor = db.invoice_items.find({"invoice_id": invoice_id})
-        async for item in items_cursor:
-            await db.products.update_one(
-                {"_id": ObjectId(item["product_id"])},
-                {"$inc": {"quantity": item["quantity"]}}
-            )
+        restored = {}
+        items = await db.invoice_items.find({"invoice_id": invoice_id}).to_list(length=None)
+        for item in items:
+            restored[item["product_id"]] = restored.get(item["product_id"], 0) + item["quantity"]
+        await StockService.apply_deltas(restored, MovementReason.INVOICE_DELETE, "invoice", invoice_id)
 
         await db.invoice_items.delete_many({"invoice_id": invoice_id})
         await db.invoices.delete_one({"_id": ObjectId(invoice_id)})
+        versions.bump("invoices")
+        await SalesRollupService.record(items, -1)
+        await FactStoreService.record_reversals(items)
+        await ProfitService.invalidate([sale_day(invoice["created_at"])])
+        await CustomerService.record_purchase(invoice["customer_id"], -invoice["total"], -1)
+        event_hub.publish("invoice_deleted", {"id": invoice_id, "customer_id": invoice["customer_id"]})
         return True
 
     @staticmethod
@@ -557,41 +675,88 @@ class InvoiceService:
         return invoices_data
 
     @staticmethod
-    async def get_invoice_statistics() -> dict:
-        from pymongo import ASCENDING
-        from bson.son import SON
+    async def ensure_sale_facts():
+        """Backfill the sale facts of items written before they existed."""
+        if await db.invoice_items.find_one(SALE_FACTS_MISSING, {"_id": 1}):
+            from app.database.sync_connection import get_sync_db
+            updated = await asyncio.to_thread(backfill_sale_facts, get_sync_db())
+            await ProfitService.invalidate()
+            print(f"✅ Sale facts backfilled for {updated} invoice items")
+            if updated:
+                rows = await asyncio.to_thread(rebuild_sales_rollup, get_sync_db())
+                print(f"✅ Sales rollup rebuilt ({rows} product-days)")
 
-        total_invoices = await db.invoices.count_documents({})
-        paid = await db.invoices.count_documents({"status": PaymentStatus.PAID})
-        pending = await db.invoices.count_documents({"status": PaymentStatus.PENDING})
-        partial = await db.invoices.count_documents({"status": PaymentStatus.PARTIAL})
-
-        paid_cursor = db.invoices.find({"status": PaymentStatus.PAID})
-        total_revenue = sum([(doc["total"]) async for doc in paid_cursor]) if paid > 0 else 0.0
+    @staticmethod
+    async def get_invoice_statistics() -> dict:
+        """Per-status counts and totals plus today's figures, from two concurrent aggregations."""
+        today_start = datetime.combine(date.today(), datetime.min.time())
+        today_end = datetime.combine(date.today(), datetime.max.time())
 
-        avg_pipeline = [
-            {"$group": {"_id": None, "avg_total": {"$avg": "$total"}}}
+        by_status_pipeline = [
+            {"$group": {"_id": "$status", "count": {"$sum": 1}, "total": {"$sum": "$total"}}}
         ]
-        avg_result = await db.invoices.aggregate(avg_pipeline).to_list(length=1)
-        avg_invoice = avg_result[0]["avg_total"] if avg_result else 0.0
+        today_pipeline = [
+            {"$match": {"created_at": {"$gte": today_start, "$lte": today_end}}},
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "revenue": {"$sum": {"$cond": [{"$eq": ["$status", PaymentStatus.PAID.value]}, "$total", 0]}},
+            }},
+        ]
+        by_status, today = await asyncio.gather(
+            db.invoices.aggregate(by_status_pipeline).to_list(length=None),
+            db.invoices.aggregate(today_pipeline).to_list(length=1),
+        )
 
-        today_start = datetime.combine(date.today(), datetime.min.time())
-        today_end = datetime.combine(date.today(), datetime.max.time())
+        statuses = {row["_id"]: row for row in by_status}
+        total_invoices = sum(row["count"] for row in by_status)
+        grand_total = sum(row["total"] for row in by_status)
+        today = today[0] if today else {}
 
-        today_count = await db.invoices.count_documents({"created_at": {"$gte": today_start, "$lte": today_end}})
-        today_revenue_cursor = db.invoices.find({
-            "created_at": {"$gte": today_start, "$lte": today_end},
-            "status": PaymentStatus.PAID
-        })
-        today_revenue = sum([(doc["total"]) async for doc in today_revenue_cursor])
+        def status_field(status_, field):
+            return statuses.get(status_.value, {}).get(field, 0)
 
         return {
             "total_invoices": total_invoices,
-            "paid_invoices": paid,
-            "pending_invoices": pending,
-            "partial_invoices": partial,
-            "total_revenue": total_revenue,
-            "average_invoice_value": avg_invoice,
-            "today_invoices": today_count,
-            "today_revenue": today_revenue
+            "paid_invoices": status_field(PaymentStatus.PAID, "count"),
+            "pending_invoices": status_field(PaymentStatus.PENDING, "count"),
+            "partial_invoices": status_field(PaymentStatus.PARTIAL, "count"),
+            "total_revenue": float(status_field(PaymentStatus.PAID, "total")),
+            "average_invoice_value": grand_total / total_invoices if total_invoices else 0.0,
+            "today_invoices": today.get("count", 0),
+            "today_revenue": float(today.get("revenue", 0.0))
         }
+
+    @staticmethod
+    def write_invoices_excel(invoices: Iterable[dict], output) -> dict:
+        """Write an invoices Excel file from an iterable of invoice documents.
+
+        Each document must carry `customer_name` and `items_count`. Runs inside a
+        job worker process (see `app.jobs.workers`).
+        """
+        wb, ws = new_write_only_sheet("الفواتير", INVOICE_EXPORT_HEADERS, INVOICE_EXPORT_COLUMN_WIDTHS)
+
+        rows = 0
+        total_sum = 0.0
+        discount_sum = 0.0
+        for doc in invoices:
+            total = float(doc.get("total", 0.0))
+            discount_amount = float(doc.get("discount_amount", 0.0))
+            ws.append([
+                str(doc["_id"]),
+                doc["created_at"].strftime("%Y-%m-%d %H:%M"),
+                doc.get("customer_name", "Unknown Customer"),
+                str(doc.get("status", "")),
+                float(doc.get("subtotal", total + discount_amount)),
+                discount_amount,
+                total,
+                float(doc.get("wallet_payment", 0.0)),
+                doc.get("items_count", 0),
+            ])
+            total_sum += total
+            discount_sum += discount_amount
+            rows += 1
+
+        append_totals_row(ws, ["الإجمالي:", rows, None, None, None, discount_sum, total_sum, None, None])
+        wb.save(output)
+        return {"rows": rows, "total": total_sum, "discount": discount_sum}
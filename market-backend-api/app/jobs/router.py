@@ -0,0 +1,50 @@
+"""
+Jobs router: submit background jobs, poll their status and download results.
+"""
+
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import FileResponse
+from typing import Optional
+from app.auth.dependencies import get_current_admin
+from app.jobs.schemas import JobSubmit, JobResponse, JobListResponse
+from app.jobs.service import JobService
+
+router = APIRouter()
+
+
+@router.post("/", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    job: JobSubmit,
+    current_admin = Depends(get_current_admin)
+):
+    """Submit a background job, e.g. `inventory_export` or `invoice_export` (Admin only)."""
+    return await JobService.submit(job.type, job.params, requested_by=current_admin.get("id"), external=True)
+
+
+@router.get("/", response_model=JobListResponse)
+async def get_jobs(
+    type: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    current_admin = Depends(get_current_admin)
+):
+    """List recent jobs (Admin only)."""
+    return JobListResponse(jobs=await JobService.get_jobs(job_type=type, limit=limit))
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    current_admin = Depends(get_current_admin)
+):
+    """Get job status (Admin only)."""
+    return await JobService.get_job(job_id)
+
+
+@router.get("/{job_id}/download")
+async def download_job_result(
+    job_id: str,
+    current_admin = Depends(get_current_admin)
+):
+    """Download a finished job's result file (Admin only)."""
+    result = await JobService.get_result_file(job_id)
+    return FileResponse(result["path"], media_type=result["media_type"], filename=result["filename"])
@@ -0,0 +1,44 @@
+"""
+Background job related Pydantic schemas.
+"""
+
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+from enum import Enum
+
+
+class JobStatus(str, Enum):
+    """Job lifecycle states."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
+
+class JobSubmit(BaseModel):
+    """Job submission schema."""
+    type: str
+    params: Dict[str, Any] = {}
+
+
+class JobResponse(BaseModel):
+    """Job response schema."""
+    id: str
+    type: str
+    status: JobStatus
+    params: Dict[str, Any] = {}
+    requested_by: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+
+
+class JobListResponse(BaseModel):
+    """Job list response schema."""
+    jobs: List[JobResponse]
@@ -0,0 +1,305 @@
+"""
+Background job service.
+
+Jobs are recorded in the `jobs` collection and executed in a process pool so that
+CPU-heavy exports never block the event loop. Results are written to local disk and
+removed once they expire.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from app.config import JOBS_MAX_WORKERS, JOBS_RESULTS_DIR, JOBS_RESULT_TTL_HOURS
+from app.core.versions import versions
+from app.database.connection import db
+from app.jobs import workers
+from app.jobs.schemas import JobStatus
+from app.reports.forecast import ForecastService
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Registered job types: worker function, per-type concurrency cap, result file details,
+# the collection versions to bump once the job has written (see app.core.versions), an
+# optional coroutine function to await in the API process once the job has finished, and
+# whether the type is internal (created by its own endpoint, never through POST /api/jobs)
+JOB_TYPES = {
+    "inventory_export": {
+        "func": workers.export_inventory,
+        "max_concurrency": 1,
+        "filename": "inventory_export.xlsx",
+        "media_type": XLSX_MEDIA_TYPE,
+    },
+    "invoice_export": {
+        "func": workers.export_invoices,
+        "max_concurrency": 1,
+        "filename": "invoices_export.xlsx",
+        "media_type": XLSX_MEDIA_TYPE,
+    },
+    "product_import": {
+        "func": workers.import_products,
+        "max_concurrency": 1,
+        "filename": "product_import_errors.csv",
+        "media_type": "text/csv",
+        "bumps": ("products", "categories"),
+        "internal": True,
+    },
+    "stock_take_report": {
+        "func": workers.export_stock_take,
+        "max_concurrency": 2,
+        "filename": "stock_take_variance.xlsx",
+        "media_type": XLSX_MEDIA_TYPE,
+    },
+    "demand_forecast": {
+        "func": workers.forecast_demand,
+        "max_concurrency": 1,
+        "filename": "purchase_order.xlsx",
+        "media_type": XLSX_MEDIA_TYPE,
+        "bumps": ("products",),
+        # The worker rewrites `forecast` without touching updated_at
+        "on_done": ForecastService.after_run,
+    },
+    "basket_analysis": {
+        "func": workers.analyze_baskets,
+        "max_concurrency": 1,
+        "filename": "product_pairs.csv",
+        "media_type": "text/csv",
+        "bumps": ("product_neighbors",),
+    },
+    "fact_store_append": {
+        "func": workers.append_fact_store,
+        "max_concurrency": 1,
+        "filename": "fact_store.json",
+        "media_type": "application/json",
+    },
+}
+
+
+class JobService:
+    """Job service class."""
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _semaphores: Dict[str, asyncio.Semaphore] = {}
+    _done_events: Dict[str, asyncio.Event] = {}
+    _tasks: set = set()
+
+    @staticmethod
+    def _get_executor() -> ProcessPoolExecutor:
+        if JobService._executor is None:
+            # Spawn instead of fork: the API process holds Motor client threads
+            JobService._executor = ProcessPoolExecutor(
+                max_workers=JOBS_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return JobService._executor
+
+    @staticmethod
+    def _get_semaphore(job_type: str) -> asyncio.Semaphore:
+        if job_type not in JobService._semaphores:
+            JobService._semaphores[job_type] = asyncio.Semaphore(JOB_TYPES[job_type]["max_concurrency"])
+        return JobService._semaphores[job_type]
+
+    @staticmethod
+    def _to_response(doc: dict) -> dict:
+        job = dict(doc)
+        job["id"] = str(job.pop("_id"))
+        if job.get("result"):
+            job["result"] = {k: v for k, v in job["result"].items() if k != "path"}
+        if job["status"] == JobStatus.SUCCEEDED and JOB_TYPES.get(job["type"], {}).get("filename"):
+            job["download_url"] = f"/api/jobs/{job['id']}/download"
+        return job
+
+    @staticmethod
+    async def submit(
+        job_type: str,
+        params: Optional[dict] = None,
+        requested_by: Optional[str] = None,
+        external: bool = False,
+    ) -> dict:
+        """Record a job and start it in the background.
+
+        `external` submissions (POST /api/jobs) may not create internal job types.
+        """
+        if job_type not in JOB_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown job type: {job_type}"
+            )
+        if external and JOB_TYPES[job_type].get("internal"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Job type {job_type} cannot be submitted directly"
+            )
+
+        job_data = {
+            "type": job_type,
+            "status": JobStatus.QUEUED.value,
+            "params": params or {},
+            "requested_by": requested_by,
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None,
+            "expires_at": None,
+            "result": None,
+            "error": None,
+        }
+        result = await db.jobs.insert_one(job_data)
+        job_data["_id"] = result.inserted_id
+        job_id = str(result.inserted_id)
+
+        JobService._done_events[job_id] = asyncio.Event()
+        task = asyncio.create_task(JobService._run(job_id, job_type, job_data["params"]))
+        JobService._tasks.add(task)
+        task.add_done_callback(JobService._tasks.discard)
+
+        return JobService._to_response(job_data)
+
+    @staticmethod
+    async def _run(job_id: str, job_type: str, params: dict):
+        definition = JOB_TYPES[job_type]
+        try:
+            async with JobService._get_semaphore(job_type):
+                await db.jobs.update_one(
+                    {"_id": ObjectId(job_id)},
+                    {"$set": {"status": JobStatus.RUNNING.value, "started_at": datetime.utcnow()}}
+                )
+
+                os.makedirs(JOBS_RESULTS_DIR, exist_ok=True)
+                output_path = os.path.abspath(os.path.join(JOBS_RESULTS_DIR, f"{job_id}-{definition['filename']}"))
+                loop = asyncio.get_running_loop()
+                summary = await loop.run_in_executor(
+                    JobService._get_executor(), definition["func"], params, output_path
+                )
+
+                finished_at = datetime.utcnow()
+                await db.jobs.update_one(
+                    {"_id": ObjectId(job_id)},
+                    {"$set": {
+                        "status": JobStatus.SUCCEEDED.value,
+                        "finished_at": finished_at,
+                        "expires_at": finished_at + timedelta(hours=JOBS_RESULT_TTL_HOURS),
+                        "result": {**(summary or {}), "path": output_path, "size": os.path.getsize(output_path)},
+                    }}
+                )
+        except Exception as e:
+            print(f"❌ Job {job_id} ({job_type}) failed: {e}")
+            await db.jobs.update_one(
+                {"_id": ObjectId(job_id)},
+                {"$set": {
+                    "status": JobStatus.FAILED.value,
+                    "finished_at": datetime.utcnow(),
+                    "expires_at": datetime.utcnow() + timedelta(hours=JOBS_RESULT_TTL_HOURS),
+                    "error": str(e),
+                }}
+            )
+        finally:
+            versions.bump(*definition.get("bumps", ()))
+            if definition.get("on_done"):
+                try:
+                    await definition["on_done"]()
+                except Exception as e:
+                    print(f"❌ Job {job_id} ({job_type}) completion hook failed: {e}")
+            event = JobService._done_events.pop(job_id, None)
+            if event:
+                event.set()
+
+    @staticmethod
+    async def wait(job_id: str, timeout: Optional[float] = None) -> dict:
+        """Wait for a job started by this process to finish and return it."""
+        event = JobService._done_events.get(job_id)
+        if event:
+            await asyncio.wait_for(event.wait(), timeout)
+        return await JobService.get_job(job_id)
+
+    @staticmethod
+    async def get_job(job_id: str) -> dict:
+        if not ObjectId.is_valid(job_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid job ID format")
+        doc = await db.jobs.find_one({"_id": ObjectId(job_id)})
+        if not doc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+        return JobService._to_response(doc)
+
+    @staticmethod
+    async def get_jobs(job_type: Optional[str] = None, limit: int = 20) -> List[dict]:
+        query = {"type": job_type} if job_type else {}
+        cursor = db.jobs.find(query).sort("created_at", -1).limit(limit)
+        return [JobService._to_response(doc) async for doc in cursor]
+
+    @staticmethod
+    async def get_result_file(job_id: str) -> dict:
+        """Return path, filename and media type of a finished job's result."""
+        if not ObjectId.is_valid(job_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid job ID format")
+        doc = await db.jobs.find_one({"_id": ObjectId(job_id)})
+        if not doc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+        if doc["status"] != JobStatus.SUCCEEDED.value:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Job result not available (status: {doc['status']})"
+            )
+
+        path = (doc.get("result") or {}).get("path")
+        if not path or not os.path.exists(path):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Job result has expired")
+
+        definition = JOB_TYPES[doc["type"]]
+        return {"path": path, "filename": definition["filename"], "media_type": definition["media_type"]}
+
+    @staticmethod
+    async def cleanup_expired() -> int:
+        """Delete expired result files and their job records."""
+        removed = 0
+        cursor = db.jobs.find({"expires_at": {"$lt": datetime.utcnow()}})
+        async for doc in cursor:
+            path = (doc.get("result") or {}).get("path")
+            if path and os.path.exists(path):
+                os.remove(path)
+            await db.jobs.delete_one({"_id": doc["_id"]})
+            removed += 1
+        return removed
+
+    @staticmethod
+    async def submit_if_due(job_type: str, last_run_at: Optional[datetime], interval: timedelta) -> Optional[dict]:
+        """Submit a scheduled job whose output is missing or older than `interval`.
+
+        Called on a short tick, so the schedule survives restarts. Nothing is submitted
+        while a job of the type is pending or one succeeded within the interval (its
+        output may legitimately be empty).
+        """
+        since = datetime.utcnow() - interval
+        if last_run_at is not None and last_run_at >= since:
+            return None
+        recent = await db.jobs.find_one({"type": job_type, "$or": [
+            {"status": {"$in": [JobStatus.QUEUED.value, JobStatus.RUNNING.value]}},
+            {"status": JobStatus.SUCCEEDED.value, "finished_at": {"$gte": since}},
+        ]}, {"_id": 1})
+        if recent:
+            return None
+        return await JobService.submit(job_type)
+
+    @staticmethod
+    async def fail_interrupted():
+        """Mark jobs left queued or running by a previous process as failed."""
+        await db.jobs.update_many(
+            {"status": {"$in": [JobStatus.QUEUED.value, JobStatus.RUNNING.value]}},
+            {"$set": {
+                "status": JobStatus.FAILED.value,
+                "finished_at": datetime.utcnow(),
+                "expires_at": datetime.utcnow() + timedelta(hours=JOBS_RESULT_TTL_HOURS),
+                "error": "Interrupted by server restart",
+            }}
+        )
+
+    @staticmethod
+    def shutdown():
+        if JobService._executor is not None:
+            JobService._executor.shutdown(wait=False, cancel_futures=True)
+            JobService._executor = None
@@ -0,0 +1,140 @@
+"""
+Job worker functions.
+
+They run in a separate process from the API, read MongoDB through the synchronous
+client and write their output to `output_path`. The returned dict is stored as the
+job's result summary.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Iterator, List
+from bson import ObjectId
+
+from app.config import UPLOADS_DIR
+from app.database.sync_connection import get_sync_db
+from app.products.service import ProductService, INVENTORY_PROJECTION
+from app.invoices.service import InvoiceService
+from app.products.importer import import_products_file
+from app.stock.service import StockService
+from app.reports.forecast import (
+    PURCHASE_ORDER_PROJECTION, PURCHASE_ORDER_QUERY, purchase_order_line, run_forecast,
+    sort_purchase_order, write_purchase_order_excel
+)
+from app.reports.basket import run_basket_analysis
+from app.reports.fact_store import append_facts
+from app.reports.service import store_today
+
+BATCH_SIZE = 1000
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def export_inventory(params: dict, output_path: str) -> dict:
+    """Export every active product to an Excel file."""
+    db = get_sync_db()
+    cursor = db.products.find({"is_active": True}, INVENTORY_PROJECTION).batch_size(BATCH_SIZE)
+    with open(output_path, "wb") as output:
+        return ProductService.write_inventory_excel(cursor, output)
+
+
+def _decorate_invoices(db, batch: List[dict]) -> List[dict]:
+    """Attach customer names and item counts to a batch of invoices with two queries."""
+    customer_ids = {ObjectId(d["customer_id"]) for d in batch if ObjectId.is_valid(str(d["customer_id"]))}
+    names = {
+        str(c["_id"]): c["name"]
+        for c in db.customers.find({"_id": {"$in": list(customer_ids)}}, {"name": 1})
+    }
+    counts = {
+        r["_id"]: r["count"]
+        for r in db.invoice_items.aggregate([
+            {"$match": {"invoice_id": {"$in": [str(d["_id"]) for d in batch]}}},
+            {"$group": {"_id": "$invoice_id", "count": {"$sum": "$quantity"}}}
+        ])
+    }
+    for doc in batch:
+        doc["customer_name"] = names.get(str(doc["customer_id"]), "Unknown Customer")
+        doc["items_count"] = counts.get(str(doc["_id"]), 0)
+    return batch
+
+
+def _iter_invoices(db, query: dict) -> Iterator[dict]:
+    batch = []
+    for doc in db.invoices.find(query).sort("created_at", -1).batch_size(BATCH_SIZE):
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            yield from _decorate_invoices(db, batch)
+            batch = []
+    if batch:
+        yield from _decorate_invoices(db, batch)
+
+
+def export_invoices(params: dict, output_path: str) -> dict:
+    """Export invoices, optionally filtered by `start_date`, `end_date` and `status`."""
+    db = get_sync_db()
+    query = {}
+    start_date = _parse_date(params.get("start_date"))
+    end_date = _parse_date(params.get("end_date"))
+    if start_date:
+        query.setdefault("created_at", {})["$gte"] = start_date
+    if end_date:
+        query.setdefault("created_at", {})["$lte"] = end_date
+    if params.get("status"):
+        query["status"] = params["status"]
+
+    with open(output_path, "wb") as output:
+        return InvoiceService.write_invoices_excel(_iter_invoices(db, query), output)
+
+
+def _upload_path(upload_id: str) -> str:
+    """The path of an uploaded file, refusing anything outside the uploads directory."""
+    uploads_dir = os.path.abspath(UPLOADS_DIR)
+    path = os.path.abspath(os.path.join(uploads_dir, str(upload_id)))
+    if os.path.dirname(path) != uploads_dir:
+        raise ValueError(f"Invalid upload id: {upload_id}")
+    return path
+
+
+def import_products(params: dict, output_path: str) -> dict:
+    """Import the uploaded products file `upload_id`; the result is the error report CSV."""
+    source_path = _upload_path(params["upload_id"])
+    try:
+        return import_products_file(get_sync_db(), source_path, error_report_path=output_path)
+    finally:
+        if os.path.exists(source_path):
+            os.remove(source_path)
+
+
+def export_stock_take(params: dict, output_path: str) -> dict:
+    """Write the variance report of the stock-take `stock_take_id`."""
+    db = get_sync_db()
+    lines = db.stock_take_lines.find({"stock_take_id": params["stock_take_id"]}).sort("variance", 1)
+    with open(output_path, "wb") as output:
+        return StockService.write_variance_excel(lines.batch_size(BATCH_SIZE), output)
+
+
+def forecast_demand(params: dict, output_path: str) -> dict:
+    """Recompute every product's forecast and write the suggested purchase order."""
+    db = get_sync_db()
+    summary = run_forecast(db, store_today())
+    products = db.products.find(PURCHASE_ORDER_QUERY, PURCHASE_ORDER_PROJECTION).batch_size(BATCH_SIZE)
+    lines = sort_purchase_order([line for line in map(purchase_order_line, products) if line])
+    with open(output_path, "wb") as output:
+        summary.update(write_purchase_order_excel(lines, output))
+    return summary
+
+
+def analyze_baskets(params: dict, output_path: str) -> dict:
+    """Recompute every product's "bought together" neighbours; the result is the pairs CSV."""
+    return run_basket_analysis(get_sync_db(), output_path)
+
+
+def append_fact_store(params: dict, output_path: str) -> dict:
+    """Append new invoice lines to the fact store (`rebuild` starts it over); the result is the summary."""
+    summary = append_facts(get_sync_db(), rebuild=bool(params.get("rebuild")))
+    with open(output_path, "w", encoding="utf-8") as output:
+        json.dump(summary, output)
+    return summary
@@ -11,7 +11,28 @@ from app.categories.router import router as categories_router
 from app.customers.router import router as customers_router
 from app.invoices.router import router as invoices_router
 from app.dashboard.router import router as dashboard_router
+from app.jobs.router import router as jobs_router
+from app.stock.router import router as stock_router
+from app.alerts.router import router as alerts_router
+from app.catalog.router import router as catalog_router
+from app.reports.router import router as reports_router
 from app.database.connection import connect_to_mongo, close_mongo_connection, db
+from app.database.indexes import ensure_indexes
+from app.products.barcode_index import barcode_index
+from app.products.service import ProductService
+from app.customers.service import CustomerService
+from app.invoices.service import InvoiceService
+from app.reports.rollup import SalesRollupService
+from app.reports.basket import submit_basket_analysis_if_due, suggestion_table
+from app.reports.forecast import ForecastService
+from app.reports.valuation import ValuationService
+from app.activity.service import ActivityService
+from app.dashboard.service import DashboardService
+from app.core.tasks import start_background, start_periodic, stop_all as stop_background_tasks
+from app.jobs.service import JobService
+from app.stock.service import StockService
+from app.alerts.service import AlertService
+from app.config import ALERT_SCAN_SECONDS, ALERT_REBUILD_SECONDS, FACT_STORE_INTERVAL_MINUTES
 
 app = FastAPI(
     title="Market Backend API",
@@ -52,8 +73,70 @@ async def startup_db_client():
     print(f"✅ Connected to MongoDB: {MONGO_URL}")
     print(f"✅ Database: {DB_NAME}")
 
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        print(f"❌ Failed to ensure indexes: {e}")
+
+    await barcode_index.start()
+
+    try:
+        await ProductService.ensure_category_counts()
+    except Exception as e:
+        print(f"❌ Failed to build category product counters: {e}")
+
+    try:
+        await CustomerService.ensure_search_keys()
+    except Exception as e:
+        print(f"❌ Failed to backfill customer search keys: {e}")
+
+    try:
+        await CustomerService.ensure_statistics()
+    except Exception as e:
+        print(f"❌ Failed to build customer statistics: {e}")
+
+    try:
+        await InvoiceService.ensure_sale_facts()
+    except Exception as e:
+        print(f"❌ Failed to backfill invoice sale facts: {e}")
+
+    try:
+        await SalesRollupService.ensure_rollup()
+    except Exception as e:
+        print(f"❌ Failed to build the sales rollup: {e}")
+
+    try:
+        await suggestion_table.refresh()
+    except Exception as e:
+        print(f"❌ Failed to load the suggestion table: {e}")
+
+    try:
+        await ActivityService.seed()
+    except Exception as e:
+        print(f"❌ Failed to seed the activity feed: {e}")
+
+    try:
+        await JobService.fail_interrupted()
+    except Exception as e:
+        print(f"❌ Failed to mark interrupted jobs as failed: {e}")
+
+    start_periodic("jobs-cleanup", 3600, JobService.cleanup_expired, run_immediately=True)
+    start_periodic("stock-snapshots", 3600, StockService.snapshot_if_due, run_immediately=True)
+    start_periodic("inventory-valuations", 3600, ValuationService.snapshot_if_due, run_immediately=True)
+    start_periodic("alerts-scan", ALERT_SCAN_SECONDS, AlertService.scan, run_immediately=True)
+    start_periodic("alerts-rebuild", ALERT_REBUILD_SECONDS, AlertService.rebuild)
+    start_background("dashboard-revenue", DashboardService.push_revenue())
+    start_periodic("demand-forecast", 3600, ForecastService.submit_if_due, run_immediately=True)
+    start_periodic("basket-analysis", 3600, submit_basket_analysis_if_due, run_immediately=True)
+    start_periodic(
+        "fact-store-append", FACT_STORE_INTERVAL_MINUTES * 60, lambda: JobService.submit("fact_store_append"),
+        run_immediately=True
+    )
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await stop_background_tasks()
+    JobService.shutdown()
     app.state.mongo_client.close()
     print("❌ Disconnected from MongoDB")
 
@@ -64,6 +147,11 @@ app.include_router(categories_router, prefix="/api/categories", tags=["Categorie
 app.include_router(customers_router, prefix="/api/customers", tags=["Customers"])
 app.include_router(invoices_router, prefix="/api/invoices", tags=["Invoices"])
 app.include_router(dashboard_router, prefix="/api/dashboard", tags=["Dashboard"])
+app.include_router(jobs_router, prefix="/api/jobs", tags=["Jobs"])
+app.include_router(stock_router, prefix="/api/stock", tags=["Stock"])
+app.include_router(alerts_router, prefix="/api/alerts", tags=["Alerts"])
+app.include_router(catalog_router, prefix="/api/catalog", tags=["Catalog"])
+app.include_router(reports_router, prefix="/api/reports", tags=["Reports"])
 
 # Print available routes
 print("🔗 Available API Routes:")
@@ -0,0 +1,201 @@
+"""
+In-process barcode index for the POS scanner.
+
+Active products are kept in plain dicts keyed by `product_id` and `sku` so a scan
+resolves without a database round trip. The index is warmed at startup and kept
+fresh from a MongoDB change stream when the deployment supports one (replica set /
+Atlas), otherwise by polling `products.updated_at`.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.config import BARCODE_INDEX_POLL_SECONDS, BARCODE_INDEX_RECONCILE_SECONDS
+from app.core.tasks import start_background
+from app.database.connection import db
+
+# Writers stamp `updated_at` with their own clock, so re-read a small window on every poll
+POLL_OVERLAP = timedelta(seconds=5)
+
+
+class BarcodeIndex:
+    """Hash index of active products by product_id and sku."""
+
+    def __init__(self):
+        self._products: Dict[str, dict] = {}
+        self._by_product_id: Dict[str, str] = {}
+        self._by_sku: Dict[str, str] = {}
+        self._category_names: Dict[str, str] = {}
+        self._watermark: Optional[datetime] = None
+        self._last_sync_at: Optional[datetime] = None
+        self.mode = "cold"
+        self.hits = 0
+        self.misses = 0
+
+    # Lookups
+
+    def lookup(self, code: str) -> Optional[Tuple[dict, Optional[str]]]:
+        """Return a copy of the product document and its category name, or None on a miss."""
+        key = self._by_product_id.get(code) or self._by_sku.get(code)
+        if key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        doc = dict(self._products[key])
+        category_id = doc.get("category_id")
+        category_name = self._category_names.get(category_id, "Unknown Category") if category_id else None
+        return doc, category_name
+
+    def product(self, key: str) -> Optional[dict]:
+        """The indexed product with this database id (active products only), or None."""
+        return self._products.get(key)
+
+    # Maintenance
+
+    def put(self, doc: dict):
+        """Insert or replace a product; inactive products are dropped."""
+        key = str(doc["_id"])
+        self.remove(key)
+        if not doc.get("is_active", True):
+            return
+        self._products[key] = doc
+        if doc.get("product_id"):
+            self._by_product_id[doc["product_id"]] = key
+        if doc.get("sku"):
+            self._by_sku[doc["sku"]] = key
+
+    def remove(self, product_id: str):
+        """Drop a product by its database id; the next scan reads it through from MongoDB."""
+        doc = self._products.pop(str(product_id), None)
+        if not doc:
+            return
+        if doc.get("product_id") and self._by_product_id.get(doc["product_id"]) == str(product_id):
+            del self._by_product_id[doc["product_id"]]
+        if doc.get("sku") and self._by_sku.get(doc["sku"]) == str(product_id):
+            del self._by_sku[doc["sku"]]
+
+    def invalidate(self, *product_ids: str):
+        for product_id in product_ids:
+            self.remove(product_id)
+
+    def set_category_name(self, category_id: str, name: Optional[str]):
+        if name is None:
+            self._category_names.pop(str(category_id), None)
+        else:
+            self._category_names[str(category_id)] = name
+
+    def _advance_watermark(self, doc: dict):
+        updated_at = doc.get("updated_at")
+        if isinstance(updated_at, datetime) and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    # Synchronisation
+
+    async def _load_categories(self):
+        names = {}
+        async for cat in db.categories.find({"is_active": True}, {"name": 1}):
+            names[str(cat["_id"])] = cat["name"]
+        self._category_names = names
+
+    async def warm(self):
+        """Load every active product into memory.
+
+        The maps are built aside and swapped in at once, so scans during a reload keep hitting.
+        """
+        started = datetime.utcnow()
+        await self._load_categories()
+        fresh = BarcodeIndex()
+        async for doc in db.products.find({"is_active": True}):
+            fresh.put(doc)
+            self._advance_watermark(doc)
+        self._products, self._by_product_id, self._by_sku = fresh._products, fresh._by_product_id, fresh._by_sku
+        if self._watermark is None:
+            self._watermark = started
+        self._last_sync_at = datetime.utcnow()
+        print(f"✅ Barcode index warmed with {len(self._products)} products")
+
+    async def refresh_forecasts(self):
+        """Copy the recomputed `forecast` of every indexed product, leaving the rest of the index in place.
+
+        The forecast job rewrites that field without touching `updated_at`, so polling misses it.
+        """
+        refreshed = 0
+        async for doc in db.products.find({"is_active": True, "forecast": {"$exists": True}}, {"forecast": 1}):
+            key = str(doc["_id"])
+            current = self._products.get(key)
+            if current is not None:
+                # Replaced, not mutated: lookups hand out shallow copies
+                self._products[key] = {**current, "forecast": doc["forecast"]}
+                refreshed += 1
+        print(f"✅ Barcode index forecasts refreshed for {refreshed} products")
+
+    async def poll(self):
+        """Apply every product changed since the last watermark."""
+        await self._load_categories()
+        query = {}
+        if self._watermark is not None:
+            query["updated_at"] = {"$gt": self._watermark - POLL_OVERLAP}
+        async for doc in db.products.find(query):
+            self.put(doc)
+            self._advance_watermark(doc)
+        self._last_sync_at = datetime.utcnow()
+
+    async def _poll_loop(self):
+        while True:
+            interval = BARCODE_INDEX_RECONCILE_SECONDS if self.mode == "change_stream" else BARCODE_INDEX_POLL_SECONDS
+            await asyncio.sleep(interval)
+            try:
+                await self.poll()
+            except PyMongoError as e:
+                print(f"❌ Barcode index poll failed: {e}")
+
+    async def _watch_loop(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        try:
+            async with db.products.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+                self.mode = "change_stream"
+                print("✅ Barcode index following products change stream")
+                while stream.alive:
+                    change = await stream.try_next()
+                    self._last_sync_at = datetime.utcnow()
+                    if change is None:
+                        continue
+                    if change["operationType"] == "delete":
+                        self.remove(str(change["documentKey"]["_id"]))
+                    elif change.get("fullDocument"):
+                        self.put(change["fullDocument"])
+        except OperationFailure as e:
+            print(f"ℹ️ Change streams unavailable ({e.code}), barcode index will poll every {BARCODE_INDEX_POLL_SECONDS}s")
+        except PyMongoError as e:
+            print(f"❌ Barcode index change stream stopped: {e}")
+        self.mode = "polling"
+
+    async def start(self):
+        """Warm the index and start keeping it fresh in the background."""
+        try:
+            await self.warm()
+        except PyMongoError as e:
+            print(f"❌ Barcode index warm-up failed, scans will read from MongoDB: {e}")
+        self.mode = "polling"
+        start_background("barcode-index-watch", self._watch_loop())
+        start_background("barcode-index-poll", self._poll_loop())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        staleness = (datetime.utcnow() - self._last_sync_at).total_seconds() if self._last_sync_at else None
+        return {
+            "mode": self.mode,
+            "products": len(self._products),
+            "categories": len(self._category_names),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "last_sync_at": self._last_sync_at,
+            "staleness_seconds": staleness,
+        }
+
+
+barcode_index = BarcodeIndex()
@@ -0,0 +1,293 @@
+"""
+Bulk product import from XLSX/CSV files.
+
+Rows are read in streaming mode, validated in chunks against category, SKU and
+product_id sets prefetched once per import, and written with unordered
+`bulk_write` upserts keyed on `product_id`. An update only sets the columns present
+in the file; the model defaults of omitted columns apply to new products alone.
+The quantity replaced by a row (for its ledger entry) is the one prefetched, so a
+sale recorded while the import runs skews the as-of quantities until the next
+stock snapshot. Runs synchronously (pymongo) so it can
+be used both from a job worker process and from `manage.py import-products`.
+"""
+
+import csv
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+import openpyxl
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo import UpdateOne
+
+from app.catalog.service import record_changes_sync
+from app.database.sync_connection import in_transaction_sync
+from app.products.schemas import ProductCreate
+from app.stock.models import MovementReason
+from app.stock.service import movement_doc
+
+CHUNK_SIZE = 1000
+
+# Accepted column headers (lower-cased) mapped to product fields, including the Arabic
+# column names of the inventory export. The export itself has no category column and
+# ends with a totals row, so it is not importable as is.
+COLUMN_ALIASES = {
+    "name": "name",
+    "product_id": "product_id",
+    "sku": "sku",
+    "description": "description",
+    "price": "price",
+    "selling_price": "selling_price",
+    "buying_price": "buying_price",
+    "expiry_date": "expiry_date",
+    "size_unit": "size_unit",
+    "quantity": "quantity",
+    "category": "category",
+    "category_id": "category_id",
+    "discount": "discount",
+    "id المنتج": "product_id",
+    "اسم المنتج": "name",
+    "الوصف": "description",
+    "الوحدة": "size_unit",
+    "كمية المنتج": "quantity",
+    "سعر البيع": "price",
+    "سعر الشراء": "buying_price",
+    "الفئة": "category",
+    "الخصم": "discount",
+    "تاريخ الانتهاء": "expiry_date",
+}
+SIZE_UNIT_ALIASES = {"قطعة": "piece", "دسته": "dozen"}
+
+
+def _iter_xlsx(path: str) -> Iterator[Tuple[int, list, list]]:
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        headers = next(rows, None) or []
+        for row_number, values in enumerate(rows, 2):
+            yield row_number, headers, list(values)
+    finally:
+        wb.close()
+
+
+def _iter_csv(path: str) -> Iterator[Tuple[int, list, list]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        headers = next(reader, None) or []
+        for row_number, values in enumerate(reader, 2):
+            yield row_number, headers, values
+
+
+def iter_rows(path: str) -> Iterator[Tuple[int, dict]]:
+    """Yield (row_number, fields) for every non-empty row of an XLSX or CSV file."""
+    reader = _iter_csv if path.lower().endswith(".csv") else _iter_xlsx
+    mapping = None
+    for row_number, headers, values in reader(path):
+        if mapping is None:
+            mapping = [COLUMN_ALIASES.get(str(h or "").strip().lower()) for h in headers]
+        fields = {}
+        for key, value in zip(mapping, values):
+            if key is None or value is None or (isinstance(value, str) and not value.strip()):
+                continue
+            fields[key] = value.strip() if isinstance(value, str) else value
+        if fields:
+            yield row_number, fields
+
+
+def _chunks(rows: Iterator[Tuple[int, dict]], size: int) -> Iterator[List[Tuple[int, dict]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ProductImporter:
+    """Validates and upserts product rows against sets prefetched once per import."""
+
+    def __init__(self, db):
+        self.db = db
+        self.category_ids: Dict[str, str] = {}
+        self.category_names: Dict[str, str] = {}
+        self.sku_owner: Dict[str, str] = {}
+        self.existing: Dict[str, dict] = {}
+        self.seen_product_ids: set = set()
+        self.summary = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0}
+        self.errors: List[dict] = []
+
+    def prefetch(self):
+        for cat in self.db.categories.find({"is_active": True}, {"name": 1}):
+            self.category_ids[str(cat["_id"])] = str(cat["_id"])
+            self.category_names[cat["name"].strip().lower()] = str(cat["_id"])
+        for doc in self.db.products.find(
+            {}, {"product_id": 1, "sku": 1, "quantity": 1, "category_id": 1, "is_active": 1}
+        ).batch_size(CHUNK_SIZE):
+            if doc.get("sku"):
+                self.sku_owner[doc["sku"]] = doc.get("product_id")
+            if doc.get("product_id"):
+                self.existing[doc["product_id"]] = doc
+
+    def _resolve_category(self, fields: dict):
+        category = str(fields.pop("category", "") or fields.get("category_id", "")).strip()
+        return self.category_ids.get(category) or self.category_names.get(category.lower())
+
+    def validate(self, row_number: int, fields: dict):
+        """Return (product, None) for a valid row or (None, errors)."""
+        errors = []
+        category_id = self._resolve_category(fields)
+        if not category_id:
+            errors.append("Category not found")
+        fields["category_id"] = category_id or ""
+
+        if isinstance(fields.get("size_unit"), str):
+            fields["size_unit"] = SIZE_UNIT_ALIASES.get(fields["size_unit"], fields["size_unit"])
+        for key in ("product_id", "sku"):
+            value = fields.get(key)
+            if isinstance(value, float) and value.is_integer():
+                # Spreadsheet cells turn numeric barcodes into floats
+                value = int(value)
+            if value is not None:
+                fields[key] = str(value)
+
+        try:
+            product = ProductCreate(**fields)
+        except ValidationError as e:
+            errors.extend(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            product = None
+
+        if product:
+            if not product.product_id:
+                product.product_id = f"PRD-{ObjectId()}"
+            if product.product_id in self.seen_product_ids:
+                errors.append("Duplicate product_id in file")
+            if product.sku and self.sku_owner.get(product.sku, product.product_id) != product.product_id:
+                errors.append("SKU already exists")
+
+        if errors:
+            return None, errors
+        return product, None
+
+    def import_chunk(self, chunk: List[Tuple[int, dict]]):
+        operations = []
+        imported = []
+        now = datetime.utcnow()
+        for row_number, fields in chunk:
+            self.summary["rows"] += 1
+            product, errors = self.validate(row_number, fields)
+            if errors:
+                self.summary["failed"] += 1
+                self.errors.append({"row": row_number, "errors": errors})
+                continue
+
+            self.seen_product_ids.add(product.product_id)
+            if product.sku:
+                self.sku_owner[product.sku] = product.product_id
+            # Columns missing from the file keep their stored values
+            data = product.dict(exclude_unset=True)
+            defaults = {k: v for k, v in product.dict().items() if k not in data}
+            data["is_active"] = True
+            data["updated_at"] = now
+            operations.append(UpdateOne(
+                {"product_id": product.product_id},
+                {"$set": data, "$setOnInsert": {**defaults, "created_at": now}},
+                upsert=True
+            ))
+            imported.append((product.product_id, product.quantity, product.category_id))
+
+        if operations:
+            existing = {row[0]: self.existing[row[0]] for row in imported if row[0] in self.existing}
+
+            def write(session):
+                # The upserts and their ledger entries commit together
+                result = self.db.products.bulk_write(operations, ordered=False, session=session)
+                movements = self.movements(imported, existing, result.upserted_ids, now)
+                changed = [m for m in movements if m["delta"]]
+                if changed:
+                    self.db.stock_movements.insert_many(changed, session=session)
+                return result, movements
+
+            result, movements = in_transaction_sync(self.db, write)
+            self.summary["inserted"] += result.upserted_count
+            self.summary["updated"] += result.matched_count
+            record_changes_sync(self.db, "product", [m["product_id"] for m in movements])
+            self.update_category_counts(imported, existing, result.upserted_ids)
+            self.remember(imported, existing, result.upserted_ids)
+
+    def remember(self, imported: List[Tuple[str, int, str]], existing: Dict[str, dict], upserted_ids: dict):
+        """Keep the prefetched products in step with the rows just written."""
+        for index, (product_id, quantity, category_id) in enumerate(imported):
+            _id = upserted_ids.get(index) or existing.get(product_id, {}).get("_id")
+            self.existing[product_id] = {
+                "_id": _id, "product_id": product_id, "quantity": quantity,
+                "category_id": category_id, "is_active": True,
+            }
+
+    def update_category_counts(self, imported: List[Tuple[str, int, str]], existing: Dict[str, dict], upserted_ids: dict):
+        """Apply the category product counters changed by this chunk (imported rows are active)."""
+        counts = defaultdict(lambda: {"product_count": 0, "active_product_count": 0})
+        for index, (product_id, _, category_id) in enumerate(imported):
+            before = existing.get(product_id)
+            if index in upserted_ids or before is None:
+                counts[category_id]["product_count"] += 1
+                counts[category_id]["active_product_count"] += 1
+            elif before.get("category_id") != category_id:
+                counts[before.get("category_id")]["product_count"] -= 1
+                counts[category_id]["product_count"] += 1
+                if before.get("is_active", True):
+                    counts[before.get("category_id")]["active_product_count"] -= 1
+                counts[category_id]["active_product_count"] += 1
+            elif not before.get("is_active", True):
+                counts[category_id]["active_product_count"] += 1
+
+        operations = [
+            UpdateOne({"_id": ObjectId(category_id)}, {"$inc": inc})
+            for category_id, inc in counts.items()
+            if category_id and ObjectId.is_valid(category_id) and any(inc.values())
+        ]
+        if operations:
+            self.db.categories.bulk_write(operations, ordered=False)
+
+    def movements(self, imported: List[Tuple[str, int, str]], existing: Dict[str, dict], upserted_ids: dict, now) -> List[dict]:
+        """The stock ledger entry of every imported row (zero deltas included)."""
+        movements = []
+        for index, (product_id, quantity, _) in enumerate(imported):
+            if index in upserted_ids:
+                movements.append(movement_doc(
+                    upserted_ids[index], quantity, MovementReason.INITIAL, "import", None, None, now, quantity
+                ))
+            elif product_id in existing:
+                before = existing[product_id].get("quantity", 0)
+                movements.append(movement_doc(
+                    existing[product_id]["_id"], quantity - before, MovementReason.IMPORT, "import", None, None, now, quantity
+                ))
+        return movements
+
+    def run(self, path: str, chunk_size: int = CHUNK_SIZE) -> dict:
+        self.prefetch()
+        for chunk in _chunks(iter_rows(path), chunk_size):
+            self.import_chunk(chunk)
+        return self.summary
+
+    def write_error_report(self, output):
+        """Write the per-row error report as CSV to a text file object."""
+        writer = csv.writer(output)
+        writer.writerow(["row", "errors"])
+        for error in self.errors:
+            writer.writerow([error["row"], "; ".join(error["errors"])])
+
+
+def import_products_file(db, path: str, error_report_path: str = None) -> dict:
+    """Import a products file and optionally write the error report; returns the summary."""
+    started = datetime.utcnow()
+    importer = ProductImporter(db)
+    summary = importer.run(path)
+    if error_report_path:
+        with open(error_report_path, "w", newline="", encoding="utf-8-sig") as output:
+            importer.write_error_report(output)
+    summary["errors"] = importer.errors[:100]
+    summary["seconds"] = (datetime.utcnow() - started).total_seconds()
+    return summary
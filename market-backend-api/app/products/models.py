@@ -36,6 +36,8 @@ class Category(BaseModel):
     name: str
     description: Optional[str] = None
     is_active: bool = True
+    product_count: int = 0
+    active_product_count: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
 
@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request, Response
+from fastapi.responses import FileResponse
 from typing import Optional, List
-import math
-import io
+import os
+from bson import ObjectId
+from datetime import datetime
+from app.config import UPLOADS_DIR
 from app.auth.dependencies import get_current_admin, get_current_user, get_current_staff
 from app.products.schemas import (
     ProductCreate, ProductUpdate, ProductResponse, ProductListResponse,
-    CategoryCreate, CategoryUpdate, CategoryResponse, StockUpdate, ProductFilter
+    CategoryCreate, CategoryUpdate, CategoryResponse, StockUpdate, ProductFilter,
+    RepriceRequest, RepriceResponse
 )
 from app.products.service import ProductService
+from app.products.barcode_index import barcode_index
+from app.jobs.schemas import JobStatus, JobResponse
+from app.jobs.service import JobService
+from app.core.versions import conditional_response
+from app.core.counts import CountMode, fetch_limit, page_info
 
 router = APIRouter()
 
+IMPORT_EXTENSIONS = (".xlsx", ".csv")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 # Category endpoints
 @router.post("/categories", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
 async def create_category(
@@ -24,21 +35,31 @@ async def create_category(
 
 @router.get("/categories", response_model=List[CategoryResponse])
 async def get_categories(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user = Depends(get_current_user)
 ):
     """Get all categories."""
+    not_modified = conditional_response(request, response, ("categories",))
+    if not_modified:
+        return not_modified
     categories = await ProductService.get_categories(skip=skip, limit=limit)
     return categories
 
 
 @router.get("/categories/{category_id}", response_model=CategoryResponse)
 async def get_category(
+    request: Request,
+    response: Response,
     category_id: str,
     current_user = Depends(get_current_user)
 ):
     """Get category by ID."""
+    not_modified = conditional_response(request, response, ("categories",))
+    if not_modified:
+        return not_modified
     category = await ProductService.get_category_by_id(category_id)
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
@@ -81,11 +102,53 @@ async def create_product(
     current_admin = Depends(get_current_admin)
 ):
     """Create a new product (Admin only)."""
-    return await ProductService.create_product(product)
+    return await ProductService.create_product(product, created_by=current_admin.get("id"))
+
+
+@router.post("/import", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def import_products(
+    file: UploadFile = File(...),
+    current_admin = Depends(get_current_admin)
+):
+    """Bulk import products from an XLSX or CSV file (Admin only).
+
+    The upload is stored on disk and processed by a `product_import` background job.
+    Poll `/api/jobs/{id}` for the summary; the per-row error report is the job's download.
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if extension not in IMPORT_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only .xlsx and .csv files are supported"
+        )
+
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    upload_id = f"{ObjectId()}{extension}"
+    with open(os.path.join(UPLOADS_DIR, upload_id), "wb") as output:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            output.write(chunk)
+
+    return await JobService.submit(
+        "product_import", {"upload_id": upload_id}, requested_by=current_admin.get("id")
+    )
+
+
+@router.post("/reprice", response_model=RepriceResponse)
+async def reprice_products(
+    reprice: RepriceRequest,
+    current_admin = Depends(get_current_admin)
+):
+    """Change prices of all products matching a filter in one operation (Admin only).
+
+    Runs as a dry run unless `dry_run` is false.
+    """
+    return await ProductService.reprice_products(reprice)
 
 
 @router.get("/", response_model=ProductListResponse)
 async def get_products(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     category_id: Optional[str] = Query(None),
@@ -94,9 +157,14 @@ async def get_products(
     max_price: Optional[float] = Query(None, ge=0),
     in_stock_only: Optional[bool] = Query(None),
     low_stock_only: Optional[bool] = Query(None),
+    count: CountMode = Query(CountMode.AUTO, description="auto, exact or none (has_more only)"),
     current_user = Depends(get_current_user)
 ):
     """Get products with filtering and pagination."""
+    # is_expired / days_until_expiry change with the date, so the ETag does too
+    not_modified = conditional_response(request, response, ("products", "categories"), datetime.utcnow().date())
+    if not_modified:
+        return not_modified
     filters = ProductFilter(
         category_id=category_id,
         search=search,
@@ -106,35 +174,51 @@ async def get_products(
         low_stock_only=low_stock_only
     )
     skip = (page - 1) * page_size
-    products, total = await ProductService.get_products(skip=skip, limit=page_size, filters=filters)
-    total_pages = math.ceil(total / page_size) if total > 0 else 1
+    products, total = await ProductService.get_products(
+        skip=skip, limit=fetch_limit(page_size, count), filters=filters, count_mode=count
+    )
     return ProductListResponse(
-        products=products,
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages
+        products=products[:page_size],
+        **page_info(total, len(products), page, page_size)
     )
 
 
 @router.get("/by-product-id/{product_id}", response_model=ProductResponse)
 async def get_product_by_product_id(
+    request: Request,
+    response: Response,
     product_id: str,
     current_user = Depends(get_current_user)
 ):
-    """Get product by physical product ID (from QR/barcode)."""
+    """Get product by physical product ID or SKU (from QR/barcode)."""
+    not_modified = conditional_response(request, response, ("products", "categories"), datetime.utcnow().date())
+    if not_modified:
+        return not_modified
     product = await ProductService.get_product_by_product_id(product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     return product
 
 
+@router.get("/barcode-index/stats")
+async def get_barcode_index_stats(
+    current_admin = Depends(get_current_admin)
+):
+    """Get barcode index cache metrics: size, hit ratio and staleness (Admin only)."""
+    return barcode_index.stats()
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
+    request: Request,
+    response: Response,
     product_id: str,
     current_user = Depends(get_current_user)
 ):
     """Get product by ID."""
+    not_modified = conditional_response(request, response, ("products", "categories"), datetime.utcnow().date())
+    if not_modified:
+        return not_modified
     product = await ProductService.get_product_by_id(product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
@@ -148,7 +232,7 @@ async def update_product(
     current_admin = Depends(get_current_admin)
 ):
     """Update a product (Admin only)."""
-    return await ProductService.update_product(product_id, product_update)
+    return await ProductService.update_product(product_id, product_update, created_by=current_admin.get("id"))
 
 
 @router.delete("/{product_id}")
@@ -168,7 +252,7 @@ async def update_product_stock(
     current_admin = Depends(get_current_staff)
 ):
     """Update product stock (Admin or Cashier)."""
-    return await ProductService.update_stock(product_id, stock_update.quantity)
+    return await ProductService.update_stock(product_id, stock_update.quantity, created_by=current_admin.get("id"))
 
 
 @router.get("/stock/low", response_model=List[ProductResponse])
@@ -197,16 +281,19 @@ async def get_expiring_soon_products(
 async def export_inventory(
     current_admin = Depends(get_current_admin)
 ):
-    """Export inventory to Excel file (Admin only)."""
-    # Get all products without pagination
-    all_products, _ = await ProductService.get_products(skip=0, limit=10000)  # Large limit to get all
-    
-    # Create Excel file in memory
-    excel_file = await ProductService.create_inventory_excel(all_products)
-    
-    # Return as downloadable file
-    return StreamingResponse(
-        io.BytesIO(excel_file),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=inventory_export.xlsx"}
-    )
+    """Export inventory to Excel file (Admin only).
+
+    The workbook is built by an `inventory_export` background job in a worker
+    process; this endpoint waits for it and returns the file. Clients that prefer
+    not to hold the request open can submit the job through `/api/jobs` instead.
+    """
+    job = await JobService.submit("inventory_export", requested_by=current_admin.get("id"))
+    job = await JobService.wait(job["id"])
+    if job["status"] != JobStatus.SUCCEEDED:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Inventory export failed: {job.get('error')}"
+        )
+
+    result = await JobService.get_result_file(job["id"])
+    return FileResponse(result["path"], media_type=result["media_type"], filename=result["filename"])
@@ -26,6 +26,8 @@ class CategoryUpdate(BaseModel):
 class CategoryResponse(CategoryBase):
     id: Optional[PyObjectId] = Field(default=None, alias="_id")
     is_active: bool
+    product_count: int = 0
+    active_product_count: int = 0
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -161,6 +163,8 @@ class ProductResponse(BaseModel):
     final_price: float
     is_low_stock: bool
     stock_status: str
+    reorder_point: Optional[int] = None  # from the demand forecast
+    days_of_cover: Optional[float] = None
     is_expired: Optional[bool] = False  # New field to indicate if product is expired
     days_until_expiry: Optional[int] = None  # New field to show days until expiry
     
@@ -170,10 +174,11 @@ class ProductResponse(BaseModel):
 
 class ProductListResponse(BaseModel):
     products: List[ProductResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    has_more: bool = False
 
 
 class CategoryWithProducts(BaseModel):
@@ -206,3 +211,49 @@ class ProductFilter(BaseModel):
     max_price: Optional[float] = None
     in_stock_only: Optional[bool] = None
     low_stock_only: Optional[bool] = None
+
+
+class RepriceRequest(BaseModel):
+    """Bulk repricing: which active products to change and how."""
+    category_id: Optional[str] = None
+    product_ids: Optional[List[str]] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    mode: Literal["percentage", "absolute"] = "percentage"
+    change: float = 0.0  # +10 = 10% more (percentage) or 10 more (absolute)
+    rounding: Literal["none", "nearest", "up", "down"] = "none"
+    rounding_step: float = 0.25
+    discount: Optional[float] = None
+    dry_run: bool = True
+
+    @validator('rounding_step')
+    def validate_rounding_step(cls, v):
+        if v <= 0:
+            raise ValueError('Rounding step must be greater than 0')
+        return v
+
+    @validator('discount')
+    def validate_discount(cls, v):
+        if v is not None and (v < 0 or v > 100):
+            raise ValueError('Discount must be between 0 and 100')
+        return v
+
+
+class RepriceSample(BaseModel):
+    id: str
+    name: str
+    old_price: float
+    new_price: float
+
+
+class RepriceResponse(BaseModel):
+    dry_run: bool
+    matched: int
+    modified: int = 0
+    total_before: float = 0.0
+    total_after: float = 0.0
+    average_delta: float = 0.0
+    min_delta: float = 0.0
+    max_delta: float = 0.0
+    non_positive: int = 0  # products that would end at a zero or negative price; blocks applying
+    sample: List[RepriceSample] = []
@@ -1,24 +1,48 @@
-from typing import List, Optional, Tuple
+import asyncio
+from typing import Iterable, List, Optional, Tuple
 from fastapi import HTTPException, status
 from bson import ObjectId
+from pymongo import UpdateOne
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
-import io
 
 from app.database.connection import db
+from app.core.excel import new_write_only_sheet, append_totals_row
 from app.products.schemas import (
-    ProductCreate, ProductUpdate, CategoryCreate, CategoryUpdate, ProductFilter
+    ProductCreate, ProductUpdate, CategoryCreate, CategoryUpdate, ProductFilter, RepriceRequest
 )
 from app.products.models import Product, Category
+from app.products.barcode_index import barcode_index
+from app.stock.models import MovementReason
+from app.alerts.models import AlertType
+from app.alerts.service import LOW_STOCK_QUERY, AlertService, is_low_stock
+from app.catalog.service import CatalogService
+from app.core.versions import versions
+from app.core.counts import CountMode, CountService
+from app.config import ALERT_EXPIRY_DAYS
+from app.stock.service import in_transaction, movement_doc
+
+# Inventory export layout
+INVENTORY_HEADERS = [
+    "ID المنتج",
+    "اسم المنتج",
+    "الوحدة",
+    "كمية المنتج",
+    "سعر البيع",
+    "سعر الشراء",
+    "إجمالي السعر"
+]
+INVENTORY_COLUMN_WIDTHS = [28, 30, 10, 14, 12, 12, 18]
+INVENTORY_PROJECTION = {
+    "product_id": 1, "name": 1, "size_unit": 1, "quantity": 1,
+    "selling_price": 1, "price": 1, "buying_price": 1
+}
 
 
 class ProductService:
 
     @staticmethod
-    async def _add_computed_fields(doc: dict) -> dict:
-        """Add computed fields to product document"""
+    def _compute_fields(doc: dict, category_name: Optional[str]) -> dict:
+        """Add computed fields to product document using an already resolved category name"""
         # Convert ObjectId to string
         if "_id" in doc and not isinstance(doc["_id"], str):
             doc["_id"] = str(doc["_id"])
@@ -33,11 +57,18 @@ class ProductService:
         quantity = doc["quantity"]
         
         doc["final_price"] = price * (1 - (discount / 100)) if discount > 0 else price
-        doc["is_low_stock"] = quantity < 10
-        
+
+        # Products with a sales history reorder at their forecast reorder point
+        forecast = doc.get("forecast") or {}
+        reorder_point = forecast.get("reorder_point") or 0
+        doc["reorder_point"] = reorder_point or None
+        daily_demand = forecast.get("daily_demand") or 0
+        doc["days_of_cover"] = round(max(quantity, 0) / daily_demand, 1) if daily_demand > 0 else None
+        doc["is_low_stock"] = is_low_stock(doc)
+
         if quantity == 0:
             doc["stock_status"] = "out_of_stock"
-        elif quantity < 10:
+        elif doc["is_low_stock"]:
             doc["stock_status"] = "low_stock"
         elif quantity < 50:
             doc["stock_status"] = "medium_stock"
@@ -58,19 +89,25 @@ class ProductService:
         else:
             doc["days_until_expiry"] = None
             doc["is_expired"] = False
-        
+
+        doc["category_name"] = category_name
+        return doc
+
+    @staticmethod
+    async def _add_computed_fields(doc: dict) -> dict:
+        """Add computed fields to product document"""
         # Add category name resolution
         category_id = doc.get("category_id")
         if category_id:
             try:
                 category = await db.categories.find_one({"_id": ObjectId(category_id), "is_active": True})
-                doc["category_name"] = category["name"] if category else "Unknown Category"
+                category_name = category["name"] if category else "Unknown Category"
             except:
-                doc["category_name"] = "Invalid Category"
+                category_name = "Invalid Category"
         else:
-            doc["category_name"] = None
-            
-        return doc
+            category_name = None
+
+        return ProductService._compute_fields(doc, category_name)
 
     ### CATEGORY METHODS
 
@@ -82,11 +119,16 @@ class ProductService:
         category_data = category.dict()
         category_data.update({
             "is_active": True,
+            "product_count": 0,
+            "active_product_count": 0,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         })
         result = await db.categories.insert_one(category_data)
         category_data["_id"] = result.inserted_id
+        barcode_index.set_category_name(str(result.inserted_id), category_data["name"])
+        await CatalogService.record_changes("category", [result.inserted_id])
+        versions.bump("categories")
         category = Category(**category_data)
         return category
 
@@ -114,7 +156,11 @@ class ProductService:
                 raise HTTPException(status_code=400, detail="Category with this name already exists")
 
         await db.categories.update_one({"_id": ObjectId(category_id)}, {"$set": update_data})
-        return await ProductService.get_category_by_id(category_id)
+        updated = await ProductService.get_category_by_id(category_id)
+        barcode_index.set_category_name(category_id, updated.name if updated else None)
+        await CatalogService.record_changes("category", [category_id])
+        versions.bump("categories")
+        return updated
 
     @staticmethod
     async def delete_category(category_id: str) -> bool:
@@ -122,11 +168,16 @@ class ProductService:
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
 
-        products_count = await db.products.count_documents({"category_id": category_id, "is_active": True})
-        if products_count > 0:
+        if category.active_product_count > 0:
             raise HTTPException(status_code=400, detail="Cannot delete category with existing products")
 
-        await db.categories.update_one({"_id": ObjectId(category_id)}, {"$set": {"is_active": False}})
+        await db.categories.update_one(
+            {"_id": ObjectId(category_id)},
+            {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+        )
+        barcode_index.set_category_name(category_id, None)
+        await CatalogService.record_changes("category", [category_id])
+        versions.bump("categories")
         return True
 
     @staticmethod
@@ -147,18 +198,75 @@ class ProductService:
         for cat in default_categories:
             cat.update({
                 "is_active": True,
+                "product_count": 0,
+                "active_product_count": 0,
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             })
             result = await db.categories.insert_one(cat)
             cat["_id"] = result.inserted_id
             created.append(Category(**cat))
+        await CatalogService.record_changes("category", [category.id for category in created])
+        versions.bump("categories")
         return created
 
+    @staticmethod
+    async def _inc_category_counts(category_id: str, products: int, active: int):
+        """Adjust the denormalized product counters of a category."""
+        if not (products or active) or not ObjectId.is_valid(category_id):
+            return
+        await db.categories.update_one(
+            {"_id": ObjectId(category_id)},
+            {"$inc": {"product_count": products, "active_product_count": active}}
+        )
+        versions.bump("categories")
+
+    @staticmethod
+    def rebuild_category_counts(sync_db) -> int:
+        """Recompute every category's product counters from the products collection.
+
+        Synchronous (pymongo) so it can run from `manage.py rebuild-category-counts`
+        or in a thread at startup.
+        """
+        counts = {
+            doc["_id"]: doc
+            for doc in sync_db.products.aggregate([
+                {"$group": {
+                    "_id": "$category_id",
+                    "product_count": {"$sum": 1},
+                    "active_product_count": {"$sum": {"$cond": [{"$eq": ["$is_active", True]}, 1, 0]}},
+                }}
+            ])
+        }
+        operations = []
+        for cat in sync_db.categories.find({}, {"_id": 1}):
+            found = counts.get(str(cat["_id"]), {})
+            operations.append(UpdateOne({"_id": cat["_id"]}, {"$set": {
+                "product_count": found.get("product_count", 0),
+                "active_product_count": found.get("active_product_count", 0),
+            }}))
+        if operations:
+            sync_db.categories.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    @staticmethod
+    async def ensure_category_counts():
+        """Build the counters once for databases created before they existed."""
+        if await db.categories.find_one({"product_count": {"$exists": False}}, {"_id": 1}):
+            from app.database.sync_connection import get_sync_db
+            rebuilt = await asyncio.to_thread(ProductService.rebuild_category_counts, get_sync_db())
+            versions.bump("categories")
+            print(f"✅ Category product counters rebuilt for {rebuilt} categories")
+
+    @staticmethod
+    async def get_category_distribution() -> List[dict]:
+        cursor = db.categories.find({"is_active": True}, {"name": 1, "active_product_count": 1})
+        return [{"name": cat["name"], "value": cat.get("active_product_count", 0)} async for cat in cursor]
+
     ### PRODUCT METHODS
 
     @staticmethod
-    async def create_product(product: ProductCreate) -> dict:
+    async def create_product(product: ProductCreate, created_by: Optional[str] = None) -> dict:
         if not await ProductService.get_category_by_id(product.category_id):
             raise HTTPException(status_code=404, detail="Category not found")
 
@@ -179,9 +287,23 @@ class ProductService:
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         })
-        result = await db.products.insert_one(data)
+
+        async def write(session):
+            result = await db.products.insert_one(data, session=session)
+            if data["quantity"]:
+                await db.stock_movements.insert_one(movement_doc(
+                    result.inserted_id, data["quantity"], MovementReason.INITIAL, "product", str(result.inserted_id),
+                    created_by, data["created_at"], quantity_after=data["quantity"]
+                ), session=session)
+            return result
+
+        result = await in_transaction(write)
         data["_id"] = result.inserted_id
-        
+        await ProductService._inc_category_counts(data["category_id"], 1, 1)
+        barcode_index.put(dict(data))
+        await CatalogService.record_changes("product", [result.inserted_id])
+        versions.bump("products")
+
         return await ProductService._add_computed_fields(data)
 
     @staticmethod
@@ -191,11 +313,22 @@ class ProductService:
 
     @staticmethod
     async def get_product_by_product_id(product_id: str) -> Optional[dict]:
+        """Resolve a scanned code (product_id or sku), serving from the barcode index when possible."""
+        cached = barcode_index.lookup(product_id)
+        if cached:
+            return ProductService._compute_fields(*cached)
+
         doc = await db.products.find_one({"product_id": product_id, "is_active": True})
-        return await ProductService._add_computed_fields(doc) if doc else None
+        if not doc:
+            doc = await db.products.find_one({"sku": product_id, "is_active": True})
+        if not doc:
+            return None
+        barcode_index.put(dict(doc))
+        return await ProductService._add_computed_fields(doc)
 
     @staticmethod
-    async def get_products(skip=0, limit=100, filters: Optional[ProductFilter] = None) -> Tuple[List[dict], int]:
+    async def get_products(skip=0, limit=100, filters: Optional[ProductFilter] = None,
+                           count_mode: CountMode = CountMode.AUTO) -> Tuple[List[dict], Optional[int]]:
         query = {"is_active": True}
 
         if filters:
@@ -215,18 +348,18 @@ class ProductService:
             if filters.in_stock_only:
                 query["quantity"] = {"$gt": 0}
             if filters.low_stock_only:
-                query["quantity"] = {"$lt": 10}
+                query.update(LOW_STOCK_QUERY)
 
         cursor = db.products.find(query).skip(skip).limit(limit)
         products = []
         async for doc in cursor:
             products.append(await ProductService._add_computed_fields(doc))
-            
-        total = await db.products.count_documents(query)
+
+        total = await CountService.count(db.products, query, count_mode, base_query={"is_active": True})
         return products, total
 
     @staticmethod
-    async def update_product(product_id: str, update: ProductUpdate) -> dict:
+    async def update_product(product_id: str, update: ProductUpdate, created_by: Optional[str] = None) -> dict:
         product = await ProductService.get_product_by_id(product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
@@ -246,7 +379,19 @@ class ProductService:
         update_data = {k: v for k, v in update.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
 
-        await db.products.update_one({"_id": ObjectId(product_id)}, {"$set": update_data})
+        await ProductService._write_with_movement(
+            product_id, update_data, MovementReason.ADJUSTMENT, created_by
+        )
+        old_category, new_category = product["category_id"], update_data.get("category_id", product["category_id"])
+        old_active, new_active = product["is_active"], update_data.get("is_active", product["is_active"])
+        if old_category != new_category:
+            await ProductService._inc_category_counts(old_category, -1, -int(old_active))
+            await ProductService._inc_category_counts(new_category, 1, int(new_active))
+        elif old_active != new_active:
+            await ProductService._inc_category_counts(new_category, 0, 1 if new_active else -1)
+        barcode_index.invalidate(product_id)
+        await CatalogService.record_changes("product", [product_id])
+        versions.bump("products")
         return await ProductService.get_product_by_id(product_id)
 
     @staticmethod
@@ -255,20 +400,182 @@ class ProductService:
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
 
-        await db.products.update_one({"_id": ObjectId(product_id)}, {"$set": {"is_active": False}})
+        await db.products.update_one(
+            {"_id": ObjectId(product_id)},
+            {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+        )
+        await ProductService._inc_category_counts(product["category_id"], 0, -1)
+        barcode_index.invalidate(product_id)
+        await CatalogService.record_changes("product", [product_id])
+        versions.bump("products")
         return True
 
     @staticmethod
-    async def update_stock(product_id: str, quantity: int) -> dict:
+    async def _write_with_movement(
+        product_id: str, fields: dict, reason: MovementReason, created_by: Optional[str] = None
+    ):
+        """$set product fields; a new quantity is logged in the ledger in the same transaction.
+
+        The delta is taken from the document as it was just before the write, so a sale
+        landing between an earlier read and this write is not counted twice.
+        """
+        async def write(session):
+            before = await db.products.find_one_and_update(
+                {"_id": ObjectId(product_id)}, {"$set": fields}, {"quantity": 1}, session=session
+            )
+            if before is None or "quantity" not in fields:
+                return
+            delta = fields["quantity"] - before.get("quantity", 0)
+            if delta:
+                await db.stock_movements.insert_one(movement_doc(
+                    product_id, delta, reason, created_by=created_by, created_at=fields["updated_at"],
+                    quantity_after=fields["quantity"]
+                ), session=session)
+
+        await in_transaction(write)
+
+    @staticmethod
+    async def update_stock(product_id: str, quantity: int, created_by: Optional[str] = None) -> dict:
         product = await ProductService.get_product_by_id(product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
 
-        await db.products.update_one({"_id": ObjectId(product_id)}, {"$set": {"quantity": quantity}})
+        await ProductService._write_with_movement(
+            product_id, {"quantity": quantity, "updated_at": datetime.utcnow()}, MovementReason.ADJUSTMENT, created_by
+        )
+        barcode_index.invalidate(product_id)
+        await CatalogService.record_changes("product", [product_id])
+        versions.bump("products")
         return await ProductService.get_product_by_id(product_id)
 
     @staticmethod
-    async def get_low_stock_products(threshold: int = 10) -> List[dict]:
+    def _reprice_filter(request: RepriceRequest) -> dict:
+        query = {"is_active": True}
+        if request.category_id:
+            query["category_id"] = request.category_id
+        if request.product_ids:
+            query["_id"] = {"$in": [ObjectId(i) for i in request.product_ids if ObjectId.is_valid(i)]}
+        # The range applies to the price being changed: selling price, else list price
+        current = {"$ifNull": ["$selling_price", "$price"]}
+        bounds = []
+        if request.min_price is not None:
+            bounds.append({"$gte": [current, request.min_price]})
+        if request.max_price is not None:
+            bounds.append({"$lte": [current, request.max_price]})
+        if bounds:
+            query["$expr"] = {"$and": bounds}
+        return query
+
+    @staticmethod
+    def _reprice_expression(request: RepriceRequest) -> dict:
+        """Aggregation expression computing the new selling price of a product."""
+        current = {"$ifNull": ["$selling_price", "$price"]}
+        if request.mode == "percentage":
+            raw = {"$multiply": [current, 1 + request.change / 100]}
+        else:
+            raw = {"$add": [current, request.change]}
+
+        if request.rounding != "none":
+            operator = {"nearest": "$round", "up": "$ceil", "down": "$floor"}[request.rounding]
+            steps = {"$divide": [raw, request.rounding_step]}
+            steps = {"$round": [steps, 0]} if operator == "$round" else {operator: steps}
+            raw = {"$multiply": [steps, request.rounding_step]}
+        # Drop floating point noise left by the step arithmetic
+        return {"$round": [raw, 2]}
+
+    @staticmethod
+    async def reprice_products(request: RepriceRequest) -> dict:
+        """Preview or apply a price change to every matching product with one update_many."""
+        query = ProductService._reprice_filter(request)
+        new_price = ProductService._reprice_expression(request)
+        old_price = {"$ifNull": ["$selling_price", "$price"]}
+
+        pipeline = [
+            {"$match": query},
+            {"$project": {"name": 1, "old_price": old_price, "new_price": new_price}},
+            {"$facet": {
+                "summary": [{"$group": {
+                    "_id": None,
+                    "matched": {"$sum": 1},
+                    "total_before": {"$sum": "$old_price"},
+                    "total_after": {"$sum": "$new_price"},
+                    "average_delta": {"$avg": {"$subtract": ["$new_price", "$old_price"]}},
+                    "min_delta": {"$min": {"$subtract": ["$new_price", "$old_price"]}},
+                    "max_delta": {"$max": {"$subtract": ["$new_price", "$old_price"]}},
+                    "non_positive": {"$sum": {"$cond": [{"$lte": ["$new_price", 0]}, 1, 0]}},
+                }}],
+                "sample": [{"$limit": 20}],
+            }},
+        ]
+        result = (await db.products.aggregate(pipeline).to_list(length=1))[0]
+        summary = result["summary"][0] if result["summary"] else {"matched": 0, "non_positive": 0}
+        summary.pop("_id", None)
+        non_positive = summary["non_positive"]
+        summary["sample"] = [
+            {"id": str(doc["_id"]), "name": doc.get("name", ""), "old_price": doc["old_price"], "new_price": doc["new_price"]}
+            for doc in result["sample"]
+        ]
+        summary["dry_run"] = request.dry_run
+
+        if non_positive and not request.dry_run:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Repricing would set a zero or negative price for {non_positive} products"
+            )
+        if request.dry_run or not summary["matched"]:
+            return summary
+
+        now = datetime.utcnow()
+        # Journal the ids first: the update itself is a single server-side pipeline
+        product_ids = [str(doc["_id"]) async for doc in db.products.find(query, {"_id": 1})]
+        fields = {"updated_at": now}
+        # A discount-only request leaves the prices as they are
+        reprices = request.change or request.rounding != "none"
+        if reprices:
+            fields["price"] = new_price
+        if request.discount is not None:
+            fields["discount"] = request.discount
+        result = await db.products.update_many(query, [{"$set": fields}])
+        summary["modified"] = result.modified_count
+        if reprices:
+            # Only products that carry a selling price get a new one; setting `price` above
+            # left it as it was, so the expression still reads the old selling price
+            await db.products.update_many(
+                {**query, "selling_price": {"$ne": None}}, [{"$set": {"selling_price": new_price}}]
+            )
+
+        barcode_index.invalidate(*product_ids)
+        await CatalogService.record_changes("product", product_ids)
+        versions.bump("products")
+        return summary
+
+    @staticmethod
+    async def _get_products_by_ids(product_ids: List[str]) -> List[dict]:
+        """Fetch active products by id with one query and resolve categories with one more."""
+        object_ids = [ObjectId(product_id) for product_id in product_ids if ObjectId.is_valid(product_id)]
+        if not object_ids:
+            return []
+        docs = [doc async for doc in db.products.find({"_id": {"$in": object_ids}, "is_active": True})]
+        category_ids = {doc["category_id"] for doc in docs if doc.get("category_id") and ObjectId.is_valid(doc["category_id"])}
+        category_names = {
+            str(cat["_id"]): cat["name"]
+            async for cat in db.categories.find({"_id": {"$in": [ObjectId(c) for c in category_ids]}, "is_active": True}, {"name": 1})
+        }
+        return [
+            ProductService._compute_fields(
+                doc, category_names.get(doc["category_id"], "Unknown Category") if doc.get("category_id") else None
+            )
+            for doc in docs
+        ]
+
+    @staticmethod
+    async def get_low_stock_products(threshold: Optional[int] = None) -> List[dict]:
+        """Low-stock products by each product's reorder point, or below a fixed `threshold`."""
+        if threshold is None:
+            # Served from the precomputed alerts
+            product_ids = await AlertService.get_product_ids([AlertType.OUT_OF_STOCK, AlertType.LOW_STOCK])
+            return await ProductService._get_products_by_ids(product_ids)
+
         cursor = db.products.find({"is_active": True, "quantity": {"$lt": threshold}})
         products = []
         async for doc in cursor:
@@ -278,17 +585,9 @@ class ProductService:
 
     @staticmethod
     async def get_expired_products() -> List[dict]:
-        """Get all products that have expired or are expiring soon (within 7 days)"""
-        now = datetime.utcnow()
-        cursor = db.products.find({
-            "is_active": True, 
-            "expiry_date": {"$lte": now}
-        })
-        products = []
-        async for doc in cursor:
-            products.append(await ProductService._add_computed_fields(doc))
-            
-        return products
+        """Get all products that have expired"""
+        product_ids = await AlertService.get_product_ids([AlertType.EXPIRED])
+        return await ProductService._get_products_by_ids(product_ids)
 
     @staticmethod
     async def get_expiring_soon_products(days: int = 7) -> List[dict]:
@@ -296,6 +595,13 @@ class ProductService:
         now = datetime.utcnow()
         from datetime import timedelta
         expiry_threshold = now + timedelta(days=days)
+
+        if days <= ALERT_EXPIRY_DAYS:
+            # Served from the precomputed alerts
+            product_ids = await AlertService.get_product_ids(
+                [AlertType.EXPIRING_SOON], expiring_before=expiry_threshold
+            )
+            return await ProductService._get_products_by_ids(product_ids)
         
         cursor = db.products.find({
             "is_active": True, 
@@ -308,101 +614,47 @@ class ProductService:
         return products
     
     @staticmethod
-    async def create_inventory_excel(products: List[dict]) -> bytes:
-        """Create Excel file with inventory data"""
-        # Create workbook and worksheet
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "جرد المنتجات"
-        
-        # Define headers
-        headers = [
-            "ID المنتج",
-            "اسم المنتج", 
-            "الوحدة",
-            "كمية المنتج",
-            "سعر البيع",
-            "سعر الشراء", 
-            "إجمالي السعر"
-        ]
-        
-        # Style for headers
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Add headers
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Add data rows
-        for row, product in enumerate(products, 2):
-            # Product ID
-            ws.cell(row=row, column=1, value=product.get("product_id", "N/A"))
-            
-            # Product Name
-            ws.cell(row=row, column=2, value=product.get("name", ""))
-            
-            # Unit (قطعة or دسته)
-            unit_text = "دسته" if product.get("size_unit") == "dozen" else "قطعة"
-            ws.cell(row=row, column=3, value=unit_text)
-            
-            # Quantity
-            quantity = product.get("quantity", 0)
-            ws.cell(row=row, column=4, value=quantity)
-            
-            # Selling Price
-            selling_price = product.get("selling_price") or product.get("price", 0)
-            ws.cell(row=row, column=5, value=selling_price)
-            
-            # Buying Price
-            buying_price = product.get("buying_price", 0)
-            ws.cell(row=row, column=6, value=buying_price if buying_price else "غير محدد")
-            
+    def _inventory_row(product: dict) -> list:
+        """Build one inventory sheet row from a raw product document"""
+        # Unit (قطعة or دسته)
+        unit_text = "دسته" if product.get("size_unit") == "dozen" else "قطعة"
+        quantity = product.get("quantity", 0)
+        selling_price = product.get("selling_price") or product.get("price", 0)
+        buying_price = product.get("buying_price", 0)
+
+        return [
+            product.get("product_id", "N/A"),
+            product.get("name", ""),
+            unit_text,
+            quantity,
+            selling_price,
+            buying_price if buying_price else "غير محدد",
             # Total Price (Buying Price * Quantity)
-            if buying_price:
-                total_price = buying_price * quantity
-                ws.cell(row=row, column=7, value=total_price)
-            else:
-                ws.cell(row=row, column=7, value="غير محدد")
-        
-        # Auto-adjust column widths
-        for col in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col)
-            max_length = 0
-            for row in ws[column_letter]:
-                try:
-                    if len(str(row.value)) > max_length:
-                        max_length = len(str(row.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 30)  # Cap at 30 characters
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Add totals row
-        total_row = len(products) + 3
-        ws.cell(row=total_row, column=1, value="الإجمالي:").font = Font(bold=True)
-        
-        # Calculate total inventory value
+            buying_price * quantity if buying_price else "غير محدد",
+        ]
+
+    @staticmethod
+    def write_inventory_excel(products: Iterable[dict], output) -> dict:
+        """Write an inventory Excel file from an iterable of raw product documents.
+
+        Rows go through openpyxl's write-only mode, so memory stays flat regardless
+        of catalog size. This is CPU-bound and runs inside a job worker process
+        (see `app.jobs.workers`), never on the event loop.
+        """
+        wb, ws = new_write_only_sheet("جرد المنتجات", INVENTORY_HEADERS, INVENTORY_COLUMN_WIDTHS)
+
         total_value = 0
         total_quantity = 0
-        
+        rows = 0
         for product in products:
+            ws.append(ProductService._inventory_row(product))
             quantity = product.get("quantity", 0)
             buying_price = product.get("buying_price")
             total_quantity += quantity
             if buying_price:
                 total_value += buying_price * quantity
-        
-        ws.cell(row=total_row, column=4, value=total_quantity).font = Font(bold=True)
-        ws.cell(row=total_row, column=7, value=f"{total_value:.2f} جنيه").font = Font(bold=True)
-        
-        # Save to BytesIO
-        excel_buffer = io.BytesIO()
-        wb.save(excel_buffer)
-        excel_buffer.seek(0)
-        
-        return excel_buffer.getvalue()
+            rows += 1
+
+        append_totals_row(ws, ["الإجمالي:", None, None, total_quantity, None, None, f"{total_value:.2f} جنيه"])
+        wb.save(output)
+        return {"rows": rows, "total_quantity": total_quantity, "total_value": total_value}
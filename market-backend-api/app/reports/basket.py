@@ -0,0 +1,217 @@
+"""
+Market-basket analysis: "frequently bought together" suggestions.
+
+The `basket_analysis` job (see app.jobs) reads the invoice items of the last
+BASKET_HISTORY_DAYS days into a CSR invoices x products incidence matrix (NumPy
+`indptr` / `indices` arrays, one row per invoice). Every pair of distinct products
+sharing a row is counted with array operations, which gives the sparse product
+co-occurrence matrix in CSR form. For each pair A -> B:
+
+- confidence = invoices with A and B / invoices with A
+- lift = confidence / share of invoices with B (above 1: bought together more
+  often than chance)
+
+The top BASKET_TOP_K neighbours of each product (lift above 1, at least
+BASKET_MIN_PAIR_COUNT shared invoices, best confidence first) are stored in
+`product_neighbors`. The API serves suggestions from an in-memory copy of that
+collection, reloaded after each job run.
+"""
+
+import asyncio
+import csv
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.config import BASKET_HISTORY_DAYS, BASKET_INTERVAL_HOURS, BASKET_MIN_PAIR_COUNT, BASKET_TOP_K
+from app.core.versions import versions
+from app.database.connection import db
+from app.products.barcode_index import barcode_index
+
+# Larger invoices (bulk purchases) say little about affinity and cost k^2 pairs
+BASKET_MAX_ITEMS = 50
+BASKET_BATCH_SIZE = 1000
+PAIRS_CSV_HEADERS = ["product_id", "neighbor_id", "invoices", "confidence", "lift"]
+
+
+def basket_matrix(invoice_index: np.ndarray, product_index: np.ndarray, n_products: int):
+    """CSR incidence matrix (indptr, indices) of invoices x products, one entry per distinct pair."""
+    keys = np.unique(invoice_index.astype(np.int64) * n_products + product_index)
+    rows, indices = np.divmod(keys, n_products)
+    n_invoices = int(rows.max()) + 1 if rows.size else 0
+    indptr = np.zeros(n_invoices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_invoices), out=indptr[1:])
+    return indptr, indices
+
+
+def cooccurrence(indptr: np.ndarray, indices: np.ndarray, n_products: int, max_items: int = BASKET_MAX_ITEMS):
+    """Sparse co-occurrence counts in CSR form (indptr, indices, counts) plus invoices per product."""
+    lengths = np.diff(indptr)
+    kept = (lengths >= 2) & (lengths <= max_items)
+    product_counts = np.bincount(indices, minlength=n_products)
+
+    # Every entry of a kept invoice is paired with every entry of the same invoice
+    entry_rows = np.repeat(np.arange(lengths.size), lengths)
+    entry_kept = kept[entry_rows]
+    entries = indices[entry_kept]
+    entry_rows = entry_rows[entry_kept]
+    repeats = lengths[entry_rows]
+    left = np.repeat(entries, repeats)
+    starts = np.repeat(indptr[entry_rows], repeats)
+    offsets = np.arange(left.size) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    right = indices[starts + offsets]
+
+    distinct = left != right
+    keys, counts = np.unique(left[distinct] * n_products + right[distinct], return_counts=True)
+    rows, columns = np.divmod(keys, n_products)
+    co_indptr = np.zeros(n_products + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_products), out=co_indptr[1:])
+    return co_indptr, columns, counts, product_counts
+
+
+def top_neighbors(co_indptr, columns, counts, product_counts, n_invoices: int,
+                  top_k: int = BASKET_TOP_K, min_count: int = BASKET_MIN_PAIR_COUNT) -> dict:
+    """Confidence and lift of every pair, reduced to the top `top_k` neighbours per product."""
+    rows = np.repeat(np.arange(co_indptr.size - 1), np.diff(co_indptr))
+    confidence = counts / product_counts[rows]
+    lift = confidence * n_invoices / product_counts[columns]
+
+    keep = (counts >= min_count) & (lift > 1)
+    rows, columns, counts, confidence, lift = rows[keep], columns[keep], counts[keep], confidence[keep], lift[keep]
+    # Per product, best confidence first (ties by lift); then cut each product's run at top_k
+    order = np.lexsort((-lift, -confidence, rows))
+    rows, columns, counts, confidence, lift = rows[order], columns[order], counts[order], confidence[order], lift[order]
+    run_starts = np.searchsorted(rows, rows, side="left")
+    keep = np.arange(rows.size) - run_starts < top_k
+    return {
+        "rows": rows[keep], "columns": columns[keep], "counts": counts[keep],
+        "confidence": confidence[keep], "lift": lift[keep],
+    }
+
+
+def run_basket_analysis(sync_db, output_path: str, history_days: int = BASKET_HISTORY_DAYS) -> dict:
+    """Recompute and store the neighbours of every product (pymongo). Runs in a job worker."""
+    since = (datetime.utcnow() - timedelta(days=history_days)).date().isoformat()
+    invoices: Dict[str, int] = {}
+    products: Dict[str, int] = {}
+    invoice_index: List[int] = []
+    product_index: List[int] = []
+    cursor = sync_db.invoice_items.find(
+        {"day": {"$gte": since}}, {"_id": 0, "invoice_id": 1, "product_id": 1}
+    ).batch_size(BASKET_BATCH_SIZE)
+    for item in cursor:
+        invoice_index.append(invoices.setdefault(item["invoice_id"], len(invoices)))
+        product_index.append(products.setdefault(item["product_id"], len(products)))
+
+    product_ids = list(products)
+    indptr, indices = basket_matrix(np.array(invoice_index, dtype=np.int64),
+                                    np.array(product_index, dtype=np.int64), len(product_ids))
+    co_indptr, columns, counts, product_counts = cooccurrence(indptr, indices, len(product_ids))
+    top = top_neighbors(co_indptr, columns, counts, product_counts, len(invoices))
+
+    computed_at = datetime.utcnow()
+    docs: Dict[str, dict] = {}
+    with open(output_path, "w", newline="", encoding="utf-8") as output:
+        writer = csv.writer(output)
+        writer.writerow(PAIRS_CSV_HEADERS)
+        for row, column, count, confidence, lift in zip(
+            top["rows"].tolist(), top["columns"].tolist(), top["counts"].tolist(),
+            top["confidence"].tolist(), top["lift"].tolist()
+        ):
+            product_id, neighbor_id = product_ids[row], product_ids[column]
+            doc = docs.setdefault(product_id, {"_id": product_id, "neighbors": [], "computed_at": computed_at})
+            doc["neighbors"].append({
+                "product_id": neighbor_id,
+                "invoices": count,
+                "confidence": round(confidence, 4),
+                "lift": round(lift, 3),
+            })
+            writer.writerow([product_id, neighbor_id, count, round(confidence, 4), round(lift, 3)])
+
+    # Build the new table aside and swap it in, so readers never see a partial one
+    staging = sync_db["product_neighbors_staging"]
+    staging.drop()
+    if docs:
+        staging.insert_many(list(docs.values()), ordered=False)
+        staging.rename("product_neighbors", dropTarget=True)
+    else:
+        sync_db.product_neighbors.drop()
+
+    return {
+        "invoices": len(invoices),
+        "products": len(product_ids),
+        "pairs": int(counts.size),
+        "products_with_neighbors": len(docs),
+    }
+
+
+async def submit_basket_analysis_if_due():
+    """Submit the `basket_analysis` job when `product_neighbors` is empty or stale."""
+    from app.jobs.service import JobService
+    latest = await db.product_neighbors.find_one({}, {"computed_at": 1}, sort=[("computed_at", -1)])
+    last_run_at = latest["computed_at"] if latest else None
+    await JobService.submit_if_due("basket_analysis", last_run_at, timedelta(hours=BASKET_INTERVAL_HOURS))
+
+
+class SuggestionTable:
+    """In-memory copy of `product_neighbors`, reloaded when a basket job has finished."""
+
+    def __init__(self):
+        self._neighbors: Dict[str, List[dict]] = {}
+        self._version: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        neighbors = {doc["_id"]: doc["neighbors"] async for doc in db.product_neighbors.find({})}
+        self._neighbors = neighbors
+        print(f"✅ Suggestion table loaded for {len(neighbors)} products")
+
+    async def refresh(self):
+        """Reload the table if a basket job has finished since it was loaded."""
+        version = versions.get("product_neighbors")
+        if self._version == version:
+            return
+        async with self._lock:
+            if self._version != version:
+                await self.load()
+                self._version = version
+
+    async def suggest(self, product_ids: Iterable[str], limit: int = 5) -> List[dict]:
+        """Products to offer with a cart: neighbours of its products ranked by combined confidence.
+
+        Products already in the cart and products no longer active are left out.
+        """
+        await self.refresh()
+        cart = set(product_ids)
+        scores: Dict[str, dict] = {}
+        for product_id in cart:
+            for neighbor in self._neighbors.get(product_id, ()):
+                if neighbor["product_id"] in cart:
+                    continue
+                score = scores.setdefault(neighbor["product_id"], {"score": 0.0, "lift": 0.0, "because_of": []})
+                score["score"] += neighbor["confidence"]
+                score["lift"] = max(score["lift"], neighbor["lift"])
+                score["because_of"].append(product_id)
+
+        suggestions = []
+        for neighbor_id, score in sorted(scores.items(), key=lambda item: (-item[1]["score"], -item[1]["lift"])):
+            product = barcode_index.product(neighbor_id)
+            if product is None:
+                continue
+            suggestions.append({
+                "product_id": neighbor_id,
+                "code": product.get("product_id"),
+                "name": product.get("name", ""),
+                "price": product.get("selling_price") or product.get("price"),
+                "quantity": product.get("quantity", 0),
+                "score": round(score["score"], 4),
+                "lift": score["lift"],
+                "because_of": score["because_of"],
+            })
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+
+suggestion_table = SuggestionTable()
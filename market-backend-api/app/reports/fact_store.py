@@ -0,0 +1,439 @@
+"""
+Columnar fact store for ad-hoc sales analytics.
+
+Every invoice line is exported once to a directory of NumPy `.npy` columns (one
+file per fact, opened with `np.memmap`), so analytics run vectorized group-bys over
+local files instead of aggregations on the live `invoices` / `invoice_items`
+collections.
+
+- The `fact_store_append` job (see app.jobs) appends the items written since its
+  last run. String ids (product, category, customer, cashier) are stored as int32
+  codes into per-dimension dictionaries; -1 means none.
+- Deleting or editing an invoice records its removed items in
+  `invoice_item_reversals`. The job appends a copy of their rows with `sign` -1, so
+  the store stays append-only and every total is a signed sum.
+- Column files are preallocated and doubled as they fill; `meta.json` holds the
+  number of committed rows and is replaced only after the rows are flushed, so
+  readers never see a partial append.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from bson import ObjectId
+from numpy.lib.format import open_memmap
+
+from app.config import FACT_STORE_DIR
+from app.database.connection import db
+from app.invoices.facts import local_time
+
+FACT_COLUMNS = {
+    "source_id": "S12",   # ObjectId of the item (or reversal) the row came from
+    "timestamp": "int64",  # sale instant, UTC seconds
+    "day": "int32",        # store-local day, date.toordinal()
+    "hour": "int8",        # store-local hour
+    "product": "int32",
+    "category": "int32",
+    "customer": "int32",
+    "cashier": "int32",
+    "quantity": "float64",
+    "price": "float64",    # unit list price
+    "cost": "float64",     # unit cost, NaN when unknown
+    "discount": "float64",  # the line's share of the invoice discount
+    "sign": "int8",        # 1, or -1 for a reversed line
+}
+FACT_DIMENSIONS = ("product", "category", "customer", "cashier")
+FACT_MIN_CAPACITY = 65536
+FACT_BATCH_SIZE = 5000
+# Items are read again from this long before the newest exported one; duplicates are dropped
+FACT_OVERLAP = timedelta(minutes=5)
+
+ITEM_PROJECTION = {
+    "invoice_id": 1, "product_id": 1, "category_id": 1, "cashier_id": 1, "quantity": 1,
+    "price": 1, "cost": 1, "revenue": 1, "created_at": 1,
+}
+
+
+class FactStore:
+    """The column files of one fact store directory."""
+
+    def __init__(self, directory: str = FACT_STORE_DIR):
+        self.directory = directory
+        self.meta = self._read_json("meta.json") or {
+            "rows": 0, "capacity": 0, "item_watermark": None, "reversal_watermark": None, "updated_at": None
+        }
+        self.dictionaries: Dict[str, List[str]] = self._read_json("dictionaries.json") or {
+            dimension: [] for dimension in FACT_DIMENSIONS
+        }
+        self._codes = {
+            dimension: {value: code for code, value in enumerate(values)}
+            for dimension, values in self.dictionaries.items()
+        }
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_json(self, name: str) -> Optional[dict]:
+        try:
+            with open(self._path(name), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_json(self, name: str, data: dict):
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._path(name))
+
+    # Reading
+
+    def column(self, name: str) -> np.ndarray:
+        """The committed rows of a column, memory-mapped read-only."""
+        if not self.rows:
+            return np.empty(0, dtype=FACT_COLUMNS[name])
+        return np.load(self._path(f"{name}.npy"), mmap_mode="r")[:self.rows]
+
+    def code(self, dimension: str, value: Optional[str]) -> Optional[int]:
+        """The code of an id in a dimension's dictionary, or None if it never occurs."""
+        return self._codes[dimension].get(value)
+
+    def decode(self, dimension: str, codes: np.ndarray) -> List[Optional[str]]:
+        values = self.dictionaries[dimension]
+        return [values[code] if code >= 0 else None for code in codes.tolist()]
+
+    # Writing (single writer: the fact_store_append job)
+
+    def encode(self, dimension: str, values: Iterable[Optional[str]]) -> np.ndarray:
+        """Codes of ids in a dimension, adding new ids to its dictionary."""
+        codes = self._codes[dimension]
+        dictionary = self.dictionaries[dimension]
+        encoded = []
+        for value in values:
+            if value is None:
+                encoded.append(-1)
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(dictionary)
+                dictionary.append(value)
+            encoded.append(code)
+        return np.array(encoded, dtype=np.int32)
+
+    def _reserve(self, rows: int):
+        """Grow every column file to hold at least `rows` rows."""
+        if rows <= self.meta["capacity"]:
+            return
+        capacity = max(FACT_MIN_CAPACITY, self.meta["capacity"] * 2, rows)
+        os.makedirs(self.directory, exist_ok=True)
+        for name, dtype in FACT_COLUMNS.items():
+            tmp = self._path(f"{name}.npy.tmp")
+            grown = open_memmap(tmp, mode="w+", dtype=dtype, shape=(capacity,))
+            if self.rows:
+                grown[:self.rows] = np.load(self._path(f"{name}.npy"), mmap_mode="r")[:self.rows]
+            grown.flush()
+            del grown
+            os.replace(tmp, self._path(f"{name}.npy"))
+        self.meta["capacity"] = capacity
+
+    def append(self, columns: Dict[str, np.ndarray]) -> int:
+        """Append rows (a dict of equal-length arrays, one per column) and commit them."""
+        count = len(columns["source_id"])
+        if not count:
+            return 0
+        start = self.rows
+        self._reserve(start + count)
+        for name in FACT_COLUMNS:
+            column = open_memmap(self._path(f"{name}.npy"), mode="r+")
+            column[start:start + count] = columns[name]
+            column.flush()
+            del column
+        self._write_json("dictionaries.json", self.dictionaries)
+        self.meta["rows"] = start + count
+        self.commit()
+        return count
+
+    def commit(self):
+        self.meta["updated_at"] = datetime.utcnow().isoformat()
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_json("meta.json", self.meta)
+
+
+def _source_ids(oids: List[ObjectId]) -> np.ndarray:
+    return np.array([oid.binary for oid in oids], dtype="S12")
+
+
+def _cutoff(watermark: Optional[str]) -> Optional[ObjectId]:
+    """The id a run reads from: FACT_OVERLAP before the newest exported one."""
+    if not watermark:
+        return None
+    return ObjectId.from_datetime(ObjectId(watermark).generation_time - FACT_OVERLAP)
+
+
+def _since(watermark: Optional[str]) -> dict:
+    cutoff = _cutoff(watermark)
+    return {"_id": {"$gt": cutoff}} if cutoff else {}
+
+
+def _recent_ids(store: FactStore, cutoff: Optional[ObjectId], sign: int) -> np.ndarray:
+    """Source ids of one stream's rows inside the overlap window, the only ones a run can read again.
+
+    Each stream is appended in `_id` order, so the store is read back from its end in
+    blocks until a block holds a row of the stream from before the window.
+    """
+    if cutoff is None or not store.rows:
+        return np.empty(0, dtype="S12")
+    since = np.array(cutoff.binary, dtype="S12")
+    source_ids, signs = store.column("source_id"), store.column("sign")
+    found = []
+    end = store.rows
+    while end > 0:
+        start = max(0, end - FACT_BATCH_SIZE)
+        block = source_ids[start:end][signs[start:end] == sign]
+        recent = block[block > since]
+        found.append(np.array(recent))
+        if recent.size < block.size:
+            break
+        end = start
+    return np.concatenate(found)
+
+
+def _item_rows(sync_db, store: FactStore, items: List[dict]) -> Dict[str, np.ndarray]:
+    """Fact columns of a batch of invoice items."""
+    invoice_ids = {item["invoice_id"] for item in items if ObjectId.is_valid(item.get("invoice_id"))}
+    customers = {
+        str(doc["_id"]): doc.get("customer_id") for doc in sync_db.invoices.find(
+            {"_id": {"$in": [ObjectId(i) for i in invoice_ids]}}, {"customer_id": 1}
+        )
+    }
+    # Items sold before unit costs were captured use the product's current buying price
+    uncosted = {item["product_id"] for item in items if item.get("cost") is None and ObjectId.is_valid(item["product_id"])}
+    buying_prices = {
+        str(doc["_id"]): doc.get("buying_price") for doc in sync_db.products.find(
+            {"_id": {"$in": [ObjectId(p) for p in uncosted]}}, {"buying_price": 1}
+        )
+    } if uncosted else {}
+
+    local = [local_time(item["created_at"]) for item in items]
+    quantity = np.array([item["quantity"] for item in items], dtype=np.float64)
+    price = np.array([item["price"] for item in items], dtype=np.float64)
+    revenue = np.array([item.get("revenue", item["price"] * item["quantity"]) for item in items], dtype=np.float64)
+    cost = [item.get("cost") if item.get("cost") is not None else buying_prices.get(item["product_id"]) for item in items]
+    return {
+        "source_id": _source_ids([item["_id"] for item in items]),
+        "timestamp": np.array([int(moment.timestamp()) for moment in local], dtype=np.int64),
+        "day": np.array([moment.date().toordinal() for moment in local], dtype=np.int32),
+        "hour": np.array([moment.hour for moment in local], dtype=np.int8),
+        "product": store.encode("product", [item["product_id"] for item in items]),
+        "category": store.encode("category", [item.get("category_id") for item in items]),
+        "customer": store.encode("customer", [customers.get(item["invoice_id"]) for item in items]),
+        "cashier": store.encode("cashier", [item.get("cashier_id") for item in items]),
+        "quantity": quantity,
+        "price": price,
+        "cost": np.array([np.nan if c is None else c for c in cost], dtype=np.float64),
+        "discount": np.round(price * quantity - revenue, 2),
+        "sign": np.ones(len(items), dtype=np.int8),
+    }
+
+
+def _reversal_rows(store: FactStore, reversals: List[dict]) -> Dict[str, np.ndarray]:
+    """Copies of the exported rows of reversed items, with sign -1."""
+    reversed_ids = _source_ids([reversal["item_id"] for reversal in reversals])
+    source_ids = store.column("source_id")
+    rows = np.flatnonzero(np.isin(source_ids, reversed_ids) & (store.column("sign") > 0))
+    # Items created and removed between two runs were never exported: nothing to cancel
+    by_item = dict(zip(source_ids[rows].tolist(), rows.tolist()))
+    found = [(reversal["_id"], by_item[item_id]) for reversal, item_id in zip(reversals, reversed_ids.tolist())
+             if item_id in by_item]
+    index = np.array([row for _, row in found], dtype=np.int64)
+    columns = {name: np.array(store.column(name)[index]) for name in FACT_COLUMNS}
+    columns["source_id"] = _source_ids([reversal_id for reversal_id, _ in found])
+    columns["sign"] = np.full(len(found), -1, dtype=np.int8)
+    return columns
+
+
+def _append_batches(store: FactStore, cursor, to_rows, watermark_key: str, sign: int) -> int:
+    appended = 0
+    batch: List[dict] = []
+    # Rows read again because of the overlap are dropped
+    exported = _recent_ids(store, _cutoff(store.meta[watermark_key]), sign)
+
+    def flush(docs: List[dict]) -> int:
+        columns = to_rows(docs)
+        fresh = ~np.isin(columns["source_id"], exported)
+        count = store.append({name: values[fresh] for name, values in columns.items()})
+        store.meta[watermark_key] = str(docs[-1]["_id"])
+        store.commit()
+        return count
+
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= FACT_BATCH_SIZE:
+            appended += flush(batch)
+            batch = []
+    if batch:
+        appended += flush(batch)
+    return appended
+
+
+def append_facts(sync_db, directory: str = FACT_STORE_DIR, rebuild: bool = False) -> dict:
+    """Append the invoice items and reversals written since the last run (pymongo)."""
+    if rebuild:
+        shutil.rmtree(directory, ignore_errors=True)
+    store = FactStore(directory)
+
+    items = sync_db.invoice_items.find(
+        {**_since(store.meta["item_watermark"]), "created_at": {"$exists": True}}, ITEM_PROJECTION
+    ).sort("_id", 1).batch_size(FACT_BATCH_SIZE)
+    appended = _append_batches(
+        store, items, lambda docs: _item_rows(sync_db, store, docs), "item_watermark", 1
+    )
+
+    reversals = sync_db.invoice_item_reversals.find(
+        _since(store.meta["reversal_watermark"])
+    ).sort("_id", 1).batch_size(FACT_BATCH_SIZE)
+    reversed_rows = _append_batches(
+        store, reversals, lambda docs: _reversal_rows(store, docs), "reversal_watermark", -1
+    )
+
+    return {
+        "appended": appended,
+        "reversed": reversed_rows,
+        "rows": store.rows,
+        "products": len(store.dictionaries["product"]),
+        "customers": len(store.dictionaries["customer"]),
+        "size_bytes": store.meta["capacity"] * sum(np.dtype(dtype).itemsize for dtype in FACT_COLUMNS.values()),
+    }
+
+
+def group_facts(
+    store: FactStore,
+    group_by: List[str],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    filters: Optional[Dict[str, str]] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Signed totals per group, highest revenue first, in one vectorized pass.
+
+    `group_by` takes day, weekday (0=Monday), hour and the dimensions; `filters`
+    maps dimensions to one id each.
+    """
+    mask = np.ones(store.rows, dtype=bool)
+    if start or end:
+        day = store.column("day")
+        if start:
+            mask &= day >= start.toordinal()
+        if end:
+            mask &= day <= end.toordinal()
+    for dimension, value in (filters or {}).items():
+        code = store.code(dimension, value)
+        if code is None:
+            return []
+        mask &= store.column(dimension) == code
+    rows = np.flatnonzero(mask)
+
+    keys = []
+    for name in group_by:
+        if name == "weekday":
+            keys.append((store.column("day")[rows].astype(np.int64) - 1) % 7)
+        else:
+            keys.append(store.column(name)[rows].astype(np.int64))
+    if keys:
+        groups, inverse = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    else:
+        groups, inverse = np.empty((1, 0), dtype=np.int64), np.zeros(rows.size, dtype=np.int64)
+    size = len(groups) if rows.size else 0
+
+    sign = store.column("sign")[rows].astype(np.float64)
+    quantity = store.column("quantity")[rows] * sign
+    price = store.column("price")[rows]
+    discount = store.column("discount")[rows] * sign
+    revenue = price * quantity - discount
+    cost = np.nan_to_num(store.column("cost")[rows]) * quantity
+    totals = {
+        "lines": np.bincount(inverse, weights=sign, minlength=size),
+        "units": np.bincount(inverse, weights=quantity, minlength=size),
+        "revenue": np.bincount(inverse, weights=revenue, minlength=size),
+        "discount": np.bincount(inverse, weights=discount, minlength=size),
+        "cost": np.bincount(inverse, weights=cost, minlength=size),
+    }
+    # Groups whose lines were all reversed drop out
+    live = np.flatnonzero(totals["lines"] != 0)
+    order = live[np.argsort(-totals["revenue"][live], kind="stable")][:limit]
+
+    labels = {}
+    for position, name in enumerate(group_by):
+        values = groups[order, position]
+        if name == "day":
+            labels[name] = [date.fromordinal(value).isoformat() for value in values.tolist()]
+        elif name in FACT_DIMENSIONS:
+            labels[name] = store.decode(name, values)
+        else:
+            labels[name] = values.tolist()
+
+    result = []
+    for i, group in enumerate(order.tolist()):
+        revenue_total = round(float(totals["revenue"][group]), 2)
+        cost_total = round(float(totals["cost"][group]), 2)
+        result.append({
+            "key": {name: labels[name][i] for name in group_by},
+            "lines": int(totals["lines"][group]),
+            "units": round(float(totals["units"][group]), 3),
+            "revenue": revenue_total,
+            "discount": round(float(totals["discount"][group]), 2),
+            "cost": cost_total,
+            "gross_profit": round(revenue_total - cost_total, 2),
+        })
+    return result
+
+
+_reader: Optional[FactStore] = None
+_reader_mtime: Optional[int] = None
+
+
+def open_store() -> FactStore:
+    """The fact store as last committed, reusing the loaded dictionaries while unchanged."""
+    global _reader, _reader_mtime
+    try:
+        mtime = os.stat(os.path.join(FACT_STORE_DIR, "meta.json")).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if _reader is None or mtime != _reader_mtime:
+        _reader, _reader_mtime = FactStore(), mtime
+    return _reader
+
+
+class FactStoreService:
+    """Fact store reads for the API and reversal records for the invoice write paths."""
+
+    @staticmethod
+    async def record_reversals(items: Iterable[dict]):
+        """Record invoice items that were deleted, so the next append cancels their rows."""
+        reversed_at = datetime.utcnow()
+        reversals = [{"item_id": item["_id"], "reversed_at": reversed_at} for item in items if item.get("_id")]
+        if reversals:
+            await db.invoice_item_reversals.insert_many(reversals)
+
+    @staticmethod
+    async def query(group_by: List[str], start: Optional[date], end: Optional[date],
+                    filters: Dict[str, str], limit: int) -> dict:
+        """Group-by over the fact store files, run off the event loop."""
+        def run():
+            store = open_store()
+            return {
+                "rows": group_facts(store, group_by, start, end, filters, limit),
+                "fact_rows": store.rows,
+                "as_of": store.meta["updated_at"],
+            }
+        return await asyncio.to_thread(run)
@@ -0,0 +1,294 @@
+"""
+Demand forecast and reorder points.
+
+The `demand_forecast` job (see app.jobs) loads the units sold per day of every active
+product over the last FORECAST_HISTORY_DAYS closed days from the sales rollup into
+one products x days NumPy matrix, and computes for the whole catalog at once:
+
+- 7- and 28-day moving averages of daily demand; their mean is the demand level
+  (both windows are whole weeks, so the level is free of weekday effects);
+- weekday factors: each product's demand per weekday relative to its mean, shrunk
+  toward the store-wide weekday profile when the product sold only a few units;
+- the expected demand over the supplier lead time and over the order cycle;
+- safety stock, reorder point, order-up-to level and days of cover.
+
+The results are stored in each product's `forecast` field. A product needs
+reordering once its live quantity is at or below its reorder point; the suggested
+order brings it back up to the order-up-to level.
+"""
+
+import math
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.config import (
+    FORECAST_HISTORY_DAYS, FORECAST_INTERVAL_HOURS, REORDER_CYCLE_DAYS, REORDER_LEAD_TIME_DAYS, REORDER_SERVICE_Z
+)
+from app.core.excel import append_totals_row, new_write_only_sheet
+from app.alerts.service import AlertService
+from app.database.connection import db
+from app.products.barcode_index import barcode_index
+
+# Units a product must sell before its own weekday profile outweighs the store's
+SEASONAL_PRIOR_UNITS = 28.0
+FORECAST_BATCH_SIZE = 1000
+
+# Products at or below their reorder point
+PURCHASE_ORDER_QUERY = {
+    "is_active": True,
+    "forecast.reorder_point": {"$gt": 0},
+    "$expr": {"$lte": ["$quantity", "$forecast.reorder_point"]},
+}
+PURCHASE_ORDER_PROJECTION = {
+    "name": 1, "product_id": 1, "category_id": 1, "quantity": 1, "buying_price": 1, "forecast": 1
+}
+
+# Suggested purchase order layout
+PURCHASE_ORDER_HEADERS = [
+    "ID المنتج",
+    "اسم المنتج",
+    "الكمية الحالية",
+    "الطلب اليومي",
+    "أيام التغطية",
+    "نقطة إعادة الطلب",
+    "الكمية المقترحة",
+    "سعر الشراء",
+    "التكلفة التقديرية"
+]
+PURCHASE_ORDER_COLUMN_WIDTHS = [28, 30, 14, 12, 12, 16, 16, 12, 16]
+
+
+def forecast_days(today: date, history_days: int = FORECAST_HISTORY_DAYS) -> List[date]:
+    """The closed days the forecast learns from, oldest first (whole weeks)."""
+    history_days = max(28, history_days - history_days % 7)
+    return [today - timedelta(days=history_days - n) for n in range(history_days)]
+
+
+def weekdays(start: date, count: int) -> np.ndarray:
+    """The weekday (0=Monday) of `count` consecutive days from `start`."""
+    return np.array([(start + timedelta(days=n)).weekday() for n in range(count)], dtype=np.intp)
+
+
+def demand_matrix(sync_db, product_ids: List[str], days: List[date]) -> np.ndarray:
+    """Units sold per product (rows) and day (columns), from the sales rollup."""
+    rows = {product_id: i for i, product_id in enumerate(product_ids)}
+    columns = {day.isoformat(): j for j, day in enumerate(days)}
+    row_index, column_index, units = [], [], []
+    cursor = sync_db.sales_daily.find(
+        {"day": {"$gte": days[0].isoformat(), "$lte": days[-1].isoformat()}},
+        {"_id": 0, "product_id": 1, "day": 1, "units": 1},
+    ).batch_size(FORECAST_BATCH_SIZE)
+    for doc in cursor:
+        row = rows.get(doc["product_id"])
+        if row is not None and doc.get("units"):
+            row_index.append(row)
+            column_index.append(columns[doc["day"]])
+            units.append(doc["units"])
+
+    matrix = np.zeros((len(product_ids), len(days)), dtype=np.float64)
+    np.add.at(matrix, (np.array(row_index, dtype=np.intp), np.array(column_index, dtype=np.intp)), units)
+    return matrix
+
+
+def compute_forecast(
+    matrix: np.ndarray,
+    history_weekdays: np.ndarray,
+    quantities: np.ndarray,
+    lead_weekdays: np.ndarray,
+    cycle_weekdays: np.ndarray,
+    service_z: float = REORDER_SERVICE_Z,
+) -> dict:
+    """Forecast figures for every product (row of `matrix`) in one vectorized pass.
+
+    `*_weekdays` hold the weekday (0=Monday) of each history column and of each
+    future day of the lead time / of the lead time plus the order cycle.
+    """
+    ma_7 = matrix[:, -7:].mean(axis=1)
+    ma_28 = matrix[:, -28:].mean(axis=1)
+    level = (ma_7 + ma_28) / 2
+
+    # Mean demand per weekday relative to the mean over all days
+    one_hot = np.eye(7)[history_weekdays]
+    weekday_days = np.maximum(one_hot.sum(axis=0), 1)
+    product_mean = matrix.mean(axis=1)
+    product_profile = np.divide(
+        matrix @ one_hot / weekday_days, product_mean[:, None],
+        out=np.ones((matrix.shape[0], 7)), where=product_mean[:, None] > 0,
+    )
+    store_daily = matrix.sum(axis=0)
+    store_mean = store_daily.mean() if store_daily.size else 0.0
+    store_profile = store_daily @ one_hot / weekday_days / store_mean if store_mean > 0 else np.ones(7)
+    units = matrix.sum(axis=1)
+    weight = (units / (units + SEASONAL_PRIOR_UNITS))[:, None]
+    factors = weight * product_profile + (1 - weight) * store_profile
+
+    lead_demand = level * factors[:, lead_weekdays].sum(axis=1)
+    cycle_demand = level * factors[:, cycle_weekdays].sum(axis=1)
+    spread = matrix[:, -28:].std(axis=1, ddof=1) if matrix.shape[1] > 1 else np.zeros(matrix.shape[0])
+    safety_stock = service_z * spread * math.sqrt(len(lead_weekdays))
+
+    days_of_cover = np.divide(
+        quantities, level, out=np.full(matrix.shape[0], np.inf), where=level > 0
+    )
+    return {
+        "ma_7": ma_7,
+        "ma_28": ma_28,
+        "daily_demand": level,
+        "weekday_factors": factors,
+        "lead_time_demand": lead_demand,
+        "safety_stock": safety_stock,
+        "reorder_point": np.ceil(lead_demand + safety_stock),
+        "order_up_to": np.ceil(cycle_demand + safety_stock),
+        "days_of_cover": days_of_cover,
+    }
+
+
+def _round(value: float, digits: int = 2) -> Optional[float]:
+    return round(float(value), digits) if math.isfinite(value) else None
+
+
+def run_forecast(sync_db, today: date) -> dict:
+    """Recompute and store the forecast of every active product (pymongo). Runs in a job worker."""
+    products = list(sync_db.products.find({"is_active": True}, {"quantity": 1}).batch_size(FORECAST_BATCH_SIZE))
+    product_ids = [str(product["_id"]) for product in products]
+    days = forecast_days(today)
+    matrix = demand_matrix(sync_db, product_ids, days)
+    quantities = np.array([max(product.get("quantity", 0), 0) for product in products], dtype=np.float64)
+
+    # Weekdays of the history columns and of the days from today on
+    result = compute_forecast(
+        matrix,
+        weekdays(days[0], len(days)),
+        quantities,
+        weekdays(today, REORDER_LEAD_TIME_DAYS),
+        weekdays(today, REORDER_LEAD_TIME_DAYS + REORDER_CYCLE_DAYS),
+    )
+
+    computed_at = datetime.utcnow()
+    operations = []
+    for i, product in enumerate(products):
+        operations.append(UpdateOne({"_id": product["_id"]}, {"$set": {"forecast": {
+            "daily_demand": _round(result["daily_demand"][i], 3),
+            "ma_7": _round(result["ma_7"][i], 3),
+            "ma_28": _round(result["ma_28"][i], 3),
+            # Monday first, like date.weekday()
+            "weekday_factors": [_round(f, 3) for f in result["weekday_factors"][i]],
+            "lead_time_demand": _round(result["lead_time_demand"][i]),
+            "safety_stock": _round(result["safety_stock"][i]),
+            "reorder_point": int(result["reorder_point"][i]),
+            "order_up_to": int(result["order_up_to"][i]),
+            "days_of_cover": _round(result["days_of_cover"][i], 1),
+            "computed_at": computed_at,
+        }}}))
+        if len(operations) >= FORECAST_BATCH_SIZE:
+            sync_db.products.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        sync_db.products.bulk_write(operations, ordered=False)
+
+    return {
+        "products": len(products),
+        "history_days": len(days),
+        "units": int(matrix.sum()),
+        "below_reorder_point": int((quantities <= result["reorder_point"])[result["reorder_point"] > 0].sum()),
+    }
+
+
+def purchase_order_line(product: dict) -> Optional[dict]:
+    """The suggested order of a product at or below its reorder point, or None."""
+    forecast = product.get("forecast") or {}
+    quantity = product.get("quantity", 0)
+    suggested = max(forecast.get("order_up_to", 0) - max(quantity, 0), 0)
+    if not suggested:
+        return None
+    daily_demand = forecast.get("daily_demand") or 0
+    buying_price = product.get("buying_price") or 0
+    return {
+        "product_id": str(product["_id"]),
+        "name": product.get("name", ""),
+        "code": product.get("product_id"),
+        "category_id": str(product["category_id"]) if product.get("category_id") else None,
+        "quantity": quantity,
+        "daily_demand": daily_demand,
+        "days_of_cover": round(max(quantity, 0) / daily_demand, 1) if daily_demand > 0 else None,
+        "reorder_point": forecast["reorder_point"],
+        "suggested_quantity": suggested,
+        "buying_price": buying_price,
+        "estimated_cost": round(suggested * buying_price, 2),
+        "forecast_at": forecast.get("computed_at"),
+    }
+
+
+def sort_purchase_order(lines: List[dict]) -> List[dict]:
+    """Most urgent first: the fewest days of cover left."""
+    return sorted(lines, key=lambda line: (line["days_of_cover"] if line["days_of_cover"] is not None else 0,
+                                           line["product_id"]))
+
+
+def write_purchase_order_excel(lines: Iterable[dict], output) -> dict:
+    """Write the suggested purchase order. Runs inside a job worker process."""
+    wb, ws = new_write_only_sheet("أمر شراء مقترح", PURCHASE_ORDER_HEADERS, PURCHASE_ORDER_COLUMN_WIDTHS)
+    rows = 0
+    total_units = 0
+    total_cost = 0.0
+    for line in lines:
+        ws.append([
+            line.get("code") or "N/A",
+            line["name"],
+            line["quantity"],
+            line["daily_demand"],
+            line["days_of_cover"] if line["days_of_cover"] is not None else "-",
+            line["reorder_point"],
+            line["suggested_quantity"],
+            line["buying_price"] if line["buying_price"] else "غير محدد",
+            line["estimated_cost"],
+        ])
+        rows += 1
+        total_units += line["suggested_quantity"]
+        total_cost += line["estimated_cost"]
+    append_totals_row(ws, ["الإجمالي:", None, None, None, None, None, total_units, None, f"{total_cost:.2f} جنيه"])
+    wb.save(output)
+    return {"order_lines": rows, "order_units": total_units, "order_cost": round(total_cost, 2)}
+
+
+class ForecastService:
+    """Suggested purchase orders from the stored forecasts."""
+
+    @staticmethod
+    async def submit_if_due():
+        """Submit the `demand_forecast` job when the stored forecasts are missing or stale."""
+        from app.jobs.service import JobService
+        latest = await db.products.find_one(
+            {"forecast.computed_at": {"$exists": True}}, {"forecast.computed_at": 1},
+            sort=[("forecast.computed_at", -1)]
+        )
+        last_run_at = latest["forecast"]["computed_at"] if latest else None
+        await JobService.submit_if_due("demand_forecast", last_run_at, timedelta(hours=FORECAST_INTERVAL_HOURS))
+
+    @staticmethod
+    async def after_run():
+        """Refresh what the API process derives from the forecasts once the job has written them."""
+        await barcode_index.refresh_forecasts()
+        # Low stock follows the reorder points (see app.alerts.service.is_low_stock)
+        await AlertService.rebuild()
+
+    @staticmethod
+    async def get_purchase_order(category_id: Optional[str] = None) -> dict:
+        """Products at or below their reorder point with the quantity to order, most urgent first."""
+        query = dict(PURCHASE_ORDER_QUERY)
+        if category_id:
+            query["category_id"] = category_id
+        lines = []
+        async for product in db.products.find(query, PURCHASE_ORDER_PROJECTION):
+            line = purchase_order_line(product)
+            if line:
+                lines.append(line)
+        lines = sort_purchase_order(lines)
+        return {
+            "lines": lines,
+            "total_units": sum(line["suggested_quantity"] for line in lines),
+            "total_cost": round(sum(line["estimated_cost"] for line in lines), 2),
+        }
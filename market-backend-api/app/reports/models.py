@@ -0,0 +1,30 @@
+"""
+Sales report models.
+"""
+
+from enum import Enum
+
+
+class ProfitDimension(str, Enum):
+    """What a profit report groups by."""
+    DAY = "day"
+    CATEGORY = "category"
+    PRODUCT = "product"
+    CASHIER = "cashier"
+
+
+class SalesRank(str, Enum):
+    """What best-seller reports rank products by."""
+    UNITS = "units"
+    REVENUE = "revenue"
+
+
+class FactDimension(str, Enum):
+    """What a fact store query groups by."""
+    DAY = "day"
+    WEEKDAY = "weekday"
+    HOUR = "hour"
+    PRODUCT = "product"
+    CATEGORY = "category"
+    CUSTOMER = "customer"
+    CASHIER = "cashier"
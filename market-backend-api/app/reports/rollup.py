@@ -0,0 +1,131 @@
+"""
+Daily sales rollup.
+
+`sales_daily` holds one document per store-local day and product with the units
+sold, the net revenue and the number of invoices it appeared on. `sales_hourly`
+holds one document per store-local day with the revenue and invoice count of each
+hour (`revenue.<hour>`, `invoices.<hour>`). The invoice write paths add the items
+they insert and subtract the items they remove, so sales reports read a few
+documents per product and day instead of every invoice item.
+`rebuild_sales_rollup` recomputes both collections from `invoice_items`.
+"""
+
+import asyncio
+from typing import Dict, Iterable, Tuple
+
+from pymongo import UpdateOne
+
+from app.database.connection import db
+
+
+def rollup_id(day: str, product_id: str) -> str:
+    return f"{day}:{product_id}"
+
+
+def rollup_updates(items: Iterable[dict], sign: int = 1) -> list:
+    """Upserts adding (sign=1) or removing (sign=-1) the items of one invoice."""
+    totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for item in items:
+        if not item.get("day"):
+            continue
+        total = totals.setdefault((item["day"], item["product_id"]), {"units": 0, "revenue": 0.0})
+        total["units"] += item["quantity"]
+        total["revenue"] += item.get("revenue", item["price"] * item["quantity"])
+    return [
+        UpdateOne(
+            {"_id": rollup_id(day, product_id)},
+            {
+                # Items of one invoice: the product appeared on one invoice that day
+                "$inc": {"units": sign * total["units"], "revenue": sign * total["revenue"], "invoices": sign},
+                "$setOnInsert": {"day": day, "product_id": product_id},
+            },
+            upsert=True,
+        )
+        for (day, product_id), total in totals.items()
+    ]
+
+
+def hourly_updates(items: Iterable[dict], sign: int = 1) -> list:
+    """Upserts adding (sign=1) or removing (sign=-1) the items of one invoice to its hour."""
+    totals: Dict[Tuple[str, int], float] = {}
+    for item in items:
+        if not item.get("day") or item.get("hour") is None:
+            continue
+        key = (item["day"], item["hour"])
+        totals[key] = totals.get(key, 0.0) + item.get("revenue", item["price"] * item["quantity"])
+    return [
+        UpdateOne(
+            {"_id": day},
+            {"$inc": {f"revenue.{hour}": sign * revenue, f"invoices.{hour}": sign}},
+            upsert=True,
+        )
+        for (day, hour), revenue in totals.items()
+    ]
+
+
+def rebuild_sales_rollup(sync_db) -> int:
+    """Recompute `sales_daily` and `sales_hourly` from the invoice items (pymongo).
+
+    Returns the number of product-day rows.
+    """
+    sync_db.invoice_items.aggregate([
+        {"$match": {"day": {"$exists": True}}},
+        {"$group": {
+            "_id": {"day": "$day", "product_id": "$product_id", "invoice_id": "$invoice_id"},
+            "units": {"$sum": "$quantity"},
+            "revenue": {"$sum": {"$ifNull": ["$revenue", {"$multiply": ["$price", "$quantity"]}]}},
+        }},
+        {"$group": {
+            "_id": {"$concat": ["$_id.day", ":", "$_id.product_id"]},
+            "day": {"$first": "$_id.day"},
+            "product_id": {"$first": "$_id.product_id"},
+            "units": {"$sum": "$units"},
+            "revenue": {"$sum": "$revenue"},
+            "invoices": {"$sum": 1},
+        }},
+        {"$out": "sales_daily"},
+    ])
+    sync_db.invoice_items.aggregate([
+        {"$match": {"day": {"$exists": True}, "hour": {"$exists": True}}},
+        {"$group": {
+            "_id": {"day": "$day", "hour": "$hour", "invoice_id": "$invoice_id"},
+            "revenue": {"$sum": {"$ifNull": ["$revenue", {"$multiply": ["$price", "$quantity"]}]}},
+        }},
+        {"$group": {
+            "_id": {"day": "$_id.day", "hour": "$_id.hour"},
+            "revenue": {"$sum": "$revenue"},
+            "invoices": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": "$_id.day",
+            "revenue": {"$push": {"k": {"$toString": "$_id.hour"}, "v": "$revenue"}},
+            "invoices": {"$push": {"k": {"$toString": "$_id.hour"}, "v": "$invoices"}},
+        }},
+        {"$project": {"revenue": {"$arrayToObject": "$revenue"}, "invoices": {"$arrayToObject": "$invoices"}}},
+        {"$out": "sales_hourly"},
+    ])
+    return sync_db.sales_daily.estimated_document_count()
+
+
+class SalesRollupService:
+    """Sales rollup maintenance."""
+
+    @staticmethod
+    async def record(items: Iterable[dict], sign: int = 1):
+        """Add (sign=1) or remove (sign=-1) the items of one invoice."""
+        items = list(items)
+        updates = rollup_updates(items, sign)
+        if updates:
+            await db.sales_daily.bulk_write(updates, ordered=False)
+        updates = hourly_updates(items, sign)
+        if updates:
+            await db.sales_hourly.bulk_write(updates, ordered=False)
+
+    @staticmethod
+    async def ensure_rollup():
+        """Build the rollup once for databases created before it existed."""
+        built = await db.sales_daily.find_one({}, {"_id": 1}) and await db.sales_hourly.find_one({}, {"_id": 1})
+        if not built and await db.invoice_items.find_one({"day": {"$exists": True}}, {"_id": 1}):
+            from app.database.sync_connection import get_sync_db
+            rows = await asyncio.to_thread(rebuild_sales_rollup, get_sync_db())
+            print(f"✅ Sales rollup rebuilt ({rows} product-days)")
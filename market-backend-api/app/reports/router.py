@@ -0,0 +1,152 @@
+"""
+Reports router: profit and margin analytics, best sellers, slow movers, dead stock,
+the suggested purchase order, "frequently bought together" suggestions, ad-hoc
+group-bys over the columnar fact store and the inventory valuation.
+"""
+
+from fastapi import APIRouter, Depends, Query
+from typing import List, Optional
+from datetime import date, timedelta
+from app.auth.dependencies import get_current_admin, get_current_staff
+from app.reports.basket import suggestion_table
+from app.reports.fact_store import FactStoreService
+from app.reports.models import FactDimension, ProfitDimension, SalesRank
+from app.reports.forecast import ForecastService
+from app.reports.schemas import (
+    DeadStockReport, FactsReport, InventoryValuation, ProfitReport, PurchaseOrder, SalesRankReport,
+    SuggestionsResponse, ValuationTrend
+)
+from app.reports.service import ProfitService, SalesReportService, store_today
+from app.reports.valuation import ValuationService
+
+router = APIRouter()
+
+
+@router.get("/profit", response_model=ProfitReport)
+async def get_profit_report(
+    by: ProfitDimension = Query(ProfitDimension.DAY, description="day, category, product or cashier"),
+    start: Optional[date] = Query(None, description="First day (store-local), default 29 days before end"),
+    end: Optional[date] = Query(None, description="Last day (store-local), default today"),
+    current_admin = Depends(get_current_admin)
+):
+    """Revenue, cost, gross profit and margin over a range of days (Admin only).
+
+    Closed days are served from stored per-day results; only today is aggregated live.
+    """
+    end = end or store_today()
+    start = start or end - timedelta(days=29)
+    return await ProfitService.get_profit_report(by, start, end)
+
+
+@router.get("/top-sellers", response_model=SalesRankReport)
+async def get_top_sellers(
+    start: Optional[date] = Query(None, description="First day (store-local), default 29 days before end"),
+    end: Optional[date] = Query(None, description="Last day (store-local), default today"),
+    limit: int = Query(10, ge=1, le=100),
+    rank_by: SalesRank = Query(SalesRank.UNITS, description="units or revenue"),
+    current_admin = Depends(get_current_admin)
+):
+    """Best-selling products over a range of days (Admin only)."""
+    end = end or store_today()
+    start = start or end - timedelta(days=29)
+    return await SalesReportService.get_top_sellers(start, end, limit, rank_by)
+
+
+@router.get("/slow-movers", response_model=SalesRankReport)
+async def get_slow_movers(
+    start: Optional[date] = Query(None, description="First day (store-local), default 29 days before end"),
+    end: Optional[date] = Query(None, description="Last day (store-local), default today"),
+    limit: int = Query(20, ge=1, le=100),
+    current_admin = Depends(get_current_admin)
+):
+    """Active products that sold, but the least, over a range of days (Admin only)."""
+    end = end or store_today()
+    start = start or end - timedelta(days=29)
+    return await SalesReportService.get_slow_movers(start, end, limit)
+
+
+@router.get("/dead-stock", response_model=DeadStockReport)
+async def get_dead_stock(
+    days: int = Query(30, ge=1, le=365, description="No sale in this many days, today included"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200),
+    current_admin = Depends(get_current_admin)
+):
+    """Active, in-stock products with no sale in the last `days` days (Admin only)."""
+    return await SalesReportService.get_dead_stock(days, skip=(page - 1) * page_size, limit=page_size)
+
+
+@router.get("/purchase-order", response_model=PurchaseOrder)
+async def get_purchase_order(
+    category_id: Optional[str] = Query(None),
+    current_admin = Depends(get_current_admin)
+):
+    """Products at or below their forecast reorder point and how many to order (Admin only).
+
+    Forecasts are recomputed by the `demand_forecast` job; its result file is the same
+    order as an Excel sheet.
+    """
+    return await ForecastService.get_purchase_order(category_id)
+
+
+@router.get("/bought-together", response_model=SuggestionsResponse)
+async def get_bought_together(
+    product_ids: List[str] = Query(..., description="Database ids of the products in the cart"),
+    limit: int = Query(5, ge=1, le=20),
+    current_staff = Depends(get_current_staff)
+):
+    """Products frequently bought with the cart's products (Admin or Cashier).
+
+    Served from memory; the pairs are recomputed by the `basket_analysis` job.
+    """
+    return {"suggestions": await suggestion_table.suggest(product_ids, limit)}
+
+
+@router.get("/facts", response_model=FactsReport)
+async def get_facts(
+    group_by: List[FactDimension] = Query([], description="day, weekday, hour, product, category, customer or cashier"),
+    start: Optional[date] = Query(None, description="First day (store-local)"),
+    end: Optional[date] = Query(None, description="Last day (store-local)"),
+    product_id: Optional[str] = Query(None),
+    category_id: Optional[str] = Query(None),
+    customer_id: Optional[str] = Query(None),
+    cashier_id: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=10000),
+    current_admin = Depends(get_current_admin)
+):
+    """Units, revenue, discount, cost and gross profit of invoice lines per group (Admin only).
+
+    Computed from the columnar fact store files, without querying MongoDB; lines
+    written since the last `fact_store_append` job run are not included yet.
+    """
+    dimensions = [dimension.value for dimension in dict.fromkeys(group_by)]
+    filters = {
+        dimension: value for dimension, value in (
+            ("product", product_id), ("category", category_id), ("customer", customer_id), ("cashier", cashier_id)
+        ) if value
+    }
+    report = await FactStoreService.query(dimensions, start, end, filters, limit)
+    return {"group_by": dimensions, **report}
+
+
+@router.get("/valuation", response_model=InventoryValuation)
+async def get_inventory_valuation(
+    exclude_inactive: bool = Query(True, description="Leave out deleted (inactive) products"),
+    exclude_expired: bool = Query(False, description="Leave out products past their expiry date"),
+    current_admin = Depends(get_current_admin)
+):
+    """Cost and retail value of the stock on hand per category and overall (Admin only)."""
+    return await ValuationService.get_valuation(exclude_inactive, exclude_expired)
+
+
+@router.get("/valuation/trend", response_model=ValuationTrend)
+async def get_valuation_trend(
+    start: Optional[date] = Query(None, description="First day (store-local), default 29 days before end"),
+    end: Optional[date] = Query(None, description="Last day (store-local), default today"),
+    category_id: Optional[str] = Query(None),
+    current_admin = Depends(get_current_admin)
+):
+    """Daily inventory valuations of the active catalog, from the stored snapshots (Admin only)."""
+    end = end or store_today()
+    start = start or end - timedelta(days=29)
+    return {"category_id": category_id, "points": await ValuationService.get_trend(start, end, category_id)}
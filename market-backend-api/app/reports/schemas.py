@@ -0,0 +1,185 @@
+"""
+Sales report Pydantic schemas.
+"""
+
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Union
+from datetime import date, datetime
+from app.reports.models import ProfitDimension, SalesRank
+
+
+class ProfitRow(BaseModel):
+    """Profit of one day, category, product or cashier."""
+    key: Optional[str] = None
+    label: str
+    units: int
+    revenue: float
+    cost: float
+    profit: float
+    margin: Optional[float] = None  # percent of revenue
+    uncosted_units: int = 0  # units sold with no known buying price (counted at zero cost)
+
+
+class ProfitTotals(BaseModel):
+    """Profit over the whole period."""
+    units: int
+    revenue: float
+    cost: float
+    profit: float
+    margin: Optional[float] = None
+    uncosted_units: int = 0
+
+
+class ProfitReport(BaseModel):
+    """Profit report response schema."""
+    by: ProfitDimension
+    start: date
+    end: date
+    rows: List[ProfitRow]
+    totals: ProfitTotals
+    cached_days: int
+
+
+class ProductSales(BaseModel):
+    """Sales of one product over a range of days."""
+    product_id: str
+    name: str
+    code: Optional[str] = None  # barcode / product code
+    quantity: int  # current stock
+    units: int
+    revenue: float
+    invoices: int
+
+
+class SalesRankReport(BaseModel):
+    """Top sellers / slow movers response schema."""
+    start: date
+    end: date
+    rank_by: SalesRank
+    rows: List[ProductSales]
+
+
+class DeadStockProduct(BaseModel):
+    """An in-stock product without recent sales."""
+    product_id: str
+    name: str
+    code: Optional[str] = None
+    quantity: int
+    buying_price: float
+    stock_value: float
+    last_sold: Optional[date] = None
+
+
+class DeadStockReport(BaseModel):
+    """Dead stock response schema."""
+    days: int
+    since: date
+    total: int
+    rows: List[DeadStockProduct]
+
+
+class PurchaseOrderLine(BaseModel):
+    """Suggested order of one product at or below its reorder point."""
+    product_id: str
+    name: str
+    code: Optional[str] = None
+    category_id: Optional[str] = None
+    quantity: int
+    daily_demand: float
+    days_of_cover: Optional[float] = None
+    reorder_point: int
+    suggested_quantity: int
+    buying_price: float
+    estimated_cost: float
+    forecast_at: Optional[datetime] = None
+
+
+class PurchaseOrder(BaseModel):
+    """Suggested purchase order response schema."""
+    lines: List[PurchaseOrderLine]
+    total_units: int
+    total_cost: float
+
+
+class Suggestion(BaseModel):
+    """A product frequently bought together with the cart."""
+    product_id: str
+    code: Optional[str] = None
+    name: str
+    price: Optional[float] = None
+    quantity: int
+    score: float
+    lift: float
+    because_of: List[str]
+
+
+class SuggestionsResponse(BaseModel):
+    """Bought-together suggestions response schema."""
+    suggestions: List[Suggestion]
+
+
+class FactGroup(BaseModel):
+    """Totals of one group of invoice lines from the fact store."""
+    key: Dict[str, Union[str, int, None]]
+    lines: int
+    units: float
+    revenue: float
+    discount: float
+    cost: float
+    gross_profit: float
+
+
+class FactsReport(BaseModel):
+    """Fact store query response schema."""
+    group_by: List[str]
+    rows: List[FactGroup]
+    fact_rows: int
+    as_of: Optional[datetime] = None
+
+
+class ValuationTotals(BaseModel):
+    """Value of the stock on hand."""
+    products: int
+    units: float
+    cost_value: float
+    retail_value: float
+    potential_profit: float
+    margin: Optional[float] = None
+    uncosted_units: float
+    expired_units: float
+    expired_cost_value: float
+
+
+class CategoryValuation(ValuationTotals):
+    """Value of one category's stock on hand."""
+    category_id: Optional[str] = None
+    category_name: str
+
+
+class InventoryValuation(BaseModel):
+    """Inventory valuation response schema."""
+    valued_at: datetime
+    exclude_inactive: bool
+    exclude_expired: bool
+    categories: List[CategoryValuation]
+    totals: ValuationTotals
+
+
+class ValuationPoint(BaseModel):
+    """Stored valuation of one day."""
+    day: date
+    taken_at: datetime
+    products: int
+    units: float
+    cost_value: float
+    retail_value: float
+    potential_profit: float
+    uncosted_units: float
+    expired_units: float
+    expired_cost_value: float
+
+
+class ValuationTrend(BaseModel):
+    """Valuation trend response schema."""
+    category_id: Optional[str] = None
+    points: List[ValuationPoint]
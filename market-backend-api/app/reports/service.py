@@ -0,0 +1,329 @@
+"""
+Sales reports over the sale facts stored on `invoice_items` (see app.invoices.facts)
+and the per-product daily rollup `sales_daily` (see app.reports.rollup).
+
+Profit reports group the items of a range of store-local days by day, category,
+product or cashier in one aggregation. Only items of paid invoices count: pending
+and partially paid invoices are not realized revenue yet. Revenue is the discounted
+line revenue and cost the buying price captured at sale time; items sold before costs were captured
+(or while the product had none) fall back to the product's current buying price.
+
+A closed day no longer changes unless one of its invoices is edited, deleted or paid, so
+its per-dimension rows are stored in `profit_daily` the first time they are computed
+and reused by every later report; the invoice write paths drop the stored rows of
+the day they touch. Only today is aggregated on every request.
+
+Best sellers, slow movers and dead stock read only the rollup: a range of days is
+a handful of documents per product, and dead stock is the active products missing
+from the products sold in the window (an anti-join on the sold product IDs).
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ReplaceOne
+
+from app.core.versions import versions
+from app.database.connection import db
+from app.invoices.facts import day_start_utc, local_time
+from app.invoices.models import PaymentStatus
+from app.reports.models import ProfitDimension, SalesRank
+
+REPORT_MAX_DAYS = 366
+
+# Item field each dimension groups on; a day report groups on the day alone
+PROFIT_GROUP_FIELDS = {
+    ProfitDimension.DAY: None,
+    ProfitDimension.CATEGORY: "$category_id",
+    ProfitDimension.PRODUCT: "$product_id",
+    ProfitDimension.CASHIER: "$cashier_id",
+}
+
+# Display names of each dimension's keys and the label of a missing key
+PROFIT_LABEL_SOURCES = {
+    ProfitDimension.CATEGORY: ("categories", "بدون فئة"),
+    ProfitDimension.PRODUCT: ("products", "منتج محذوف"),
+    ProfitDimension.CASHIER: ("users", "غير محدد"),
+}
+
+
+def store_today() -> date:
+    """Today's date in the store's timezone."""
+    return local_time(datetime.utcnow()).date()
+
+
+def report_days(start: date, end: date) -> List[date]:
+    """The days of a report range, validated."""
+    if end < start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end must not be before start")
+    if (end - start).days >= REPORT_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A report covers at most {REPORT_MAX_DAYS} days"
+        )
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+def _product_oids(product_ids: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(product_id) for product_id in product_ids if product_id and ObjectId.is_valid(product_id)]
+
+
+def _empty_row(key: Optional[str]) -> dict:
+    return {"key": key, "units": 0, "revenue": 0.0, "cost": 0.0, "uncosted_units": 0}
+
+
+def _add(row: dict, other: dict):
+    for field in ("units", "revenue", "cost", "uncosted_units"):
+        row[field] += other[field]
+
+
+def _with_profit(row: dict) -> dict:
+    revenue, cost = round(row["revenue"], 2), round(row["cost"], 2)
+    profit = round(revenue - cost, 2)
+    return {
+        **row,
+        "revenue": revenue,
+        "cost": cost,
+        "profit": profit,
+        "margin": round(profit / revenue * 100, 2) if revenue else None,
+    }
+
+
+class ProfitService:
+    """Profit report service class."""
+
+    @staticmethod
+    async def _compute_days(dimension: ProfitDimension, days: List[str]) -> Dict[str, List[dict]]:
+        """Rows of each day, aggregated from the invoice items."""
+        field = PROFIT_GROUP_FIELDS[dimension]
+        costed = {"$gt": [{"$ifNull": ["$cost", 0]}, 0]}
+        pipeline = [
+            {"$match": {"day": {"$in": days}, "status": PaymentStatus.PAID.value}},
+            {"$group": {
+                # Items without a captured cost stay apart per product to price them below
+                "_id": {"day": "$day", "key": field, "uncosted": {"$cond": [costed, None, "$product_id"]}},
+                "units": {"$sum": "$quantity"},
+                "revenue": {"$sum": {"$ifNull": ["$revenue", {"$multiply": ["$price", "$quantity"]}]}},
+                "cost": {"$sum": {"$cond": [costed, {"$multiply": ["$cost", "$quantity"]}, 0]}},
+            }},
+        ]
+        rows: Dict[str, Dict[Optional[str], dict]] = {day: {} for day in days}
+        uncosted = []
+        async for group in db.invoice_items.aggregate(pipeline):
+            day = group["_id"]["day"]
+            key = day if dimension == ProfitDimension.DAY else group["_id"].get("key")
+            row = rows[day].setdefault(key, _empty_row(key))
+            _add(row, {"units": group["units"], "revenue": group["revenue"], "cost": group["cost"], "uncosted_units": 0})
+            if group["_id"].get("uncosted"):
+                uncosted.append((row, group["_id"]["uncosted"], group["units"]))
+
+        if uncosted:
+            product_ids = {product_id for _, product_id, _ in uncosted if ObjectId.is_valid(product_id)}
+            current = {
+                str(doc["_id"]): doc.get("buying_price") or 0
+                async for doc in db.products.find(
+                    {"_id": {"$in": [ObjectId(p) for p in product_ids]}}, {"buying_price": 1}
+                )
+            }
+            for row, product_id, units in uncosted:
+                if current.get(product_id, 0) > 0:
+                    row["cost"] += current[product_id] * units
+                else:
+                    row["uncosted_units"] += units
+
+        return {day: list(day_rows.values()) for day, day_rows in rows.items()}
+
+    @staticmethod
+    async def _closed_days(dimension: ProfitDimension, days: List[str]) -> Dict[str, List[dict]]:
+        """Rows of closed days: stored ones as they are, missing ones computed and stored."""
+        ids = [f"{dimension.value}:{day}" for day in days]
+        stored = {doc["day"]: doc["rows"] async for doc in db.profit_daily.find({"_id": {"$in": ids}})}
+        missing = [day for day in days if day not in stored]
+        if not missing:
+            return stored
+
+        version = versions.get("invoices")
+        computed = await ProfitService._compute_days(dimension, missing)
+        # An invoice written meanwhile may have changed these days: serve them, but do not store them
+        if versions.get("invoices") == version:
+            now = datetime.utcnow()
+            await db.profit_daily.bulk_write([
+                ReplaceOne(
+                    {"_id": f"{dimension.value}:{day}"},
+                    {"dimension": dimension.value, "day": day, "rows": rows, "computed_at": now},
+                    upsert=True,
+                )
+                for day, rows in computed.items()
+            ], ordered=False)
+        return {**stored, **computed}
+
+    @staticmethod
+    async def _labels(dimension: ProfitDimension, keys: List[Optional[str]]) -> Dict[Optional[str], str]:
+        if dimension == ProfitDimension.DAY:
+            return {key: key for key in keys}
+        collection, missing_label = PROFIT_LABEL_SOURCES[dimension]
+        ids = [ObjectId(key) for key in keys if key and ObjectId.is_valid(key)]
+        labels = {
+            str(doc["_id"]): doc.get("name") or missing_label
+            async for doc in db[collection].find({"_id": {"$in": ids}}, {"name": 1})
+        }
+        return {key: labels.get(key, missing_label) for key in keys}
+
+    @staticmethod
+    async def get_profit_report(dimension: ProfitDimension, start: date, end: date) -> dict:
+        """Units, revenue, cost, profit and margin per day, category, product or cashier."""
+        dimension = ProfitDimension(dimension)
+        days = report_days(start, end)
+        today = store_today()
+        closed = [day.isoformat() for day in days if day < today]
+        current = [day.isoformat() for day in days if day == today]
+        closed_rows = await ProfitService._closed_days(dimension, closed) if closed else {}
+        current_rows = await ProfitService._compute_days(dimension, current) if current else {}
+
+        merged: Dict[Optional[str], dict] = {}
+        if dimension == ProfitDimension.DAY:
+            merged = {day.isoformat(): _empty_row(day.isoformat()) for day in days}
+        for day_rows in list(closed_rows.values()) + list(current_rows.values()):
+            for row in day_rows:
+                _add(merged.setdefault(row["key"], _empty_row(row["key"])), row)
+
+        labels = await ProfitService._labels(dimension, list(merged))
+        rows = [_with_profit({**row, "label": labels[key]}) for key, row in merged.items()]
+        if dimension != ProfitDimension.DAY:
+            rows.sort(key=lambda row: row["profit"], reverse=True)
+
+        totals = _empty_row(None)
+        for row in merged.values():
+            _add(totals, row)
+        totals = _with_profit(totals)
+        totals.pop("key")
+        return {
+            "by": dimension,
+            "start": start,
+            "end": end,
+            "rows": rows,
+            "totals": totals,
+            "cached_days": len(closed),
+        }
+
+    @staticmethod
+    async def invalidate(days: Optional[List[str]] = None):
+        """Drop the stored rows of the given days (all days when None) after invoices changed."""
+        await db.profit_daily.delete_many({"day": {"$in": days}} if days is not None else {})
+
+
+# Fields of the products listed in sales reports
+SALES_PRODUCT_PROJECTION = {"name": 1, "product_id": 1, "quantity": 1, "buying_price": 1, "is_active": 1}
+
+
+def _sales_row(product_id: str, product: Optional[dict], totals: dict) -> dict:
+    product = product or {}
+    return {
+        "product_id": product_id,
+        "name": product.get("name") or "منتج محذوف",
+        "code": product.get("product_id"),
+        "quantity": product.get("quantity", 0),
+        "units": totals["units"],
+        "revenue": round(totals["revenue"], 2),
+        "invoices": totals["invoices"],
+    }
+
+
+class SalesReportService:
+    """Best sellers, slow movers and dead stock from the daily sales rollup."""
+
+    @staticmethod
+    def _totals_pipeline(start: date, end: date) -> list:
+        return [
+            {"$match": {"day": {"$gte": start.isoformat(), "$lte": end.isoformat()}}},
+            {"$group": {
+                "_id": "$product_id",
+                "units": {"$sum": "$units"},
+                "revenue": {"$sum": "$revenue"},
+                "invoices": {"$sum": "$invoices"},
+            }},
+            {"$match": {"units": {"$gt": 0}}},
+        ]
+
+    @staticmethod
+    async def _products(product_ids: Iterable[str]) -> Dict[str, dict]:
+        return {
+            str(doc["_id"]): doc
+            async for doc in db.products.find({"_id": {"$in": _product_oids(product_ids)}}, SALES_PRODUCT_PROJECTION)
+        }
+
+    @staticmethod
+    async def get_top_sellers(start: date, end: date, limit: int = 10, rank_by: SalesRank = SalesRank.UNITS) -> dict:
+        """The `limit` products that sold the most units (or revenue) over a range of days."""
+        report_days(start, end)
+        rank_by = SalesRank(rank_by)
+        pipeline = SalesReportService._totals_pipeline(start, end) + [
+            {"$sort": {rank_by.value: -1, "_id": 1}},
+            {"$limit": limit},
+        ]
+        totals = await db.sales_daily.aggregate(pipeline).to_list(length=limit)
+        products = await SalesReportService._products(row["_id"] for row in totals)
+        return {
+            "start": start,
+            "end": end,
+            "rank_by": rank_by,
+            "rows": [_sales_row(row["_id"], products.get(row["_id"]), row) for row in totals],
+        }
+
+    @staticmethod
+    async def get_slow_movers(start: date, end: date, limit: int = 20) -> dict:
+        """Active products with the fewest units sold over a range of days (at least one sale)."""
+        report_days(start, end)
+        totals = await db.sales_daily.aggregate(SalesReportService._totals_pipeline(start, end)).to_list(length=None)
+        products = await SalesReportService._products(row["_id"] for row in totals)
+        active = [row for row in totals if products.get(row["_id"], {}).get("is_active")]
+        active.sort(key=lambda row: (row["units"], row["revenue"], row["_id"]))
+        return {
+            "start": start,
+            "end": end,
+            "rank_by": SalesRank.UNITS,
+            "rows": [_sales_row(row["_id"], products[row["_id"]], row) for row in active[:limit]],
+        }
+
+    @staticmethod
+    async def get_dead_stock(days: int = 30, skip: int = 0, limit: int = 50) -> dict:
+        """Active products in stock with no sale in the last `days` days, most units first.
+
+        Products created during the window are left out: they had no chance to sell yet.
+        """
+        since = store_today() - timedelta(days=days - 1)
+        sold = await db.sales_daily.distinct("product_id", {"day": {"$gte": since.isoformat()}, "units": {"$gt": 0}})
+        query = {
+            "is_active": True,
+            "quantity": {"$gt": 0},
+            "_id": {"$nin": _product_oids(sold)},
+            "created_at": {"$not": {"$gte": day_start_utc(since)}},
+        }
+        total = await db.products.count_documents(query)
+        products = await db.products.find(query, SALES_PRODUCT_PROJECTION) \
+            .sort([("quantity", -1), ("_id", 1)]).skip(skip).limit(limit).to_list(length=limit)
+
+        product_ids = [str(product["_id"]) for product in products]
+        last_sold = {
+            row["_id"]: row["day"]
+            async for row in db.sales_daily.aggregate([
+                {"$match": {"product_id": {"$in": product_ids}, "units": {"$gt": 0}}},
+                {"$group": {"_id": "$product_id", "day": {"$max": "$day"}}},
+            ])
+        }
+        rows = []
+        for product in products:
+            product_id = str(product["_id"])
+            buying_price = product.get("buying_price") or 0
+            rows.append({
+                "product_id": product_id,
+                "name": product.get("name", ""),
+                "code": product.get("product_id"),
+                "quantity": product["quantity"],
+                "buying_price": buying_price,
+                "stock_value": round(buying_price * product["quantity"], 2),
+                "last_sold": last_sold.get(product_id),
+            })
+        return {"days": days, "since": since, "total": total, "rows": rows}
@@ -0,0 +1,135 @@
+"""
+Inventory valuation.
+
+The stock on hand is valued at cost (quantity x buying price) and at retail
+(quantity x selling price) per category and overall, in one aggregation over
+`products`. Expired units and their value are reported alongside, or left out
+entirely with `exclude_expired`.
+
+Once per store-local day the valuation of the active catalog is stored in
+`inventory_valuations` (`_id` = day), so trends read one document per day instead
+of rescanning products.
+"""
+
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from app.database.connection import db
+from app.reports.service import report_days, store_today
+
+VALUE_FIELDS = ("products", "units", "cost_value", "retail_value", "uncosted_units", "expired_units",
+                "expired_cost_value")
+
+
+def valuation_pipeline(now: datetime, exclude_inactive: bool = True, exclude_expired: bool = False) -> list:
+    """Aggregation of the stock value per category."""
+    match: dict = {}
+    if exclude_inactive:
+        match["is_active"] = True
+    if exclude_expired:
+        match["$or"] = [{"expiry_date": None}, {"expiry_date": {"$gte": now}}]
+    expired = {"$and": [{"$ne": [{"$ifNull": ["$expiry_date", None]}, None]}, {"$lt": ["$expiry_date", now]}]}
+    return [
+        {"$match": match},
+        {"$project": {
+            "category_id": {"$ifNull": ["$category_id", None]},
+            "units": {"$ifNull": ["$quantity", 0]},
+            "cost": {"$multiply": [{"$ifNull": ["$quantity", 0]}, {"$ifNull": ["$buying_price", 0]}]},
+            "retail": {"$multiply": [
+                {"$ifNull": ["$quantity", 0]}, {"$ifNull": ["$selling_price", {"$ifNull": ["$price", 0]}]}
+            ]},
+            "costed": {"$gt": [{"$ifNull": ["$buying_price", 0]}, 0]},
+            "expired": expired,
+        }},
+        {"$group": {
+            "_id": "$category_id",
+            "products": {"$sum": 1},
+            "units": {"$sum": "$units"},
+            "cost_value": {"$sum": "$cost"},
+            "retail_value": {"$sum": "$retail"},
+            "uncosted_units": {"$sum": {"$cond": ["$costed", 0, "$units"]}},
+            "expired_units": {"$sum": {"$cond": ["$expired", "$units", 0]}},
+            "expired_cost_value": {"$sum": {"$cond": ["$expired", "$cost", 0]}},
+        }},
+    ]
+
+
+def _with_margin(row: dict) -> dict:
+    """Round the values and add the potential gross profit and margin of selling the stock."""
+    for field in ("cost_value", "retail_value", "expired_cost_value"):
+        row[field] = round(row[field], 2)
+    row["potential_profit"] = round(row["retail_value"] - row["cost_value"], 2)
+    row["margin"] = round(row["potential_profit"] / row["retail_value"] * 100, 2) if row["retail_value"] else None
+    return row
+
+
+class ValuationService:
+    """Inventory valuation and its daily snapshots."""
+
+    @staticmethod
+    async def get_valuation(exclude_inactive: bool = True, exclude_expired: bool = False) -> dict:
+        """Cost and retail value of the stock per category (highest cost value first) and overall."""
+        now = datetime.utcnow()
+        rows = [doc async for doc in db.products.aggregate(valuation_pipeline(now, exclude_inactive, exclude_expired))]
+
+        category_ids = [ObjectId(row["_id"]) for row in rows if row["_id"] and ObjectId.is_valid(row["_id"])]
+        names = {
+            str(doc["_id"]): doc.get("name")
+            async for doc in db.categories.find({"_id": {"$in": category_ids}}, {"name": 1})
+        }
+        totals = {field: 0 for field in VALUE_FIELDS}
+        categories = []
+        for row in rows:
+            category_id = row.pop("_id")
+            for field in VALUE_FIELDS:
+                totals[field] += row[field]
+            categories.append(_with_margin({
+                "category_id": category_id,
+                "category_name": names.get(category_id) or "بدون فئة",
+                **row,
+            }))
+        categories.sort(key=lambda row: (-row["cost_value"], row["category_name"]))
+        return {
+            "valued_at": now,
+            "exclude_inactive": exclude_inactive,
+            "exclude_expired": exclude_expired,
+            "categories": categories,
+            "totals": _with_margin(totals),
+        }
+
+    @staticmethod
+    async def snapshot_if_due():
+        """Store today's valuation of the active catalog unless it has been stored already."""
+        day = store_today().isoformat()
+        if await db.inventory_valuations.find_one({"_id": day}, {"_id": 1}):
+            return
+        valuation = await ValuationService.get_valuation()
+        await db.inventory_valuations.replace_one({"_id": day}, {
+            "day": day,
+            "taken_at": valuation["valued_at"],
+            "totals": valuation["totals"],
+            "categories": valuation["categories"],
+        }, upsert=True)
+        print(f"✅ Inventory valuation snapshot stored for {day}")
+
+    @staticmethod
+    async def get_trend(start: date, end: date, category_id: Optional[str] = None) -> List[dict]:
+        """Daily valuations from the snapshots, overall or of one category; days without one are skipped."""
+        report_days(start, end)
+        points = []
+        cursor = db.inventory_valuations.find(
+            {"_id": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+        ).sort("_id", 1)
+        async for doc in cursor:
+            values: Optional[Dict] = doc["totals"]
+            if category_id is not None:
+                values = next((row for row in doc["categories"] if row["category_id"] == category_id), None)
+            points.append({
+                "day": doc["_id"],
+                "taken_at": doc["taken_at"],
+                **{field: (values or {}).get(field, 0) for field in VALUE_FIELDS},
+                "potential_profit": (values or {}).get("potential_profit", 0),
+            })
+        return points
@@ -0,0 +1,16 @@
+"""
+Stock movement models.
+"""
+
+from enum import Enum
+
+
+class MovementReason(str, Enum):
+    """Why a product quantity changed."""
+    INITIAL = "initial"
+    SALE = "sale"
+    INVOICE_EDIT = "invoice_edit"
+    INVOICE_DELETE = "invoice_delete"
+    ADJUSTMENT = "adjustment"
+    STOCK_TAKE = "stock_take"
+    IMPORT = "import"
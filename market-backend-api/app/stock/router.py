@@ -0,0 +1,90 @@
+"""
+Stock router: movement ledger, as-of quantities, bulk stock-takes and variance reports.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
+from datetime import datetime
+from app.auth.dependencies import get_current_admin, get_current_staff
+from app.stock.models import MovementReason
+from app.stock.schemas import (
+    StockTakeCreate, StockTakeResponse, StockTakeDetailResponse,
+    StockMovementResponse, StockSnapshotResponse, StockAsOfResponse
+)
+from app.stock.service import StockService
+
+router = APIRouter()
+
+
+@router.post("/stock-takes", response_model=StockTakeResponse, status_code=status.HTTP_201_CREATED)
+async def create_stock_take(
+    stock_take: StockTakeCreate,
+    current_staff = Depends(get_current_staff)
+):
+    """Apply counted quantities for many products at once (Admin or Cashier).
+
+    Returns the variance summary; the Excel variance report is produced by the
+    background job `report_job_id` and downloaded from `/api/jobs/{id}/download`.
+    """
+    return await StockService.create_stock_take(stock_take, created_by=current_staff.get("id"))
+
+
+@router.get("/stock-takes", response_model=List[StockTakeResponse])
+async def get_stock_takes(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_admin = Depends(get_current_admin)
+):
+    """List stock-takes, newest first (Admin only)."""
+    return await StockService.get_stock_takes(skip=skip, limit=limit)
+
+
+@router.get("/stock-takes/{stock_take_id}", response_model=StockTakeDetailResponse)
+async def get_stock_take(
+    stock_take_id: str,
+    current_admin = Depends(get_current_admin)
+):
+    """Get a stock-take with its per-product variance lines (Admin only)."""
+    stock_take = await StockService.get_stock_take(stock_take_id)
+    if not stock_take:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stock-take not found")
+    return stock_take
+
+
+@router.get("/movements", response_model=List[StockMovementResponse])
+async def get_movements(
+    product_id: Optional[str] = Query(None, description="Product database ID"),
+    reason: Optional[MovementReason] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_admin = Depends(get_current_admin)
+):
+    """List stock movements, newest first (Admin only)."""
+    return await StockService.get_movements(product_id, reason, start, end, skip, limit)
+
+
+@router.get("/as-of", response_model=StockAsOfResponse)
+async def get_quantities_as_of(
+    at: datetime,
+    product_id: Optional[str] = Query(None, description="Product database ID"),
+    current_admin = Depends(get_current_admin)
+):
+    """Product quantities at a point in time (Admin only)."""
+    return await StockService.get_quantities_as_of(at, product_id)
+
+
+@router.get("/snapshots", response_model=List[StockSnapshotResponse])
+async def get_snapshots(
+    limit: int = Query(30, ge=1, le=365),
+    current_admin = Depends(get_current_admin)
+):
+    """List stock snapshots, newest first (Admin only)."""
+    return await StockService.get_snapshots(limit)
+
+
+@router.post("/snapshots", response_model=StockSnapshotResponse, status_code=status.HTTP_201_CREATED)
+async def take_snapshot(current_admin = Depends(get_current_admin)):
+    """Take a stock snapshot now (Admin only)."""
+    return await StockService.take_snapshot()
@@ -0,0 +1,101 @@
+"""
+Stock related Pydantic schemas.
+"""
+
+from pydantic import BaseModel, validator
+from typing import Dict, Optional, List
+from datetime import datetime
+from app.stock.models import MovementReason
+
+
+class StockCountItem(BaseModel):
+    """One counted product: identified by database ID or by scanned code (product_id / sku)."""
+    product_id: Optional[str] = None
+    code: Optional[str] = None
+    counted_quantity: int
+
+    @validator('counted_quantity')
+    def validate_counted_quantity(cls, v):
+        if v < 0:
+            raise ValueError('Counted quantity cannot be negative')
+        return v
+
+    @validator('code', always=True)
+    def validate_identifier(cls, v, values):
+        if not v and not values.get('product_id'):
+            raise ValueError('Either product_id or code is required')
+        return v
+
+
+class StockTakeCreate(BaseModel):
+    """Stock-take submission schema."""
+    items: List[StockCountItem]
+    notes: Optional[str] = None
+
+    @validator('items')
+    def validate_items(cls, v):
+        if not v:
+            raise ValueError('At least one counted item is required')
+        return v
+
+
+class StockTakeLine(BaseModel):
+    """Per-product variance line."""
+    product_id: str
+    code: Optional[str] = None
+    name: str
+    expected_quantity: int
+    counted_quantity: int
+    variance: int
+    unit_cost: Optional[float] = None
+    variance_value: float = 0.0
+    conflict: bool = False  # quantity changed while counting: not applied, recount
+
+
+class StockTakeResponse(BaseModel):
+    """Stock-take summary schema."""
+    id: str
+    notes: Optional[str] = None
+    created_by: Optional[str] = None
+    created_at: datetime
+    products_counted: int
+    products_changed: int
+    surplus_units: int
+    shortage_units: int
+    net_variance_units: int
+    net_variance_value: float
+    not_found: List[str] = []
+    conflicts: List[str] = []  # products to recount
+    report_job_id: Optional[str] = None
+
+
+class StockTakeDetailResponse(StockTakeResponse):
+    """Stock-take summary with its variance lines."""
+    lines: List[StockTakeLine] = []
+
+
+class StockMovementResponse(BaseModel):
+    """Stock ledger entry schema."""
+    id: str
+    product_id: str
+    delta: int
+    reason: MovementReason
+    reference_type: Optional[str] = None
+    reference_id: Optional[str] = None
+    quantity_after: Optional[int] = None
+    created_by: Optional[str] = None
+    created_at: datetime
+
+
+class StockSnapshotResponse(BaseModel):
+    """Stock snapshot run schema."""
+    taken_at: datetime
+    products: int
+
+
+class StockAsOfResponse(BaseModel):
+    """Product quantities at a point in time, keyed by product database ID."""
+    as_of: datetime
+    snapshot_taken_at: datetime
+    products_moved: int
+    quantities: Dict[str, int]
@@ -0,0 +1,450 @@
+"""
+Stock service layer: movement ledger, snapshots, bulk stock-takes and variance reporting.
+
+Every quantity change appends a `stock_movements` entry (signed delta, reason and
+reference). `stock_snapshots` holds the quantity of every product at periodic
+instants, so the quantity at any time is the nearest snapshot plus the movements
+between the snapshot and that time. Snapshots older than STOCK_SNAPSHOT_RETENTION_DAYS
+are pruned; earlier instants are rolled back from the oldest snapshot kept.
+
+Every path that changes a quantity (invoice deltas, stock-takes, product create,
+edit and stock adjustment, imports) writes it and its ledger entry through
+`in_transaction` (or `in_transaction_sync` in job workers): one transaction where
+the server supports them (replica set or sharded cluster). On a standalone server a
+failure between the two writes leaves a change without its entry; the as-of
+quantities then drift by that change only until the next snapshot, which records
+the true quantity again.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+
+from app.config import STOCK_SNAPSHOT_INTERVAL_HOURS, STOCK_SNAPSHOT_RETENTION_DAYS
+from app.database.connection import db, transactions_supported
+from app.core.excel import new_write_only_sheet, append_totals_row
+from app.products.barcode_index import barcode_index
+from app.catalog.service import CatalogService
+from app.core.versions import versions
+from app.stock.models import MovementReason
+from app.stock.schemas import StockTakeCreate
+
+# Variance report layout
+VARIANCE_HEADERS = [
+    "ID المنتج",
+    "اسم المنتج",
+    "الكمية المسجلة",
+    "الكمية الفعلية",
+    "الفرق",
+    "سعر الشراء",
+    "قيمة الفرق"
+]
+VARIANCE_COLUMN_WIDTHS = [28, 30, 14, 14, 10, 12, 14]
+
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def movement_doc(
+    product_id: str,
+    delta: int,
+    reason: MovementReason,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[str] = None,
+    created_by: Optional[str] = None,
+    created_at: Optional[datetime] = None,
+    quantity_after: Optional[int] = None,
+) -> dict:
+    """Build a `stock_movements` entry. `quantity_after` is only known for absolute ($set) changes."""
+    return {
+        "product_id": str(product_id),
+        "delta": delta,
+        "reason": MovementReason(reason).value,
+        "reference_type": reference_type,
+        "reference_id": reference_id,
+        "quantity_after": quantity_after,
+        "created_by": created_by,
+        "created_at": created_at or datetime.utcnow(),
+    }
+
+
+async def in_transaction(write: Callable[[Optional[Any]], Awaitable[Any]]) -> Any:
+    """Await `write(session)` in one transaction where the server supports them, else `write(None)`."""
+    if await transactions_supported():
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                return await write(session)
+    return await write(None)
+
+
+class StockService:
+    """Stock service class."""
+
+    ### LEDGER METHODS
+
+    @staticmethod
+    async def apply_deltas(
+        deltas: Dict[str, int],
+        reason: MovementReason,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[str] = None,
+        created_by: Optional[str] = None,
+    ):
+        """Apply signed quantity deltas with one products bulk write and log them in the ledger."""
+        deltas = {str(k): v for k, v in deltas.items() if v}
+        if not deltas:
+            return
+
+        now = datetime.utcnow()
+
+        async def write(session):
+            await db.products.bulk_write([
+                UpdateOne({"_id": ObjectId(product_id)}, {"$inc": {"quantity": delta}, "$set": {"updated_at": now}})
+                for product_id, delta in deltas.items()
+            ], ordered=False, session=session)
+            await db.stock_movements.insert_many([
+                movement_doc(product_id, delta, reason, reference_type, reference_id, created_by, now)
+                for product_id, delta in deltas.items()
+            ], session=session)
+
+        await in_transaction(write)
+        barcode_index.invalidate(*deltas)
+        await CatalogService.record_changes("product", deltas)
+        versions.bump("products")
+
+    @staticmethod
+    async def get_movements(
+        product_id: Optional[str] = None,
+        reason: Optional[MovementReason] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[dict]:
+        query = {}
+        if product_id:
+            query["product_id"] = product_id
+        if reason:
+            query["reason"] = MovementReason(reason).value
+        if start or end:
+            query["created_at"] = {}
+            if start:
+                query["created_at"]["$gte"] = start
+            if end:
+                query["created_at"]["$lte"] = end
+
+        cursor = db.stock_movements.find(query).sort("created_at", -1).skip(skip).limit(limit)
+        movements = []
+        async for doc in cursor:
+            doc["id"] = str(doc.pop("_id"))
+            movements.append(doc)
+        return movements
+
+    ### SNAPSHOT METHODS
+
+    @staticmethod
+    async def take_snapshot() -> dict:
+        """Record the current quantity of every product.
+
+        Writes still in flight at the snapshot instant may land on either side of it,
+        so an as-of quantity can be off by those writes only.
+        """
+        taken_at = datetime.utcnow()
+        batch = []
+        products = 0
+        async for doc in db.products.find({}, {"quantity": 1}):
+            batch.append({"product_id": str(doc["_id"]), "quantity": doc.get("quantity", 0), "taken_at": taken_at})
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                await db.stock_snapshots.insert_many(batch)
+                products += len(batch)
+                batch = []
+        if batch:
+            await db.stock_snapshots.insert_many(batch)
+            products += len(batch)
+
+        await db.stock_snapshot_runs.insert_one({"taken_at": taken_at, "products": products})
+        print(f"✅ Stock snapshot taken for {products} products")
+
+        # Drop the runs first, so an as-of query never picks a run whose rows are being deleted
+        cutoff = taken_at - timedelta(days=STOCK_SNAPSHOT_RETENTION_DAYS)
+        pruned = await db.stock_snapshot_runs.delete_many({"taken_at": {"$lt": cutoff}})
+        await db.stock_snapshots.delete_many({"taken_at": {"$lt": cutoff}})
+        if pruned.deleted_count:
+            print(f"✅ Pruned {pruned.deleted_count} stock snapshots older than {STOCK_SNAPSHOT_RETENTION_DAYS} days")
+        return {"taken_at": taken_at, "products": products}
+
+    @staticmethod
+    async def snapshot_if_due():
+        """Take a snapshot when none exists yet or the latest is older than the configured interval."""
+        latest = await db.stock_snapshot_runs.find_one({}, sort=[("taken_at", -1)])
+        if not latest or datetime.utcnow() - latest["taken_at"] >= timedelta(hours=STOCK_SNAPSHOT_INTERVAL_HOURS):
+            await StockService.take_snapshot()
+
+    @staticmethod
+    async def get_snapshots(limit: int = 30) -> List[dict]:
+        cursor = db.stock_snapshot_runs.find({}, {"_id": 0}).sort("taken_at", -1).limit(limit)
+        return [doc async for doc in cursor]
+
+    @staticmethod
+    async def _sum_movements(after: datetime, until: datetime, product_id: Optional[str]) -> Dict[str, int]:
+        match = {"created_at": {"$gt": after, "$lte": until}}
+        if product_id:
+            match["product_id"] = product_id
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$product_id", "delta": {"$sum": "$delta"}}}
+        ]
+        return {doc["_id"]: doc["delta"] async for doc in db.stock_movements.aggregate(pipeline)}
+
+    @staticmethod
+    async def get_quantities_as_of(at: datetime, product_id: Optional[str] = None) -> dict:
+        """Quantities at `at`: the nearest snapshot plus the movements between it and `at`.
+
+        The latest snapshot at or before `at` is rolled forward; when `at` predates every
+        snapshot, the earliest snapshot is rolled back instead.
+        """
+        run = await db.stock_snapshot_runs.find_one({"taken_at": {"$lte": at}}, sort=[("taken_at", -1)])
+        direction = 1
+        if not run:
+            run = await db.stock_snapshot_runs.find_one({}, sort=[("taken_at", 1)])
+            direction = -1
+        if not run:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="No stock snapshot has been taken yet"
+            )
+
+        snapshot_query = {"taken_at": run["taken_at"]}
+        if product_id:
+            snapshot_query["product_id"] = product_id
+        quantities = {doc["product_id"]: doc["quantity"] async for doc in db.stock_snapshots.find(snapshot_query)}
+
+        if direction == 1:
+            deltas = await StockService._sum_movements(run["taken_at"], at, product_id)
+        else:
+            deltas = await StockService._sum_movements(at, run["taken_at"], product_id)
+        for key, delta in deltas.items():
+            quantities[key] = quantities.get(key, 0) + direction * delta
+
+        return {
+            "as_of": at,
+            "snapshot_taken_at": run["taken_at"],
+            "products_moved": len(deltas),
+            "quantities": quantities,
+        }
+
+    @staticmethod
+    async def _resolve_products(items) -> dict:
+        """Map every submitted identifier to its active product document with two queries."""
+        ids = [item.product_id for item in items if item.product_id and ObjectId.is_valid(item.product_id)]
+        codes = [item.code for item in items if item.code]
+
+        by_id = {}
+        by_code = {}
+        if ids:
+            async for doc in db.products.find({"_id": {"$in": [ObjectId(i) for i in ids]}, "is_active": True}):
+                by_id[str(doc["_id"])] = doc
+        if codes:
+            query = {"$or": [{"product_id": {"$in": codes}}, {"sku": {"$in": codes}}], "is_active": True}
+            async for doc in db.products.find(query):
+                by_id.setdefault(str(doc["_id"]), doc)
+                if doc.get("sku") in codes:
+                    by_code.setdefault(doc["sku"], doc)
+                if doc.get("product_id") in codes:
+                    # product_id wins over a colliding sku, as in barcode scanning
+                    by_code[doc["product_id"]] = doc
+        return {"by_id": by_id, "by_code": by_code}
+
+    @staticmethod
+    async def create_stock_take(stock_take: StockTakeCreate, created_by: Optional[str] = None) -> dict:
+        """Apply counted quantities for many products with one bulk write and record the variance.
+
+        Counts submitted more than once for the same product (e.g. from different
+        shelves) are summed.
+        """
+        resolved = await StockService._resolve_products(stock_take.items)
+
+        counted = {}
+        products = {}
+        not_found = []
+        for item in stock_take.items:
+            doc = None
+            if item.product_id:
+                doc = resolved["by_id"].get(item.product_id)
+            if doc is None and item.code:
+                doc = resolved["by_code"].get(item.code)
+            if doc is None:
+                not_found.append(item.product_id or item.code)
+                continue
+            key = str(doc["_id"])
+            products[key] = doc
+            counted[key] = counted.get(key, 0) + item.counted_quantity
+
+        if not products:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="None of the counted products were found"
+            )
+
+        now = datetime.utcnow()
+        stock_take_id = ObjectId()
+        lines = []
+        updates = []
+        for key, doc in products.items():
+            expected = doc.get("quantity", 0)
+            variance = counted[key] - expected
+            unit_cost = doc.get("buying_price")
+            lines.append({
+                "stock_take_id": str(stock_take_id),
+                "product_id": key,
+                "code": doc.get("product_id") or doc.get("sku"),
+                "name": doc.get("name", ""),
+                "expected_quantity": expected,
+                "counted_quantity": counted[key],
+                "variance": variance,
+                "unit_cost": unit_cost,
+                "variance_value": variance * unit_cost if unit_cost else 0.0,
+            })
+            if variance:
+                updates.append((lines[-1], doc, expected))
+
+        async def write(session) -> set:
+            # Only overwrite the quantity the variance was computed from: a sale landing after
+            # the read leaves the product unmatched, and its line is reported for a recount
+            result = await db.products.bulk_write([
+                UpdateOne(
+                    {"_id": doc["_id"], "quantity": expected},
+                    {"$set": {
+                        "quantity": line["counted_quantity"],
+                        "last_stock_take_id": str(stock_take_id),
+                        "updated_at": now,
+                    }}
+                )
+                for line, doc, expected in updates
+            ], ordered=False, session=session)
+            conflicted = set()
+            if result.matched_count < len(updates):
+                # The products this stock-take wrote carry its id; the others were unmatched
+                async for doc in db.products.find(
+                    {"_id": {"$in": [doc["_id"] for _, doc, _ in updates]},
+                     "last_stock_take_id": {"$ne": str(stock_take_id)}},
+                    {"_id": 1},
+                    session=session,
+                ):
+                    conflicted.add(str(doc["_id"]))
+            movements = [
+                movement_doc(
+                    line["product_id"], line["variance"], MovementReason.STOCK_TAKE, "stock_take",
+                    str(stock_take_id), created_by, now, quantity_after=line["counted_quantity"]
+                )
+                for line, _, _ in updates if line["product_id"] not in conflicted
+            ]
+            if movements:
+                await db.stock_movements.insert_many(movements, session=session)
+            return conflicted
+
+        conflicts = []
+        changed = []
+        if updates:
+            conflicted = await in_transaction(write)
+            for line, _, _ in updates:
+                if line["product_id"] in conflicted:
+                    line["conflict"] = True
+                    conflicts.append(line["product_id"])
+                else:
+                    changed.append(line["product_id"])
+        applied = [line for line in lines if not line.get("conflict")]
+
+        if changed:
+            barcode_index.invalidate(*changed)
+            await CatalogService.record_changes("product", changed)
+            versions.bump("products")
+
+        summary = {
+            "_id": stock_take_id,
+            "notes": stock_take.notes,
+            "created_by": created_by,
+            "created_at": now,
+            "products_counted": len(lines),
+            "products_changed": len(changed),
+            "surplus_units": sum(l["variance"] for l in applied if l["variance"] > 0),
+            "shortage_units": -sum(l["variance"] for l in applied if l["variance"] < 0),
+            "net_variance_units": sum(l["variance"] for l in applied),
+            "net_variance_value": sum(l["variance_value"] for l in applied),
+            "not_found": not_found,
+            "conflicts": conflicts,
+            "report_job_id": None,
+        }
+        await db.stock_take_lines.insert_many(lines)
+
+        # The downloadable variance report is built by a background job
+        from app.jobs.service import JobService
+        job = await JobService.submit(
+            "stock_take_report", {"stock_take_id": str(stock_take_id)}, requested_by=created_by
+        )
+        summary["report_job_id"] = job["id"]
+        await db.stock_takes.insert_one(summary)
+
+        summary["id"] = str(summary.pop("_id"))
+        return summary
+
+    @staticmethod
+    async def get_stock_takes(skip: int = 0, limit: int = 20) -> List[dict]:
+        cursor = db.stock_takes.find().sort("created_at", -1).skip(skip).limit(limit)
+        stock_takes = []
+        async for doc in cursor:
+            doc["id"] = str(doc.pop("_id"))
+            stock_takes.append(doc)
+        return stock_takes
+
+    @staticmethod
+    async def get_stock_take(stock_take_id: str) -> Optional[dict]:
+        if not ObjectId.is_valid(stock_take_id):
+            return None
+        doc = await db.stock_takes.find_one({"_id": ObjectId(stock_take_id)})
+        if not doc:
+            return None
+        doc["id"] = str(doc.pop("_id"))
+        cursor = db.stock_take_lines.find({"stock_take_id": stock_take_id}).sort("variance", 1)
+        doc["lines"] = [line async for line in cursor]
+        return doc
+
+    @staticmethod
+    def write_variance_excel(lines: Iterable[dict], output) -> dict:
+        """Write a stock-take variance report. Runs inside a job worker process."""
+        wb, ws = new_write_only_sheet("فروقات الجرد", VARIANCE_HEADERS, VARIANCE_COLUMN_WIDTHS)
+
+        rows = 0
+        net_units = 0
+        net_value = 0.0
+        for line in lines:
+            if line.get("conflict"):
+                # Not applied: the quantity changed while counting
+                ws.append([
+                    line.get("code") or "N/A",
+                    f"{line.get('name', '')} (يحتاج إعادة جرد)",
+                    line["expected_quantity"],
+                    line["counted_quantity"],
+                    "-",
+                    line["unit_cost"] if line.get("unit_cost") else "غير محدد",
+                    "-",
+                ])
+                rows += 1
+                continue
+            ws.append([
+                line.get("code") or "N/A",
+                line.get("name", ""),
+                line["expected_quantity"],
+                line["counted_quantity"],
+                line["variance"],
+                line["unit_cost"] if line.get("unit_cost") else "غير محدد",
+                line.get("variance_value", 0.0),
+            ])
+            net_units += line["variance"]
+            net_value += line.get("variance_value", 0.0)
+            rows += 1
+
+        append_totals_row(ws, ["الإجمالي:", None, None, None, net_units, None, f"{net_value:.2f} جنيه"])
+        wb.save(output)
+        return {"rows": rows, "net_variance_units": net_units, "net_variance_value": net_value}
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the Market Backend API.
+
+Usage:
+    python manage.py import-products catalog.xlsx [--errors errors.csv]
+    python manage.py rebuild-category-counts
+    python manage.py backfill-customer-search
+    python manage.py rebuild-customer-stats
+    python manage.py rebuild-sales-rollup
+    python manage.py bench-customer-search [--customers 500000] [--keep]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def import_products(args):
+    from app.database.sync_connection import get_sync_db
+    from app.products.importer import import_products_file
+
+    summary = import_products_file(get_sync_db(), args.path, error_report_path=args.errors)
+    print(f"✅ Imported {args.path} in {summary['seconds']:.1f}s")
+    print(f"   Rows: {summary['rows']}  Inserted: {summary['inserted']}  "
+          f"Updated: {summary['updated']}  Failed: {summary['failed']}")
+    for error in summary["errors"][:20]:
+        print(f"   ❌ Row {error['row']}: {'; '.join(error['errors'])}")
+    if args.errors and summary["failed"]:
+        print(f"📄 Error report written to {args.errors}")
+    return 1 if summary["failed"] else 0
+
+
+def rebuild_category_counts(args):
+    from app.database.sync_connection import get_sync_db
+    from app.products.service import ProductService
+
+    rebuilt = ProductService.rebuild_category_counts(get_sync_db())
+    print(f"✅ Rebuilt product counters for {rebuilt} categories")
+    return 0
+
+
+def backfill_customer_search(args):
+    from app.customers.search import backfill_search_keys
+    from app.database.sync_connection import get_sync_db
+
+    updated = backfill_search_keys(get_sync_db(), batch_size=args.batch_size)
+    print(f"✅ Search keys stored for {updated} customers")
+    return 0
+
+
+def rebuild_customer_stats(args):
+    from app.customers.service import rebuild_statistics
+    from app.database.sync_connection import get_sync_db
+
+    stats = rebuild_statistics(get_sync_db())
+    print(f"✅ Rebuilt statistics for {stats['total_customers']} customers "
+          f"({stats['invoice_count']} invoices, {stats['total_spent']:.2f} total spent)")
+    return 0
+
+
+def rebuild_sales_rollup(args):
+    from app.database.sync_connection import get_sync_db
+    from app.invoices.facts import backfill_sale_facts
+    from app.reports.rollup import rebuild_sales_rollup as rebuild
+
+    sync_db = get_sync_db()
+    backfilled = backfill_sale_facts(sync_db)
+    rows = rebuild(sync_db)
+    # Stored profit rows may predate the backfilled items
+    if backfilled:
+        sync_db.profit_daily.delete_many({})
+    print(f"✅ Rebuilt the sales rollup: {rows} product-days ({backfilled} items backfilled)")
+    return 0
+
+
+BENCH_FIRST_NAMES = ["محمد", "أحمد", "محمود", "مصطفى", "إبراهيم", "علي", "عمر", "يوسف", "فاطمة", "مريم", "آية", "هدى"]
+BENCH_LAST_NAMES = ["عبد الله", "السيد", "حسن", "إسماعيل", "الشربيني", "مرسى", "عيسى", "رضا", "فؤاد", "سلامة"]
+
+
+def _bench_timings(collection, query, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        list(collection.find(query).limit(20))
+        timings.append((time.perf_counter() - started) * 1000)
+    examined = collection.find(query).limit(20).explain()["executionStats"]["totalDocsExamined"]
+    return statistics.median(timings), examined
+
+
+def bench_customer_search(args):
+    """Compare the old unanchored regex search with the prefix-indexed search keys."""
+    from app.customers.search import SEARCH_INDEXES, search_keys, search_query
+    from app.database.connection import MONGO_DB_NAME
+    from app.database.sync_connection import get_sync_db
+
+    db_name = args.db or f"{MONGO_DB_NAME}_bench"
+    # The benchmark drops the customers collection and the whole database: never the live one
+    if db_name == MONGO_DB_NAME or not db_name.endswith("_bench"):
+        print(f"❌ Refusing to benchmark on {db_name}: the scratch database name must end in _bench")
+        return 1
+    bench_db = get_sync_db().client[db_name]
+    customers = bench_db.customers
+    rng = random.Random(42)
+    try:
+        if customers.estimated_document_count() < args.customers:
+            customers.drop()
+            print(f"ℹ️ Seeding {args.customers} customers into {bench_db.name}...")
+            batch = []
+            for i in range(args.customers):
+                name = f"{rng.choice(BENCH_FIRST_NAMES)} {rng.choice(BENCH_FIRST_NAMES)} {rng.choice(BENCH_LAST_NAMES)}"
+                phone = f"01{rng.choice('0125')}{i:08d}"
+                batch.append({"name": name, "phone": phone, "is_active": True, **search_keys(name, phone)})
+                if len(batch) == 10000:
+                    customers.insert_many(batch, ordered=False)
+                    batch = []
+            if batch:
+                customers.insert_many(batch, ordered=False)
+        for field in SEARCH_INDEXES:
+            customers.create_index(field)
+
+        sample = customers.find_one({}, skip=rng.randrange(args.customers))
+        terms = {
+            "phone prefix": sample["phone"][:7],
+            "last 4 digits": sample["phone"][-4:],
+            "name prefix": sample["name"].split()[0][:3],
+            "full name": sample["name"],
+        }
+        print(f"{'search':<16}{'old ms':>10}{'old docs':>12}{'new ms':>10}{'new docs':>12}")
+        for label, term in terms.items():
+            old_query = {"is_active": True, "$or": [
+                {"name": {"$regex": term, "$options": "i"}},
+                {"phone": {"$regex": term, "$options": "i"}},
+            ]}
+            new_query = {"is_active": True, **search_query(term)}
+            old_ms, old_docs = _bench_timings(customers, old_query, args.runs)
+            new_ms, new_docs = _bench_timings(customers, new_query, args.runs)
+            print(f"{label:<16}{old_ms:>10.2f}{old_docs:>12}{new_ms:>10.2f}{new_docs:>12}")
+    finally:
+        if not args.keep:
+            bench_db.client.drop_database(bench_db.name)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Market Backend API maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_import = subparsers.add_parser("import-products", help="Bulk import products from XLSX/CSV")
+    parser_import.add_argument("path", help="Path to the .xlsx or .csv file")
+    parser_import.add_argument("--errors", help="Write the per-row error report to this CSV file")
+    parser_import.set_defaults(func=import_products)
+
+    parser_counts = subparsers.add_parser(
+        "rebuild-category-counts", help="Recompute the per-category product counters"
+    )
+    parser_counts.set_defaults(func=rebuild_category_counts)
+
+    parser_backfill = subparsers.add_parser(
+        "backfill-customer-search", help="Store normalized search keys on existing customers"
+    )
+    parser_backfill.add_argument("--batch-size", type=int, default=1000)
+    parser_backfill.set_defaults(func=backfill_customer_search)
+
+    parser_stats = subparsers.add_parser(
+        "rebuild-customer-stats", help="Recompute per-customer purchase totals and customer statistics"
+    )
+    parser_stats.set_defaults(func=rebuild_customer_stats)
+
+    parser_rollup = subparsers.add_parser(
+        "rebuild-sales-rollup", help="Recompute the per-product daily sales rollup from the invoice items"
+    )
+    parser_rollup.set_defaults(func=rebuild_sales_rollup)
+
+    parser_bench = subparsers.add_parser(
+        "bench-customer-search", help="Benchmark customer search on a scratch database"
+    )
+    parser_bench.add_argument("--customers", type=int, default=500000)
+    parser_bench.add_argument("--runs", type=int, default=20, help="Timed runs per search")
+    parser_bench.add_argument("--db", help="Scratch database name, must end in _bench (default: <DB_NAME>_bench)")
+    parser_bench.add_argument("--keep", action="store_true", help="Keep the seeded database for later runs")
+    parser_bench.set_defaults(func=bench_customer_search)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()